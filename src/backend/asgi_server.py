@@ -0,0 +1,291 @@
+"""
+ASGI deployment of the same API as server.py, for when several people use it at once:
+
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+
+Flask's dev server handles one request at a time, so a 30 second summary blocks every search
+behind it. Here:
+  - Ollama is called through ollama.AsyncClient, so waiting on the model costs no thread.
+  - SQLite and rapidfuzz work runs in worker threads, never on the event loop.
+  - Every intent has its own concurrency limit (INTENT_LIMITS), so slow summaries queue up
+    among themselves and searches keep their own slots and threads.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import os
+
+import anyio
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+
+from server import (
+    categorize_query, format_sse, pdf_search_response, message_search_response, batch_search_response, message_filters,
+    summarize_selection, message_context_response,
+    attachment_etag, attachment_mimetype, attachment_catalog, pdf_text_indexer, semantic_index, SEMANTIC_SEARCH,
+    OUTPUT_DB_PATH, SSE_KEEPALIVE_SECONDS, UPLOAD_FOLDER,
+)
+from search_message.search_filters import FilterError
+from summarize.summarize import (
+    resolve_summarize_request, load_conversation, needs_map_reduce, summary_prompt, summary_cache_key,
+    format_summary, summarize_response, SUMMARY_MODEL, SYSTEM_PROMPT, PROMPT_VERSION,
+)
+from summarize.summary_cache import get_summary_cache
+from summarize.map_reduce import MapReduceSummarizer, achat
+
+# Requests of each intent allowed in flight at once. Summaries mostly wait on Ollama, which
+# runs one generation at a time anyway; searches are short and CPU bound.
+INTENT_LIMITS = {
+    'summarize': 2,
+    'pdf': 8,
+    'message': 8,
+}
+
+_request_slots: dict[str, asyncio.Semaphore] = {}
+_thread_limiters: dict[str, anyio.CapacityLimiter] = {}
+
+
+def intent_key(intent: str) -> str:
+    # categorize_query can return "summarize,pdf"; routing gives summarize priority, so do we
+    if 'summarize' in intent:
+        return 'summarize'
+    if 'pdf' in intent:
+        return 'pdf'
+    return 'message'
+
+
+def request_slots(intent: str) -> asyncio.Semaphore:
+    """Bounds how many requests of an intent are handled at once, the rest wait their turn."""
+    if intent not in _request_slots:
+        _request_slots[intent] = asyncio.Semaphore(INTENT_LIMITS[intent])
+    return _request_slots[intent]
+
+
+async def run_sync(intent: str, func, *args, **kwargs):
+    """Runs blocking SQLite/rapidfuzz work in a worker thread, from the intent's own share of threads."""
+    if intent not in _thread_limiters:
+        _thread_limiters[intent] = anyio.CapacityLimiter(INTENT_LIMITS[intent])
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=_thread_limiters[intent])
+
+
+async def summarize_async(user_message: str, progress=None, on_token=None, handle_ids=None, time_period=None) -> dict:
+    """
+    handle_summarize_request for the event loop: the same steps and responses, with the
+    database work in threads and the model calls through the async Ollama client.
+    """
+    try:
+        resolved = await run_sync('summarize', resolve_summarize_request, user_message, OUTPUT_DB_PATH, progress=progress,
+                                  handle_ids=handle_ids, time_period=time_period)
+        if isinstance(resolved, dict):
+            return resolved
+        contact_info, time_period = resolved
+        contact_name = contact_info['display_name']
+        handle_ids = contact_info['handle_ids']
+
+        conversation = await run_sync('summarize', load_conversation, OUTPUT_DB_PATH, handle_ids,
+                                      contact_name, time_period, progress=progress)
+        if isinstance(conversation, str):
+            return summarize_response(conversation, contact_info)
+        period_label = conversation['period_label']
+
+        summary_cache = await run_sync('summarize', get_summary_cache, OUTPUT_DB_PATH)
+        cache_key = summary_cache_key(handle_ids, conversation)
+        summary_text = await run_sync('summarize', summary_cache.get, *cache_key)
+
+        if summary_text is None:
+            try:
+                if not needs_map_reduce(conversation):
+                    summary_text = await achat(SUMMARY_MODEL, SYSTEM_PROMPT, summary_prompt(contact_name, conversation),
+                                               on_token=on_token)
+                else:
+                    summarizer = MapReduceSummarizer(SUMMARY_MODEL, PROMPT_VERSION, handle_ids,
+                                                     cache=summary_cache, progress=progress)
+                    summary_text = await summarizer.asummarize(conversation['periods'], contact_name, period_label,
+                                                               on_token=on_token)
+            except Exception as e:
+                return summarize_response(f"Error generating summary for {contact_name} ({period_label}): {str(e)}",
+                                          contact_info)
+            if summary_text:
+                await run_sync('summarize', summary_cache.put, *cache_key, summary_text)
+        elif on_token:
+            on_token(summary_text)
+
+        return summarize_response(format_summary(contact_name, conversation, summary_text), contact_info,
+                                  time_period=time_period)
+
+    except Exception as e:
+        return summarize_response(f"An error occurred while processing your summarization request: {str(e)}",
+                                  error='processing_error')
+
+
+async def route_message_async(request: Request, user_message: str, intent: str,
+                              filters: dict | None = None, selection: dict | None = None) -> tuple[dict, int]:
+    """Async counterpart of server.route_message()."""
+    key = intent_key(intent)
+    async with request_slots(key):
+        if key == 'summarize':
+            result = await summarize_async(user_message, **(selection or {}))
+            return result, 400 if 'error' in result else 200
+        if key == 'pdf':
+            file_url_for = lambda attachment_id: str(request.url_for('serve_attachment', attachment_id=attachment_id))
+            return await run_sync('pdf', pdf_search_response, user_message, file_url_for), 200
+        try:
+            return await run_sync('message', message_search_response, user_message, filters), 200
+        except FilterError as e:
+            return {"error": str(e)}, 400
+
+
+async def read_user_message(request: Request) -> tuple[str | None, dict]:
+    """The request's message and its whole JSON body ({} when it isn't a JSON object)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None, {}
+    if not isinstance(data, dict):
+        return None, {}
+    return data.get('message'), data
+
+
+async def handle_ai_response(request: Request) -> Response:
+    user_message, data = await read_user_message(request)
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+    try:
+        filters = message_filters(data)
+        selection = summarize_selection(data)
+    except ValueError as e:  # FilterError included
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    intent = categorize_query(user_message)
+    result, status = await route_message_async(request, user_message, intent, filters, selection)
+    return JSONResponse(result, status_code=status)
+
+
+async def handle_batch_search(request: Request) -> Response:
+    """Same contract as the Flask /api/search/batch endpoint."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    key = 'pdf' if isinstance(data, dict) and data.get('type') == 'attachments' else 'message'
+    file_url_for = lambda attachment_id: str(request.url_for('serve_attachment', attachment_id=attachment_id))
+    async with request_slots(key):
+        result, status = await run_sync(key, batch_search_response, data, file_url_for)
+    return JSONResponse(result, status_code=status)
+
+
+async def handle_message_context(request: Request) -> Response:
+    """Same contract as the Flask /api/messages/<id>/context endpoint."""
+    message_id = request.path_params['message_id']
+    async with request_slots('message'):
+        result, status = await run_sync('message', message_context_response, message_id, request.query_params)
+    return JSONResponse(result, status_code=status)
+
+
+async def handle_ai_response_stream(request: Request) -> Response:
+    """Same events as the Flask /api/ai-response/stream endpoint."""
+    user_message, data = await read_user_message(request)
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    try:
+        filters = message_filters(data)
+        selection = summarize_selection(data)
+    except ValueError as e:  # FilterError included
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    intent = categorize_query(user_message)
+    if intent_key(intent) != 'summarize':
+        result, status = await route_message_async(request, user_message, intent, filters)
+        return StreamingResponse(iter([format_sse('done', {**result, 'status': status})]), media_type='text/event-stream')
+
+    async def generate():
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def emit(event, payload):
+            # Progress can come from a worker thread (loading messages) or the loop (tokens)
+            loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+        async with request_slots('summarize'):
+            task = asyncio.create_task(summarize_async(
+                user_message,
+                progress=lambda message: emit('progress', {'message': message}),
+                on_token=lambda token: emit('token', {'content': token}),
+                **selection,
+            ))
+            task.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+            try:
+                yield format_sse('progress', {'message': 'summarizing'})
+                while True:
+                    try:
+                        item = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    if item is None:
+                        break
+                    yield format_sse(*item)
+                result = task.result()
+                yield format_sse('done', {**result, 'status': 400 if 'error' in result else 200})
+            finally:
+                # Client gone (Starlette cancels this generator) or done: stop talking to Ollama
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def serve_attachment(request: Request) -> Response:
+    """Same contract as the Flask route: catalog IDs only, ETag/304 and Range (206) support."""
+    attachment_id = request.path_params['attachment_id']
+    entry = await run_sync('pdf', attachment_catalog.get, attachment_id)
+    if entry is None:
+        return Response(status_code=404)
+    try:
+        info = await run_sync('pdf', os.stat, entry['full_path'])
+    except OSError:
+        return Response(status_code=404)
+
+    etag = f'"{attachment_etag(attachment_id, info)}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=3600'}
+    if etag in [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse streams from disk in chunks and answers Range requests with 206
+    return FileResponse(entry['full_path'], media_type=attachment_mimetype(entry),
+                        filename=entry['filename'], content_disposition_type='inline',
+                        headers=headers, stat_result=info)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    pdf_text_indexer.start()
+    if SEMANTIC_SEARCH:
+        semantic_index.start()
+    yield
+    pdf_text_indexer.stop()
+    semantic_index.stop()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/ai-response', handle_ai_response, methods=['POST']),
+        Route('/api/ai-response/stream', handle_ai_response_stream, methods=['POST']),
+        Route('/api/search/batch', handle_batch_search, methods=['POST']),
+        Route('/api/messages/{message_id:int}/context', handle_message_context),
+        Route('/files/attachments/{attachment_id:int}', serve_attachment, name='serve_attachment'),
+        Mount('/files', StaticFiles(directory=UPLOAD_FOLDER), name='serve_file'),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['http://localhost:3000'], allow_methods=['*'], allow_headers=['*']),
+    ],
+    lifespan=lifespan,
+)
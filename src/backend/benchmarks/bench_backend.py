@@ -0,0 +1,212 @@
+"""
+pytest-benchmark suite over synthetic data (see synthetic_data.py), at 10k/100k/1M messages.
+
+    cd src/backend
+    pip install -r benchmarks/requirements.txt
+    python -m pytest benchmarks/bench_backend.py --bench-sizes 10k,100k --bench-data out/bench
+    python -m pytest benchmarks/bench_backend.py --benchmark-autosave          # save a baseline
+    python -m pytest benchmarks/bench_backend.py --benchmark-compare --benchmark-compare-fail=median:20%
+
+The Database.populate_database/save_to_sql benchmarks need the compiled IMessageDatabase
+module on the path and are skipped without it; everything else runs on the generated output.db.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import WORDS, PDF_TOPICS
+import find_pdf.find_pdf as find_pdf_module
+from find_pdf.attachment_catalog import AttachmentCatalog
+from search_message.findmessage import search_imessages, search_imessages_batch
+from search_message.message_context import get_message_context
+from search_message.message_index import get_message_index
+from search_message.semantic_index import EmbeddingStore, normalize_rows, ANN_MIN_ROWS
+from summarize.contact_resolver import get_contact_resolver
+from summarize.summarize import find_contact_by_name
+from visuals.data_visual import plot_message_frequencies
+from visuals.message_frequency import get_all_contact_ids
+
+MESSAGE_QUERIES = ["dinner tonight", "did you get the pdf", "runing late on my way"]
+PDF_QUERIES = ["find the midterm rubric pdf", "lecture notes", "boarding pas"]
+# Keyword lists like the automation sends, for the batch vs sequential comparison
+BATCH_QUERY_COUNT = 50
+
+
+# --- C++ export ---
+
+def test_populate_database(benchmark, synthetic, imessage_database):
+    def populate():
+        database = imessage_database.Database(synthetic['plist_folder'], synthetic['chat_db'], 0)
+        database.populate_database()
+        return database
+
+    database = benchmark.pedantic(populate, rounds=3, iterations=1)
+    assert len(database.get_messages()) > 0
+
+
+def test_save_to_sql(benchmark, synthetic, imessage_database, fresh_output_path):
+    database = imessage_database.Database(synthetic['plist_folder'], synthetic['chat_db'], 0)
+    database.populate_database()
+
+    benchmark.pedantic(lambda path: database.save_to_sql(path), setup=lambda: ((fresh_output_path(),), {}),
+                       rounds=3, iterations=1)
+
+
+# --- message search ---
+
+@pytest.mark.parametrize('mode', ['fts', 'fuzzy', 'hybrid'])
+def test_search_imessages(benchmark, synthetic, mode):
+    output_db = synthetic['output_db']
+    # The in-memory index (and the hybrid search's token index) is built once per server
+    # process, keep that out of the timings
+    index = get_message_index(output_db)
+    index.refresh()
+    index.token_index()
+
+    results = benchmark(lambda: [search_imessages(query, top_k=5, db_path=output_db, mode=mode)
+                                 for query in MESSAGE_QUERIES])
+    assert all(isinstance(result, str) for result in results)
+
+
+def batch_queries(words: list[str], count: int = BATCH_QUERY_COUNT) -> list[str]:
+    return [f"{words[i % len(words)]} {words[(i * 7 + 3) % len(words)]}" for i in range(count)]
+
+
+@pytest.mark.benchmark(group='message batch search')
+@pytest.mark.parametrize('strategy', ['batch', 'sequential'])
+def test_search_imessages_batch(benchmark, synthetic, strategy):
+    output_db = synthetic['output_db']
+    get_message_index(output_db).refresh()
+    queries = batch_queries(WORDS)
+
+    if strategy == 'batch':
+        results = benchmark.pedantic(search_imessages_batch, args=(queries,), kwargs={'db_path': output_db},
+                                     rounds=3, iterations=1)
+    else:
+        results = benchmark.pedantic(lambda: [search_imessages(query, db_path=output_db, mode='fuzzy')
+                                              for query in queries], rounds=3, iterations=1)
+    assert len(results) == len(queries)
+
+
+def test_message_context(benchmark, synthetic):
+    output_db = synthetic['output_db']
+    message_ids = [match['message_id'] for match in get_message_index(output_db).search("dinner tonight", top_k=20)]
+
+    results = benchmark(lambda: [get_message_context(message_id, before=5, after=5, db_path=output_db)
+                                 for message_id in message_ids])
+    assert all(result is not None for result in results)
+
+
+def test_message_index_build(benchmark, synthetic):
+    index = get_message_index(synthetic['output_db'])
+    benchmark.pedantic(lambda: index.refresh(force=True), rounds=3, iterations=1)
+    assert len(index) > 0
+
+
+# Dimension of nomic-embed-text, the default embedding model
+EMBEDDING_DIM = 768
+
+
+@pytest.fixture(scope='session')
+def embedding_store(message_count, tmp_path_factory) -> EmbeddingStore:
+    """message_count random unit vectors, the query side of semantic search without Ollama."""
+    store = EmbeddingStore(str(tmp_path_factory.mktemp(f"embeddings-{message_count}")))
+    rng = np.random.default_rng(0)
+    for begin in range(0, message_count, 100_000):
+        rows = min(100_000, message_count - begin)
+        store.append(np.arange(begin, begin + rows, dtype=np.uint64),
+                     normalize_rows(rng.standard_normal((rows, EMBEDDING_DIM), dtype=np.float32)))
+    if store.needs_ann():
+        store.train_ann()
+    return store
+
+
+@pytest.mark.parametrize('strategy', ['exact', 'ann'])
+def test_semantic_top_k(benchmark, embedding_store, strategy):
+    if strategy == 'ann' and len(embedding_store) < ANN_MIN_ROWS:
+        pytest.skip(f"the IVF index is only built from {ANN_MIN_ROWS} vectors")
+    queries = normalize_rows(np.random.default_rng(1).standard_normal((5, EMBEDDING_DIM), dtype=np.float32))
+    # Passing every row forces the exact path even when the IVF index exists
+    rows = np.arange(len(embedding_store)) if strategy == 'exact' else None
+
+    results = benchmark(embedding_store.top_k, queries, 10, rows)
+    assert all(len(matches) == 10 for matches in results)
+
+
+# --- attachments ---
+
+@pytest.fixture
+def synthetic_attachments(synthetic, monkeypatch):
+    """Points find_pdf at the synthetic chat.db, without a PDF text index."""
+    monkeypatch.setattr(find_pdf_module, 'CHAT_DB_PATH', synthetic['chat_db'])
+    monkeypatch.setattr(find_pdf_module, 'PDF_TEXT_INDEX_PATH', os.path.join(os.path.dirname(synthetic['chat_db']),
+                                                                           'missing_pdf_text_index.db'))
+    return synthetic
+
+
+def test_attachment_catalog_build(benchmark, synthetic):
+    def build():
+        catalog = AttachmentCatalog(synthetic['chat_db'])
+        catalog.refresh()
+        return catalog
+
+    catalog = benchmark.pedantic(build, rounds=3, iterations=1)
+    assert catalog.list_entries(kinds=('pdf',))
+
+
+def test_load_pdf(benchmark, synthetic_attachments):
+    pdfs = benchmark(find_pdf_module.load_pdf)
+    assert pdfs
+
+
+def test_find_pdf(benchmark, synthetic_attachments):
+    find_pdf_module.load_pdf()  # warm the catalog
+    results = benchmark(lambda: [find_pdf_module.find_pdf(query) for query in PDF_QUERIES])
+    assert results[0] is not None
+
+
+@pytest.mark.benchmark(group='attachment batch search')
+@pytest.mark.parametrize('strategy', ['batch', 'sequential'])
+def test_find_pdfs_batch(benchmark, synthetic_attachments, strategy):
+    find_pdf_module.load_pdf()
+    queries = batch_queries(PDF_TOPICS)
+
+    if strategy == 'batch':
+        results = benchmark(find_pdf_module.find_pdfs, queries, top_k=1)
+    else:
+        results = benchmark(lambda: [find_pdf_module.find_pdf(query) for query in queries])
+    assert len(results) == len(queries)
+
+
+# --- contacts ---
+
+@pytest.fixture
+def contact_queries(synthetic) -> dict:
+    contact = next(c for c in synthetic['dataset']['contacts'] if c['last_name'])
+    full_name = f"{contact['first_name']} {contact['last_name']}"
+    return {
+        'exact': full_name,
+        'phone': contact['phone_number'][2:],
+        'fuzzy': full_name[:-1] + 'x',
+    }
+
+
+@pytest.mark.parametrize('kind', ['exact', 'phone', 'fuzzy'])
+def test_find_contact_by_name(benchmark, synthetic, contact_queries, kind):
+    output_db = synthetic['output_db']
+    # Built once per version of output.db
+    get_contact_resolver(output_db).refresh()
+
+    match = benchmark(find_contact_by_name, output_db, contact_queries[kind])
+    assert match is not None
+
+
+# --- analytics ---
+
+def test_plot_message_frequencies(benchmark, synthetic):
+    output_db = synthetic['output_db']
+    handle_ids = get_all_contact_ids(output_db)
+
+    _, _, totals, _ = benchmark.pedantic(plot_message_frequencies, args=(output_db, handle_ids), rounds=5, iterations=1)
+    assert sum(totals.values()) > 0
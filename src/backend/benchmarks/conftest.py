@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+# Benchmarks import the backend packages the same way server.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic_data import generate_synthetic_data, generate_dataset  # noqa: E402
+
+DEFAULT_SIZES = "10k,100k,1m"
+
+
+def parse_size(size: str) -> int:
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500"""
+    size = size.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(size[-1:], 1)
+    return int(float(size.rstrip('km')) * multiplier)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('synthetic data')
+    group.addoption('--bench-sizes', default=DEFAULT_SIZES,
+                    help=f"comma separated message counts to benchmark (default: {DEFAULT_SIZES})")
+    group.addoption('--bench-data', default=None,
+                    help="folder to keep the generated data in between runs (default: a pytest temp folder)")
+    group.addoption('--bench-seed', type=int, default=0)
+
+
+def pytest_generate_tests(metafunc):
+    if 'message_count' in metafunc.fixturenames:
+        sizes = [parse_size(size) for size in metafunc.config.getoption('--bench-sizes').split(',') if size.strip()]
+        metafunc.parametrize('message_count', sizes, ids=[f"{size}msgs" for size in sizes], scope='session')
+
+
+@pytest.fixture(scope='session')
+def synthetic(message_count, request, tmp_path_factory) -> dict:
+    """
+    chat.db, AddressBook/ and output.db with message_count messages.
+    With --bench-data the files are reused by later runs instead of generated again.
+    """
+    seed = request.config.getoption('--bench-seed')
+    data_root = request.config.getoption('--bench-data')
+    if data_root:
+        folder = os.path.join(data_root, f"{message_count}-seed{seed}")
+    else:
+        folder = str(tmp_path_factory.mktemp(f"synthetic-{message_count}"))
+
+    paths = {
+        'chat_db': os.path.join(folder, 'chat.db'),
+        'plist_folder': os.path.join(folder, 'AddressBook'),
+        'output_db': os.path.join(folder, 'output.db'),
+    }
+    if all(os.path.exists(path) for path in paths.values()):
+        return {**paths, 'dataset': generate_dataset(message_count, seed=seed)}
+    return generate_synthetic_data(folder, message_count, seed=seed)
+
+
+@pytest.fixture(scope='session')
+def imessage_database():
+    """The compiled C++ module, or a skip when it hasn't been built (see src/messageDatabase)."""
+    return pytest.importorskip('IMessageDatabase')
+
+
+@pytest.fixture
+def fresh_output_path(tmp_path):
+    """A path for a new output.db, different for every benchmark round."""
+    counter = iter(range(1_000_000))
+    return lambda: str(tmp_path / f"output-{next(counter)}.db")
+
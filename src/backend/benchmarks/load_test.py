@@ -0,0 +1,101 @@
+"""
+Mixed-traffic load test for the chat API, reporting p50/p99 latency per intent.
+
+Start either server first, then point the load test at it:
+
+    python server.py                                  # Flask, one request at a time
+    uvicorn asgi_server:app --port 5000               # ASGI mode
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --duration 30 --concurrency 16
+
+Every virtual user picks an intent at random (weighted by --mix) for each request, so slow
+summaries run alongside searches the way they do when several people use the app.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+import numpy as np
+
+DEFAULT_MESSAGES = {
+    'summarize': "summarize my conversation with John",
+    'pdf': "find the lecture notes pdf",
+    'message': "search for dinner plans",
+}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """'summarize=1,pdf=2,message=7' -> {'summarize': 1.0, 'pdf': 2.0, 'message': 7.0}"""
+    weights = {}
+    for part in mix.split(','):
+        intent, weight = part.split('=')
+        weights[intent.strip()] = float(weight)
+    return weights
+
+
+async def virtual_user(client: httpx.AsyncClient, url: str, weights: dict[str, float], messages: dict[str, str],
+                       deadline: float, results: dict[str, list], rng: random.Random):
+    intents = list(weights)
+    intent_weights = [weights[intent] for intent in intents]
+    while time.perf_counter() < deadline:
+        intent = rng.choices(intents, weights=intent_weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json={'message': messages[intent]})
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        results[intent].append((elapsed, ok))
+
+
+async def run_load_test(base_url: str, duration: float, concurrency: int, weights: dict[str, float],
+                        messages: dict[str, str], timeout: float, seed: int) -> dict[str, list]:
+    url = base_url.rstrip('/') + '/api/ai-response'
+    results = {intent: [] for intent in weights}
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(
+            virtual_user(client, url, weights, messages, deadline, results, random.Random(seed + user))
+            for user in range(concurrency)
+        ))
+    return results
+
+
+def report(results: dict[str, list], duration: float):
+    print(f"{'intent':<10} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>7}")
+    for intent, samples in results.items():
+        if not samples:
+            print(f"{intent:<10} {0:>8}")
+            continue
+        latencies = np.array([elapsed for elapsed, _ in samples]) * 1000
+        errors = sum(1 for _, ok in samples if not ok)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{intent:<10} {len(samples):>8} {errors:>6} {p50:>9.1f} {p99:>9.1f} {latencies.max():>9.1f} "
+              f"{len(samples) / duration:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--concurrency', type=int, default=16, help="virtual users")
+    parser.add_argument('--mix', default='summarize=1,pdf=2,message=7', help="relative weight of each intent")
+    parser.add_argument('--timeout', type=float, default=300, help="per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    for intent, message in DEFAULT_MESSAGES.items():
+        parser.add_argument(f'--{intent}-message', default=message)
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    messages = {intent: getattr(args, f'{intent}_message') for intent in weights}
+    results = asyncio.run(run_load_test(args.url, args.duration, args.concurrency, weights, messages,
+                                        args.timeout, args.seed))
+    report(results, args.duration)
+
+
+if __name__ == "__main__":
+    main()
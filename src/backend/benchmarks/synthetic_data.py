@@ -0,0 +1,483 @@
+"""
+Synthetic iMessage data for benchmarks and tests, so nothing needs a Mac or a real chat.db.
+
+    python benchmarks/synthetic_data.py out/synthetic --messages 100000
+
+writes, under out/synthetic/:
+    chat.db       Apple's message, handle, chat, chat_handle_join, chat_message_join,
+                  attachment and message_attachment_join tables (the columns the exporter
+                  and the attachment catalog read), with about half of the bodies only in
+                  attributedBody blobs, the way recent macOS versions store them
+    AddressBook/  one binary .abcdp plist per contact (First, Last, Phone, Email)
+    output.db     what an export of the above contains (see write_output_db)
+
+Everything is derived from --seed, so the same arguments always give the same files.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import plistlib
+import sqlite3
+import uuid
+
+import numpy as np
+
+# Apple stores message dates as nanoseconds since 2001-01-01 UTC
+APPLE_EPOCH = datetime.datetime(2001, 1, 1, tzinfo=datetime.timezone.utc)
+NANOSECONDS = 1_000_000_000
+END_DATE = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Chris', 'Karen',
+    'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Betty', 'Mark', 'Sandra', 'Steven', 'Ashley',
+    'Andrew', 'Kimberly', 'Kevin', 'Emily', 'Brian', 'Michelle', 'Priya', 'Wei', 'Aisha', 'Diego',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Clark', 'Nguyen', 'Patel', 'Kim', 'Chen',
+]
+WORDS = (
+    "the a to and you i it is that for on are with be at this have so just we not what can do was "
+    "dinner lunch tonight tomorrow later today weekend class lecture midterm exam quiz homework notes "
+    "project meeting call text back home work car train airport flight hotel trip movie game party "
+    "birthday mom dad sister brother coffee pizza tacos gym practice library office rent grocery store "
+    "sounds good okay yes no maybe sure thanks lol haha omg love miss see soon running late on my way "
+    "did you get send me the pdf file photo link address time place plans free busy done almost"
+).split()
+PDF_TOPICS = [
+    'lecture notes', 'midterm rubric', 'practice quiz', 'syllabus', 'lab report', 'problem set',
+    'lease agreement', 'boarding pass', 'resume', 'cover letter', 'invoice', 'meeting agenda',
+]
+OTHER_ATTACHMENTS = [
+    ('IMG_{n:04d}.HEIC', 'image/heic', 'public.heic'),
+    ('IMG_{n:04d}.jpeg', 'image/jpeg', 'public.jpeg'),
+    ('Audio Message {n}.caf', 'audio/x-caf', 'com.apple.coreaudio-format'),
+    ('notes {n}.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+     'org.openxmlformats.wordprocessingml.document'),
+]
+
+
+def apple_timestamp(when: datetime.datetime) -> int:
+    return int((when - APPLE_EPOCH).total_seconds()) * NANOSECONDS
+
+
+def typedstream_length(length: int) -> bytes:
+    """Length prefix of a typedstream string: one byte, or 0x81/0x82 and a little-endian int."""
+    if length < 0x80:
+        return bytes([length])
+    if length < 0x10000:
+        return b'\x81' + length.to_bytes(2, 'little')
+    return b'\x82' + length.to_bytes(4, 'little')
+
+
+def attributed_body(text: str) -> bytes:
+    """
+    An NSAttributedString archived with NSArchiver (typedstream), as in message.attributedBody.
+    The text sits between the NSString '+' marker (0x01 0x2b) and its 0x86 0x84 terminator,
+    which is what MessageData::parse_attributedText looks for.
+    """
+    encoded = text.encode('utf-8')
+    return (
+        b'\x04\x0bstreamtyped\x81\xe8\x03\x84\x01@\x84\x84\x84\x12NSAttributedString\x00'
+        b'\x84\x84\x08NSObject\x00\x85\x92\x84\x84\x84\x08NSString\x01\x94\x84\x01+'
+        + typedstream_length(len(encoded)) + encoded
+        + b'\x86\x84\x02iI\x01' + typedstream_length(len(text))
+        + b'\x92\x84\x84\x84\x0cNSDictionary\x00\x94\x84\x01i\x01\x92\x84\x96\x96'
+        b'\x1d__kIMMessagePartAttributeName\x86\x92\x84\x84\x84\x08NSNumber\x00'
+        b'\x84\x84\x07NSValue\x00\x94\x84\x01*\x84\x99\x99\x00\x86\x86\x86'
+    )
+
+
+def generate_dataset(message_count: int = 10_000, contact_count: int | None = None,
+                     attachment_count: int | None = None, years: int = 3,
+                     attributed_body_ratio: float = 0.5, seed: int = 0) -> dict:
+    """
+    Builds a synthetic message history in memory.
+
+    Returns a dict with:
+        contacts      [{'first_name', 'last_name', 'phone_number', 'email', 'imessage_handle_id', 'sms_handle_id'}]
+        handles       [(ROWID, id, service)]
+        chats         [[handle ROWID, ...]] indexed by chat ROWID - 1; 1:1 chats first, then group chats
+        messages      dict of NumPy columns (rowid, chat_id, handle_id, is_from_me, date, kind)
+                      and 'texts', a list of message bodies
+        attachments   [(ROWID, message ROWID, filename, mime_type, uti)]
+    kind is 0 for a plain text message, 1 for an attachment, 2 for an app (balloon) message.
+    """
+    rng = np.random.default_rng(seed)
+    if contact_count is None:
+        contact_count = int(np.clip(message_count // 200, 20, 2000))
+    if attachment_count is None:
+        attachment_count = max(50, message_count // 50)
+
+    # --- contacts and their handles: every contact has iMessage, some also SMS ---
+    contacts = []
+    handles = []
+    for i in range(contact_count):
+        first = FIRST_NAMES[rng.integers(len(FIRST_NAMES))]
+        last = LAST_NAMES[rng.integers(len(LAST_NAMES))]
+        digits = f"{410 + i // 10_000_000 % 500:03d}{i % 10_000_000:07d}"
+        phone = f"+1{digits}"
+        handles.append((len(handles) + 1, phone, 'iMessage'))
+        imessage_handle_id = len(handles)
+        sms_handle_id = None
+        if rng.random() < 0.3:
+            handles.append((len(handles) + 1, phone, 'SMS'))
+            sms_handle_id = len(handles)
+        contacts.append({
+            'first_name': first,
+            'last_name': last if rng.random() < 0.9 else None,
+            'phone_number': phone,
+            'email': f"{first}.{last}{i}@example.com".lower() if rng.random() < 0.3 else None,
+            'imessage_handle_id': imessage_handle_id,
+            'sms_handle_id': sms_handle_id,
+            # How the number is written on the card; the exporter normalizes it back to +1XXXXXXXXXX
+            'card_phone': f"({digits[:3]}) {digits[3:6]}-{digits[6:]}",
+        })
+    # Numbers that aren't in the address book
+    for i in range(max(5, contact_count // 10)):
+        handles.append((len(handles) + 1, f"+1999{i:07d}", 'iMessage'))
+
+    # --- chats: one 1:1 chat per handle, plus a few group chats the exporter skips ---
+    chats = [[rowid] for rowid, _, _ in handles]
+    one_to_one_count = len(chats)
+    for _ in range(max(2, contact_count // 20)):
+        size = int(rng.integers(3, 7))
+        chats.append(sorted(rng.choice(len(handles), size=min(size, len(handles)), replace=False) + 1))
+
+    # --- messages: a Zipf-ish spread over chats, so a few contacts have most of the history ---
+    chat_weights = 1.0 / np.arange(1, len(chats) + 1) ** 0.8
+    rng.shuffle(chat_weights[:one_to_one_count])
+    chat_weights /= chat_weights.sum()
+    chat_ids = rng.choice(len(chats), size=message_count, p=chat_weights) + 1
+
+    start = END_DATE - datetime.timedelta(days=365 * years)
+    seconds = np.sort(rng.integers(0, int((END_DATE - start).total_seconds()), size=message_count))
+    dates = apple_timestamp(start) + seconds.astype(np.int64) * NANOSECONDS
+
+    is_from_me = rng.random(message_count) < 0.5
+    kinds = np.zeros(message_count, dtype=np.int8)
+    kinds[rng.random(message_count) < 0.03] = 2
+    attachment_messages = rng.choice(message_count, size=min(attachment_count, message_count), replace=False)
+    kinds[attachment_messages] = 1
+
+    # Received messages carry the sender's handle, sent ones have handle_id = 0
+    first_members = np.array([members[0] for members in chats], dtype=np.int64)
+    handle_ids = np.where(is_from_me, 0, first_members[chat_ids - 1])
+    for position in np.flatnonzero(~is_from_me & (chat_ids > one_to_one_count)):
+        members = chats[chat_ids[position] - 1]
+        handle_ids[position] = members[rng.integers(len(members))]
+
+    lengths = rng.integers(2, 16, size=message_count)
+    word_ids = rng.integers(0, len(WORDS), size=int(lengths.sum()))
+    texts = []
+    offset = 0
+    for length in lengths.tolist():
+        texts.append(' '.join(WORDS[w] for w in word_ids[offset:offset + length]))
+        offset += length
+
+    # --- attachments: PDFs with searchable names, plus photos, voice memos and documents ---
+    attachments = []
+    for n, message_position in enumerate(attachment_messages.tolist(), start=1):
+        if rng.random() < 0.4:
+            topic = PDF_TOPICS[rng.integers(len(PDF_TOPICS))]
+            filename, mime_type, uti = f"{topic} {n}.pdf", 'application/pdf', 'com.adobe.pdf'
+        else:
+            pattern, mime_type, uti = OTHER_ATTACHMENTS[rng.integers(len(OTHER_ATTACHMENTS))]
+            filename = pattern.format(n=n)
+        attachments.append((n, message_position + 1, filename, mime_type, uti))
+
+    return {
+        'contacts': contacts,
+        'handles': handles,
+        'chats': chats,
+        'messages': {
+            'rowid': np.arange(1, message_count + 1, dtype=np.int64),
+            'chat_id': chat_ids.astype(np.int64),
+            'handle_id': handle_ids,
+            'is_from_me': is_from_me,
+            'date': dates,
+            'kind': kinds,
+            'attributed_only': rng.random(message_count) < attributed_body_ratio,
+            'texts': texts,
+        },
+        'attachments': attachments,
+        'seed': seed,
+    }
+
+
+def _message_rows(dataset: dict, batch_size: int = 50_000):
+    """chat.db message rows in batches, so 1M messages never exist as Python tuples all at once."""
+    messages = dataset['messages']
+    rng = np.random.default_rng(dataset['seed'] + 1)
+    count = len(messages['rowid'])
+    for begin in range(0, count, batch_size):
+        rows = []
+        for i in range(begin, min(begin + batch_size, count)):
+            kind = int(messages['kind'][i])
+            text = messages['texts'][i]
+            if kind == 1:
+                text = '￼'  # Attachment placeholder
+            attributed_only = bool(messages['attributed_only'][i])
+            rows.append((
+                int(messages['rowid'][i]),
+                str(uuid.UUID(int=int(rng.integers(0, 2 ** 63)) << 64 | i)).upper(),
+                None if attributed_only else text,
+                attributed_body(text),
+                int(messages['handle_id'][i]),
+                int(messages['date'][i]),
+                int(messages['is_from_me'][i]),
+                int(kind == 1),
+                0,
+                1,
+                0,
+                'com.apple.messages.URLBalloonProvider' if kind == 2 else None,
+            ))
+        yield rows
+
+
+def write_chat_db(path: str, dataset: dict, attachments_root: str = '~/Library/Messages/Attachments'):
+    """Writes the dataset as an Apple chat.db (the subset of columns this app reads)."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE handle (
+                ROWID INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE, id TEXT NOT NULL, country TEXT,
+                service TEXT NOT NULL, uncanonicalized_id TEXT, person_centric_id TEXT,
+                UNIQUE (id, service));
+            CREATE TABLE chat (
+                ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, style INTEGER,
+                state INTEGER, chat_identifier TEXT, service_name TEXT, display_name TEXT);
+            CREATE TABLE message (
+                ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, text TEXT,
+                attributedBody BLOB, handle_id INTEGER DEFAULT 0, service TEXT, date INTEGER,
+                date_read INTEGER, date_delivered INTEGER, is_from_me INTEGER DEFAULT 0,
+                cache_has_attachments INTEGER DEFAULT 0, is_audio_message INTEGER DEFAULT 0,
+                was_data_detected INTEGER DEFAULT 0, item_type INTEGER DEFAULT 0,
+                balloon_bundle_id TEXT);
+            CREATE TABLE chat_handle_join (
+                chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+                handle_id INTEGER REFERENCES handle (ROWID) ON DELETE CASCADE,
+                UNIQUE (chat_id, handle_id));
+            CREATE TABLE chat_message_join (
+                chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+                message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE,
+                message_date INTEGER DEFAULT 0,
+                PRIMARY KEY (chat_id, message_id));
+            CREATE TABLE attachment (
+                ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, created_date INTEGER DEFAULT 0,
+                filename TEXT, uti TEXT, mime_type TEXT, transfer_name TEXT, total_bytes INTEGER DEFAULT 0,
+                is_outgoing INTEGER DEFAULT 0);
+            CREATE TABLE message_attachment_join (
+                message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE,
+                attachment_id INTEGER REFERENCES attachment (ROWID) ON DELETE CASCADE,
+                UNIQUE (message_id, attachment_id));
+        """)
+
+        conn.executemany("INSERT INTO handle (ROWID, id, service, uncanonicalized_id) VALUES (?, ?, ?, ?)",
+                         [(rowid, handle, service, handle) for rowid, handle, service in dataset['handles']])
+        handle_names = {rowid: handle for rowid, handle, _ in dataset['handles']}
+        conn.executemany(
+            "INSERT INTO chat (ROWID, guid, style, chat_identifier, service_name) VALUES (?, ?, ?, ?, ?)",
+            [(chat_id, f"iMessage;{'-' if len(members) == 1 else '+'};chat{chat_id}", 45 if len(members) == 1 else 43,
+              handle_names[members[0]] if len(members) == 1 else f"chat{chat_id}", 'iMessage')
+             for chat_id, members in enumerate(dataset['chats'], start=1)])
+        conn.executemany("INSERT INTO chat_handle_join VALUES (?, ?)",
+                         [(chat_id, int(handle_id)) for chat_id, members in enumerate(dataset['chats'], start=1)
+                          for handle_id in members])
+
+        messages = dataset['messages']
+        for rows in _message_rows(dataset):
+            conn.executemany("""
+                INSERT INTO message (ROWID, guid, text, attributedBody, handle_id, date, is_from_me,
+                                     cache_has_attachments, is_audio_message, was_data_detected,
+                                     item_type, balloon_bundle_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        conn.executemany("INSERT INTO chat_message_join VALUES (?, ?, ?)",
+                         zip(messages['chat_id'].tolist(), messages['rowid'].tolist(), messages['date'].tolist()))
+
+        attachment_rows = []
+        for rowid, message_id, filename, mime_type, uti in dataset['attachments']:
+            guid = str(uuid.UUID(int=rowid)).upper()
+            attachment_rows.append((rowid, guid, int(messages['date'][message_id - 1]),
+                                    f"{attachments_root}/{guid[-2:].lower()}/{guid[:2].lower()}/{guid}/{filename}",
+                                    uti, mime_type, filename, 1024 * (rowid % 4096 + 1),
+                                    int(messages['is_from_me'][message_id - 1])))
+        conn.executemany("INSERT INTO attachment VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", attachment_rows)
+        conn.executemany("INSERT INTO message_attachment_join VALUES (?, ?)",
+                         [(message_id, rowid) for rowid, message_id, *_ in dataset['attachments']])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_contact_plists(folder: str, dataset: dict) -> list[str]:
+    """
+    Writes one binary .abcdp plist per contact, laid out like the AddressBook's
+    Sources/<source>/Metadata folder. Returns the written paths.
+    """
+    metadata = os.path.join(folder, 'Sources', '00000000-0000-0000-0000-000000000000', 'Metadata')
+    os.makedirs(metadata, exist_ok=True)
+    paths = []
+    for i, contact in enumerate(dataset['contacts']):
+        card = {
+            'First': contact['first_name'],
+            'Phone': {
+                'values': [contact['card_phone']],
+                'labels': ['_$!<Mobile>!$_'],
+                'identifiers': [f"{i:08X}-PHONE"],
+            },
+            'UID': f"{i:08X}-0000-0000-0000-000000000000:ABPerson",
+        }
+        if contact['last_name']:
+            card['Last'] = contact['last_name']
+        if contact['email']:
+            card['Email'] = {'values': [contact['email']], 'labels': ['_$!<Home>!$_'], 'identifiers': [f"{i:08X}-EMAIL"]}
+        path = os.path.join(metadata, f"{card['UID']}.abcdp")
+        with open(path, 'wb') as f:
+            plistlib.dump(card, f, fmt=plistlib.FMT_BINARY)
+        paths.append(path)
+    return paths
+
+
+def exported_messages(dataset: dict) -> np.ndarray:
+    """
+    Positions of the messages an export keeps: plain text messages in 1:1 chats, like
+    MESSAGE_QUERY_SQL and MessageData::read_raw_row select them.
+    """
+    messages = dataset['messages']
+    one_to_one = np.array([len(members) == 1 for members in dataset['chats']])
+    return np.flatnonzero(one_to_one[messages['chat_id'] - 1] & (messages['kind'] == 0))
+
+
+def write_output_db(path: str, dataset: dict):
+    """
+    Writes the output.db an export of the dataset produces (contacts, messages, rollups,
+    indexes and FTS), for benchmarking the Python side when the C++ module isn't built.
+    Mirrors create_output_tables/create_output_indexes/finish_output in database.cpp.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    messages = dataset['messages']
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE contacts (phone_number TEXT, email TEXT, first_name TEXT, last_name TEXT,
+                                   imessage_handle_id INTEGER, sms_handle_id INTEGER);
+            CREATE TABLE messages (message_id INTEGER PRIMARY KEY, guid TEXT, text TEXT, date_time TEXT,
+                                   date_ts INTEGER, year INTEGER, month INTEGER, hour INTEGER,
+                                   handle_id INTEGER, is_from_me INTEGER);
+            CREATE TABLE contact_month_counts (handle_id INTEGER, year INTEGER, month INTEGER, sent INTEGER,
+                                               received INTEGER, PRIMARY KEY (handle_id, year, month)) WITHOUT ROWID;
+            CREATE TABLE contact_hour_counts (handle_id INTEGER, hour INTEGER, sent INTEGER, received INTEGER,
+                                              PRIMARY KEY (handle_id, hour)) WITHOUT ROWID;
+            CREATE TABLE sync_state (key TEXT PRIMARY KEY, value INTEGER);
+        """)
+        conn.executemany("INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?)", [
+            (c['phone_number'], None, c['first_name'], c['last_name'], c['imessage_handle_id'], c['sms_handle_id'])
+            for c in dataset['contacts']
+        ])
+
+        kept = exported_messages(dataset)
+        date_ts = messages['date'][kept] // NANOSECONDS + int(APPLE_EPOCH.timestamp())
+        # The other participant of a 1:1 chat, also for the messages I sent
+        chat_handles = np.array([members[0] for members in dataset['chats']], dtype=np.int64)
+        handle_ids = chat_handles[messages['chat_id'][kept] - 1]
+        datetimes = date_ts.astype('datetime64[s]')
+        years = datetimes.astype('datetime64[Y]').astype(np.int64) + 1970
+        months = datetimes.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        hours = (date_ts // 3600) % 24
+        date_strings = np.datetime_as_string(datetimes, unit='s')
+
+        texts = messages['texts']
+        for begin in range(0, len(kept), 50_000):
+            end = begin + 50_000
+            conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", zip(
+                messages['rowid'][kept[begin:end]].tolist(),
+                (f"SYNTHETIC-{rowid}" for rowid in messages['rowid'][kept[begin:end]].tolist()),
+                (texts[position] for position in kept[begin:end].tolist()),
+                (date.replace('T', ' ') for date in date_strings[begin:end].tolist()),
+                date_ts[begin:end].tolist(),
+                years[begin:end].tolist(),
+                months[begin:end].tolist(),
+                hours[begin:end].tolist(),
+                handle_ids[begin:end].tolist(),
+                messages['is_from_me'][kept[begin:end]].astype(int).tolist(),
+            ))
+
+        conn.executescript("""
+            CREATE INDEX idx_messages_handle_date ON messages(handle_id, date_ts);
+            CREATE INDEX idx_messages_date ON messages(date_ts);
+            CREATE VIRTUAL TABLE messages_fts USING fts5(
+                text, content='messages', content_rowid='message_id',
+                tokenize='porter unicode61 remove_diacritics 2');
+            INSERT INTO messages_fts(messages_fts) VALUES('rebuild');
+            INSERT INTO contact_month_counts
+                SELECT handle_id, year, month, SUM(is_from_me), SUM(1 - is_from_me)
+                FROM messages GROUP BY handle_id, year, month;
+            INSERT INTO contact_hour_counts
+                SELECT handle_id, hour, SUM(is_from_me), SUM(1 - is_from_me)
+                FROM messages GROUP BY handle_id, hour;
+            PRAGMA user_version = 3;
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def generate_synthetic_data(folder: str, message_count: int = 10_000, seed: int = 0, output_db: bool = True,
+                            **options) -> dict:
+    """
+    Writes chat.db, AddressBook/ and (unless output_db is False) output.db into folder.
+    Returns their paths and the in-memory dataset.
+    """
+    os.makedirs(folder, exist_ok=True)
+    dataset = generate_dataset(message_count, seed=seed, **options)
+    paths = {
+        'chat_db': os.path.join(folder, 'chat.db'),
+        'plist_folder': os.path.join(folder, 'AddressBook'),
+        'output_db': os.path.join(folder, 'output.db'),
+    }
+    write_chat_db(paths['chat_db'], dataset)
+    write_contact_plists(paths['plist_folder'], dataset)
+    if output_db:
+        write_output_db(paths['output_db'], dataset)
+    return {**paths, 'dataset': dataset}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder')
+    parser.add_argument('--messages', type=int, default=10_000)
+    parser.add_argument('--contacts', type=int, default=None, help="default: messages / 200, between 20 and 2000")
+    parser.add_argument('--attachments', type=int, default=None, help="default: messages / 50")
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--attributed-body-ratio', type=float, default=0.5,
+                        help="share of messages whose text is only in attributedBody")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-output-db', action='store_true', help="skip writing output.db")
+    args = parser.parse_args()
+
+    result = generate_synthetic_data(args.folder, args.messages, seed=args.seed, output_db=not args.no_output_db,
+                                     contact_count=args.contacts, attachment_count=args.attachments,
+                                     years=args.years, attributed_body_ratio=args.attributed_body_ratio)
+    dataset = result['dataset']
+    print(f"{len(dataset['messages']['rowid'])} messages, {len(dataset['contacts'])} contacts, "
+          f"{len(dataset['handles'])} handles, {len(dataset['chats'])} chats, "
+          f"{len(dataset['attachments'])} attachments")
+    for key in ('chat_db', 'plist_folder', 'output_db'):
+        print(f"  {key}: {result[key]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from rapidfuzz import process, fuzz
+
+# Upper bound on one cdist score matrix (queries x choices, float32); bigger batches are split
+MAX_SCORE_MATRIX_BYTES = 64 * 1024 * 1024
+
+
+def cdist_top_k(queries: list[str], choices, top_k: int = 5,
+                score_cutoff: float = 0) -> list[list[tuple[int, float]]]:
+    """
+    Scores every (already normalized) query against every choice with process.cdist (WRatio,
+    workers=-1) and keeps each query's top_k. Returns one list of (choice_index, score) per
+    query, best first. Empty queries get no matches and repeated queries are scored once,
+    sharing one list.
+    """
+    results = [[] for _ in queries]
+    positions_by_query = {}
+    for position, query in enumerate(queries):
+        if query:
+            positions_by_query.setdefault(query, []).append(position)
+    if not positions_by_query or not len(choices):
+        return results
+
+    unique_queries = list(positions_by_query)
+    if (os.cpu_count() or 1) == 1:
+        # cdist only wins by spreading the matrix over cores; on one core extract is faster,
+        # since it can skip choices that can no longer beat the current top_k
+        matches = [[(index, score) for _, score, index in process.extract(
+            query, choices, scorer=fuzz.WRatio, processor=None, limit=top_k, score_cutoff=score_cutoff)]
+            for query in unique_queries]
+    else:
+        matches = []
+        rows_per_batch = max(1, MAX_SCORE_MATRIX_BYTES // (4 * len(choices)))
+        for begin in range(0, len(unique_queries), rows_per_batch):
+            scores = process.cdist(unique_queries[begin:begin + rows_per_batch], choices, scorer=fuzz.WRatio,
+                                   processor=None, score_cutoff=score_cutoff, dtype=np.float32, workers=-1)
+            k = min(top_k, scores.shape[1])
+            # Unordered top k per row in O(choices), then sort just those k
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row in range(scores.shape[0]):
+                order = best[row][np.argsort(-scores[row, best[row]], kind='stable')]
+                matches.append([(int(index), float(scores[row, index])) for index in order
+                                if scores[row, index] > 0 and scores[row, index] >= score_cutoff])
+
+    for query, query_matches in zip(unique_queries, matches):
+        for position in positions_by_query[query]:
+            results[position] = query_matches
+    return results
@@ -0,0 +1,36 @@
+import sqlite3
+
+# Per-contact rollup tables that save_to_sql/sync maintain next to the messages table.
+# Readers fall back to grouping the messages themselves for exports without them.
+
+
+def has_rollups(conn: sqlite3.Connection) -> bool:
+    """True if the export contains the contact_month_counts/contact_hour_counts rollups."""
+    row = conn.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name IN ('contact_month_counts', 'contact_hour_counts')
+    """).fetchone()
+    return row[0] == 2
+
+
+def contact_months(conn: sqlite3.Connection, handle_ids: list[int]) -> dict[tuple[int, int], int]:
+    """
+    Message count per (year, month) for a contact, without reading any messages:
+    from the contact_month_counts rollup, or a GROUP BY over messages for exports without it.
+    """
+    placeholders = ', '.join(['?'] * len(handle_ids))
+    if has_rollups(conn):
+        rows = conn.execute(f"""
+            SELECT year, month, SUM(sent + received)
+            FROM contact_month_counts
+            WHERE handle_id IN ({placeholders})
+            GROUP BY year, month
+        """, handle_ids).fetchall()
+    else:
+        rows = conn.execute(f"""
+            SELECT year, month, COUNT(*)
+            FROM messages
+            WHERE handle_id IN ({placeholders})
+            GROUP BY year, month
+        """, handle_ids).fetchall()
+    return {(year, month): count for year, month, count in rows if year and count}
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import logging
+import threading
+from rapidfuzz import process, fuzz, utils
+
+from common.fuzzy_match import cdist_top_k
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAT_DB_PATH = os.path.join("out", "chat.db")
+
+# How each document kind shows up in chat.db's attachment table.
+# A row matches a kind if its MIME type, UTI or file extension does.
+DOCUMENT_KINDS = {
+    'pdf': {
+        'mime_types': ('application/pdf',),
+        'utis': ('com.adobe.pdf',),
+        'extensions': ('.pdf',),
+    },
+    'docx': {
+        'mime_types': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword'),
+        'utis': ('org.openxmlformats.wordprocessingml.document', 'com.microsoft.word.doc'),
+        'extensions': ('.docx', '.doc'),
+    },
+    'keynote': {
+        'mime_types': ('application/x-iwork-keynote-sffkey', 'application/vnd.apple.keynote'),
+        'utis': ('com.apple.iwork.keynote.key', 'com.apple.keynote.key', 'com.apple.iwork.keynote.sffkey'),
+        'extensions': ('.key',),
+    },
+    'image': {
+        'mime_types': ('image/',),  # prefix, covers jpeg/png/heic/gif/...
+        'utis': ('public.jpeg', 'public.png', 'public.heic', 'public.heif', 'com.compuserve.gif', 'public.tiff'),
+        'extensions': ('.jpg', '.jpeg', '.png', '.heic', '.heif', '.gif', '.tiff'),
+    },
+}
+
+
+def classify_attachment(filename: str, mime_type: str | None, uti: str | None) -> str | None:
+    """Returns the DOCUMENT_KINDS key for an attachment row, or None if it's none of them."""
+    extension = os.path.splitext(filename)[1].lower()
+    for kind, rules in DOCUMENT_KINDS.items():
+        if mime_type and any(mime_type.startswith(prefix) for prefix in rules['mime_types']):
+            return kind
+        if uti and uti in rules['utis']:
+            return kind
+        if extension in rules['extensions']:
+            return kind
+    return None
+
+
+class AttachmentCatalog:
+    """
+    In-memory catalog of document attachments from chat.db.
+
+    Loaded once, then refreshed incrementally: only attachment rows with a ROWID above the
+    last one seen are read, and only when chat.db (or its WAL) changed on disk. Names are
+    normalized for rapidfuzz at load time, so a lookup is a dict hit or a single extractOne call.
+    """
+
+    def __init__(self, chat_db_path: str = DEFAULT_CHAT_DB_PATH):
+        self.chat_db_path = chat_db_path
+        self._lock = threading.Lock()
+        self._last_rowid = 0
+        self._file_signature = None
+        # Snapshots, replaced (never mutated) on refresh so readers don't need the lock
+        self.entries: tuple[dict, ...] = ()
+        self._by_id: dict[int, dict] = {}
+        self._by_path: dict[str, dict] = {}
+        self._names_by_kind: dict[str, tuple[list[str], list[dict]]] = {}
+        self._exact_by_kind: dict[str, dict[str, dict]] = {}
+
+    def _current_signature(self):
+        signature = []
+        for path in (self.chat_db_path, self.chat_db_path + "-wal"):
+            try:
+                info = os.stat(path)
+                signature.append((info.st_mtime_ns, info.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self) -> int:
+        """
+        Reads attachments added since the last refresh. Returns the number of new entries.
+        """
+        signature = self._current_signature()
+        if signature == self._file_signature:
+            return 0
+        if not os.path.exists(self.chat_db_path):
+            logger.error(f"Database not found at: {self.chat_db_path}")
+            return 0
+
+        with self._lock:
+            if signature == self._file_signature:
+                return 0
+
+            conn = sqlite3.connect(f'file:{self.chat_db_path}?mode=ro', uri=True)
+            try:
+                rows = conn.execute("""
+                    SELECT ROWID, filename, mime_type, uti
+                    FROM attachment
+                    WHERE ROWID > ? AND filename IS NOT NULL
+                    ORDER BY ROWID
+                """, (self._last_rowid,)).fetchall()
+            finally:
+                conn.close()
+
+            new_entries = []
+            for rowid, filename, mime_type, uti in rows:
+                self._last_rowid = max(self._last_rowid, rowid)
+                kind = classify_attachment(filename, mime_type, uti)
+                if kind is None:
+                    continue
+                display_name = os.path.basename(filename)
+                new_entries.append({
+                    'attachment_id': rowid,
+                    'filename': display_name,
+                    'full_path': os.path.expanduser(filename),  # Expand ~ here
+                    'kind': kind,
+                    'mime_type': mime_type,
+                    # Lowercase name without the extension, as the matcher expects
+                    'match_name': utils.default_process(os.path.splitext(display_name)[0]),
+                })
+
+            if new_entries:
+                entries = self.entries + tuple(new_entries)
+                names_by_kind = {}
+                exact_by_kind = {}
+                for kind in DOCUMENT_KINDS:
+                    kind_entries = [entry for entry in entries if entry['kind'] == kind]
+                    names_by_kind[kind] = ([entry['match_name'] for entry in kind_entries], kind_entries)
+                    # Newest attachment wins when several share a name
+                    exact_by_kind[kind] = {entry['match_name']: entry for entry in kind_entries}
+
+                self._by_id = {entry['attachment_id']: entry for entry in entries}
+                self._by_path = {entry['full_path']: entry for entry in entries}
+                self._names_by_kind = names_by_kind
+                self._exact_by_kind = exact_by_kind
+                self.entries = entries
+            self._file_signature = signature
+
+        if new_entries:
+            logger.info(f"Attachment catalog: {len(new_entries)} new documents, {len(self.entries)} total")
+        return len(new_entries)
+
+    def get(self, attachment_id: int) -> dict | None:
+        """Looks up a cataloged attachment by its chat.db ROWID."""
+        self.refresh()
+        return self._by_id.get(attachment_id)
+
+    def get_by_path(self, full_path: str) -> dict | None:
+        """Looks up a cataloged attachment by its expanded file path."""
+        return self._by_path.get(full_path)
+
+    def list_entries(self, kinds: tuple[str, ...] = ('pdf',)) -> list[dict]:
+        """All cataloged attachments of the given kinds."""
+        self.refresh()
+        return [entry for entry in self.entries if entry['kind'] in kinds]
+
+    def find(self, cleaned_query: str, kinds: tuple[str, ...] = ('pdf',), score_cutoff: float = 40) -> tuple[dict, float] | None:
+        """
+        Fuzzy matches an already cleaned query against the precomputed names.
+        Returns (entry, score) for the best match above score_cutoff, or None.
+        """
+        matches = self.search(cleaned_query, kinds=kinds, limit=1, score_cutoff=score_cutoff)
+        return matches[0] if matches else None
+
+    def search(self, cleaned_query: str, kinds: tuple[str, ...] = ('pdf',), limit: int = 5,
+               score_cutoff: float = 40) -> list[tuple[dict, float]]:
+        """
+        Like find(), but returns up to `limit` (entry, score) pairs, best first.
+        """
+        self.refresh()
+        query = utils.default_process(cleaned_query)
+        if not query:
+            return []
+
+        # Exact name hits are a dict lookup, the fuzzy scan is only needed for the rest
+        if limit == 1:
+            for kind in kinds:
+                entry = self._exact_by_kind.get(kind, {}).get(query)
+                if entry is not None:
+                    return [(entry, 100.0)]
+
+        matches = []
+        for kind in kinds:
+            names, kind_entries = self._names_by_kind.get(kind, ([], []))
+            if not names:
+                continue
+            for _, score, index in process.extract(query, names, scorer=fuzz.WRatio, processor=None,
+                                                   limit=limit, score_cutoff=score_cutoff):
+                matches.append((kind_entries[index], score))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches[:limit]
+
+    def search_many(self, cleaned_queries: list[str], kinds: tuple[str, ...] = ('pdf',), limit: int = 5,
+                    score_cutoff: float = 40) -> list[list[tuple[dict, float]]]:
+        """
+        search() for many queries at once, scored with one rapidfuzz cdist call per kind.
+        Returns one list of up to `limit` (entry, score) pairs per query, best first.
+        """
+        self.refresh()
+        queries = [utils.default_process(query) for query in cleaned_queries]
+        results = [[] for _ in queries]
+        for kind in kinds:
+            names, kind_entries = self._names_by_kind.get(kind, ([], []))
+            for matches, kind_matches in zip(results, cdist_top_k(queries, names, top_k=limit,
+                                                                   score_cutoff=score_cutoff)):
+                matches.extend((kind_entries[index], score) for index, score in kind_matches)
+        for matches in results:
+            matches.sort(key=lambda match: match[1], reverse=True)
+            del matches[limit:]
+        return results
+
+
+_catalogs: dict[str, AttachmentCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_attachment_catalog(chat_db_path: str = DEFAULT_CHAT_DB_PATH) -> AttachmentCatalog:
+    """Returns the process-wide AttachmentCatalog for a chat.db, creating it on first use."""
+    key = os.path.abspath(chat_db_path)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = AttachmentCatalog(chat_db_path)
+        return _catalogs[key]
@@ -1,53 +1,38 @@
+from __future__ import annotations
+
 from rapidfuzz import process
 import os
 import sqlite3
 import logging
 import datetime
+from flask import url_for
+
+from find_pdf.attachment_catalog import get_attachment_catalog
+from find_pdf.pdf_text_index import search_pdf_text, DEFAULT_INDEX_PATH
 
 # Add logging to help debug issues
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+CHAT_DB_PATH = os.path.expanduser("out/chat.db")
+PDF_TEXT_INDEX_PATH = DEFAULT_INDEX_PATH
+
+# Score of a PDF whose text contains every word of the query, scaled down by the share of
+# words found. Kept under 100 so an exact filename match still wins over a content match.
+CONTENT_MATCH_SCORE = 95
+
 def load_pdf() -> list[dict]:
     """
     Load all PDFs from iMessage database.
     Returns a list of dicts: {'filename': ..., 'full_path': ...}
+    (plus 'attachment_id', 'kind' and 'mime_type' from the attachment catalog)
     """
-    db_path = os.path.expanduser("out/chat.db")
-    
-    # Check if database exists
-    if not os.path.exists(db_path):
-        logger.error(f"Database not found at: {db_path}")
-        return []
-    
     try:
-        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
-        cursor = conn.cursor()
-        
-        query = "SELECT attachment.filename FROM attachment WHERE attachment.filename LIKE '%.pdf';"
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        logger.info(f"Found {len(rows)} PDF records in database")
-        
-        pdfs = []
-        for row in rows:
-            if row[0]:  # Check if filename is not None
-                filename = os.path.basename(row[0])
-                full_path = os.path.expanduser(row[0])  # Expand ~ here
-                
-                # Log each PDF found for debugging
-                logger.debug(f"Found PDF: {filename} at {full_path}")
-                
-                pdfs.append({
-                    "filename": filename, 
-                    "full_path": full_path
-                })
-        
-        logger.info(f"Processed {len(pdfs)} valid PDFs")
+        # The catalog is loaded once and only reads attachments added since the last call
+        pdfs = get_attachment_catalog(CHAT_DB_PATH).list_entries(kinds=('pdf',))
+        logger.info(f"Found {len(pdfs)} PDF records in database")
         return pdfs
-        
+
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
         return []
@@ -55,12 +40,28 @@ def load_pdf() -> list[dict]:
         logger.error(f"Unexpected error loading PDFs: {e}")
         return []
 
-def find_pdf(query: str, pdf_list: list[dict]) -> dict | None:
+def clean_pdf_query(query: str) -> str:
+    """Strips instruction words ('find', 'show me', 'pdf', ...) from a PDF search query."""
+    # Clean the query to remove instruction words for better matching
+    query_clean = query.lower().strip()
+    
+    # Remove common instruction words
+    instruction_words = ['find', 'get', 'search for', 'search', 'pdf', 'show me', 'open', 'the', 'file']
+    for word in instruction_words:
+        query_clean = query_clean.replace(word, '')
+    
+    # Clean up extra spaces and special characters
+    return ' '.join(query_clean.split())  # Remove extra whitespace
+
+def find_pdf(query: str, pdf_list: list[dict] | None = None, kinds: tuple[str, ...] = ('pdf',)) -> dict | None:
     """
     Fuzzy match query against PDF filenames.
     Returns a dict with both 'filename' and 'full_path'.
+
+    If pdf_list is None, the query is matched against the attachment catalog's precomputed
+    names (of the given kinds) instead of rebuilding the name list on every call.
     """
-    if not pdf_list:
+    if pdf_list is not None and not pdf_list:
         logger.warning("No PDFs available to search")
         return None
     
@@ -68,16 +69,7 @@ def find_pdf(query: str, pdf_list: list[dict]) -> dict | None:
         logger.warning("Empty search query")
         return None
     
-    # Clean the query to remove instruction words for better matching
-    query_clean = query.lower().strip()
-    
-    # Remove common instruction words
-    instruction_words = ['find', 'get', 'search for', 'search', 'pdf', 'show me', 'open', 'the', 'file']
-    for word in instruction_words:
-        query_clean = query_clean.replace(word, '')
-    
-    # Clean up extra spaces and special characters
-    query_clean = ' '.join(query_clean.split())  # Remove extra whitespace
+    query_clean = clean_pdf_query(query)
     
     if not query_clean:
         logger.warning("Query became empty after cleaning")
@@ -85,14 +77,21 @@ def find_pdf(query: str, pdf_list: list[dict]) -> dict | None:
     
     logger.debug(f"Original query: '{query}' -> Cleaned query: '{query_clean}'")
 
+    if pdf_list is None:
+        matches = rank_pdfs(query_clean, kinds=kinds, limit=1)
+        if matches:
+            entry, confidence = matches[0]
+            logger.info(f"Found match: {entry['filename']} (confidence: {confidence}%)")
+            return entry
+        logger.warning(f"No suitable match found for query: '{query_clean}'")
+        return None
+
     # Create a list of filenames (without extension) for better matching
     pdf_names_for_matching = []
     for pdf in pdf_list:
         # Remove .pdf extension and convert to lowercase for matching
         name_without_ext = os.path.splitext(pdf["filename"])[0].lower()
         pdf_names_for_matching.append(name_without_ext)
-    
-    logger.debug(f"PDF names for matching: {pdf_names_for_matching}")
 
     # Use rapidfuzz to find the best match with a confidence score
     match = process.extractOne(query_clean, pdf_names_for_matching)
@@ -101,20 +100,72 @@ def find_pdf(query: str, pdf_list: list[dict]) -> dict | None:
     
     # Lower the threshold to 40 for more flexible matching
     if match and match[1] > 40:
-        matched_name = match[0]
         confidence = match[1]
-        
-        # Find the original PDF dictionary using the matched name
-        for pdf in pdf_list:
-            pdf_name_without_ext = os.path.splitext(pdf["filename"])[0].lower()
-            if pdf_name_without_ext == matched_name:
-                logger.info(f"Found match: {pdf['filename']} (confidence: {confidence}%)")
-                return pdf
+        # extractOne also returns the index of the match in the list
+        pdf = pdf_list[match[2]]
+        logger.info(f"Found match: {pdf['filename']} (confidence: {confidence}%)")
+        return pdf
     
     logger.warning(f"No suitable match found for query: '{query_clean}'")
     return None
 
 
+def rank_pdfs(query_clean: str, kinds: tuple[str, ...] = ('pdf',), limit: int = 5,
+              score_cutoff: float = 40) -> list[tuple[dict, float]]:
+    """
+    Ranks attachments for a cleaned query by filename and, for PDFs, by their extracted text.
+    Content matches come from the background-built text index, so no PDF is opened here.
+    Returns up to `limit` (entry, score) pairs, best first. Entries found through their
+    content carry a 'matched_page' key.
+    """
+    catalog = get_attachment_catalog(CHAT_DB_PATH)
+    name_matches = catalog.search(query_clean, kinds=kinds, limit=limit, score_cutoff=score_cutoff)
+    return merge_content_matches(catalog, query_clean, name_matches, kinds, limit, score_cutoff)
+
+
+def rank_pdfs_many(queries_clean: list[str], kinds: tuple[str, ...] = ('pdf',), limit: int = 5,
+                   score_cutoff: float = 40) -> list[list[tuple[dict, float]]]:
+    """
+    rank_pdfs() for many cleaned queries: the filenames are scored for all of them in one
+    rapidfuzz cdist call. Returns one ranked list per query.
+    """
+    catalog = get_attachment_catalog(CHAT_DB_PATH)
+    all_name_matches = catalog.search_many(queries_clean, kinds=kinds, limit=limit, score_cutoff=score_cutoff)
+    return [merge_content_matches(catalog, query_clean, name_matches, kinds, limit, score_cutoff)
+            for query_clean, name_matches in zip(queries_clean, all_name_matches)]
+
+
+def merge_content_matches(catalog, query_clean: str, name_matches: list[tuple[dict, float]],
+                          kinds: tuple[str, ...], limit: int, score_cutoff: float) -> list[tuple[dict, float]]:
+    """Adds the PDF text index hits to filename matches, keeping the better score per attachment."""
+    scored = {}
+    for entry, score in name_matches:
+        scored[entry['attachment_id']] = (entry, score)
+
+    if 'pdf' in kinds:
+        for path, page_number, coverage in search_pdf_text(query_clean, limit=limit, index_path=PDF_TEXT_INDEX_PATH):
+            entry = catalog.get_by_path(path)
+            if entry is None:
+                continue
+            score = CONTENT_MATCH_SCORE * coverage
+            if score < score_cutoff:
+                continue
+            current = scored.get(entry['attachment_id'])
+            if current is None or score > current[1]:
+                scored[entry['attachment_id']] = ({**entry, 'matched_page': page_number}, score)
+
+    ranked = sorted(scored.values(), key=lambda match: match[1], reverse=True)
+    return ranked[:limit]
+
+
+def find_pdfs(queries: list[str], kinds: tuple[str, ...] = ('pdf',), top_k: int = 5) -> list[list[tuple[dict, float]]]:
+    """
+    Batch version of find_pdf: cleans every query and returns its top_k (entry, score) matches.
+    Queries that are empty after cleaning get an empty list.
+    """
+    return rank_pdfs_many([clean_pdf_query(query or '') for query in queries], kinds=kinds, limit=top_k)
+
+
 # Enhanced Flask route with better error handling
 def handle_pdf_search(user_message, app):
     """
@@ -152,15 +203,10 @@ def handle_pdf_search(user_message, app):
                     }
                 
                 try:
-                    # Ensure upload folder exists
-                    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    
-                    destination = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    shutil.copy2(full_path, destination)
-                    
-                    file_url = url_for('serve_file', filename=filename, _external=True)
+                    # Served in place from the attachment path, nothing is copied
+                    file_url = url_for('serve_attachment', attachment_id=found_pdf_info['attachment_id'], _external=True)
                     
-                    logger.info(f"Successfully copied and served file: {filename}")
+                    logger.info(f"Serving file: {filename}")
                     
                     return {
                         "content": f"I found the file: {filename}",
@@ -172,10 +218,10 @@ def handle_pdf_search(user_message, app):
                     }
                     
                 except Exception as e:
-                    logger.error(f"Error copying file: {e}")
+                    logger.error(f"Error serving file: {e}")
                     return {
-                        "error": "File copy error",
-                        "content": f"Found the file {filename} but couldn't copy it: {str(e)}",
+                        "error": "File serve error",
+                        "content": f"Found the file {filename} but couldn't serve it: {str(e)}",
                         "timestamp": datetime.datetime.now().isoformat()
                     }
             else:
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rapidfuzz import utils
+
+from find_pdf.attachment_catalog import get_attachment_catalog, DEFAULT_CHAT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join("out", "pdf_text.db")
+
+# Pages longer than this are truncated before indexing, scanned books don't need every word
+MAX_PAGE_CHARS = 20000
+
+
+def extract_pdf_pages(path: str) -> tuple[str, list[str], str | None]:
+    """
+    Extracts the text of every page of a PDF. Runs inside a worker process.
+    Returns (path, page_texts, error), where error is None on success.
+    """
+    try:
+        # Imported here so the server can start (and search filenames) without pypdf installed
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        pages = []
+        for page in reader.pages:
+            try:
+                text = page.extract_text() or ''
+            except Exception:
+                text = ''
+            pages.append(' '.join(text.split())[:MAX_PAGE_CHARS])
+        return path, pages, None
+    except Exception as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
+def create_index_tables(conn: sqlite3.Connection):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS pdf_files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            page_count INTEGER NOT NULL,
+            error TEXT
+        );
+        CREATE TABLE IF NOT EXISTS pdf_pages (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pdf_pages_path ON pdf_pages(path);
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages_fts USING fts5(
+            text,
+            content='pdf_pages',
+            content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        );
+        -- Keep the external-content FTS table in step with pdf_pages
+        CREATE TRIGGER IF NOT EXISTS pdf_pages_ai AFTER INSERT ON pdf_pages BEGIN
+            INSERT INTO pdf_pages_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS pdf_pages_ad AFTER DELETE ON pdf_pages BEGIN
+            INSERT INTO pdf_pages_fts(pdf_pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+    """)
+
+
+class PdfTextIndexer:
+    """
+    Extracts the text of PDF attachments into a local SQLite FTS5 index (out/pdf_text.db).
+
+    Files are keyed by path + mtime + size, so a pass only extracts PDFs that are new or
+    changed since the last one. Extraction runs in a process pool; all writes happen on the
+    calling thread. Queries only ever touch the index, never the PDFs themselves.
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, chat_db_path: str = DEFAULT_CHAT_DB_PATH,
+                 workers: int | None = None):
+        self.index_path = index_path
+        self.chat_db_path = chat_db_path
+        self.workers = workers
+        self._thread = None
+        self._stop = threading.Event()
+        self._pass_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        create_index_tables(conn)
+        return conn
+
+    def pending_files(self, conn: sqlite3.Connection) -> list[tuple[str, int, int]]:
+        """(path, mtime_ns, size) of every cataloged PDF that is missing from the index or changed."""
+        indexed = {path: (mtime_ns, size) for path, mtime_ns, size in
+                   conn.execute("SELECT path, mtime_ns, size FROM pdf_files")}
+
+        pending = []
+        for entry in get_attachment_catalog(self.chat_db_path).list_entries(kinds=('pdf',)):
+            path = entry['full_path']
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue  # Attachment not downloaded to this Mac, nothing to extract
+            if indexed.get(path) != (info.st_mtime_ns, info.st_size):
+                pending.append((path, info.st_mtime_ns, info.st_size))
+        return pending
+
+    def index_pending(self) -> int:
+        """Extracts and indexes every new or changed PDF. Returns the number of files indexed."""
+        with self._pass_lock:
+            conn = self._connect()
+            try:
+                pending = self.pending_files(conn)
+                if not pending:
+                    return 0
+
+                logger.info(f"Indexing text of {len(pending)} PDFs")
+                stats = {path: (mtime_ns, size) for path, mtime_ns, size in pending}
+                indexed = 0
+                pool = ProcessPoolExecutor(max_workers=self.workers)
+                try:
+                    futures = [pool.submit(extract_pdf_pages, path) for path in stats]
+                    for future in as_completed(futures):
+                        if self._stop.is_set():
+                            break
+                        path, pages, error = future.result()
+                        mtime_ns, size = stats[path]
+                        # One transaction per file, so a search never sees half a document
+                        with conn:
+                            conn.execute("DELETE FROM pdf_pages WHERE path = ?", (path,))
+                            conn.executemany(
+                                "INSERT INTO pdf_pages (path, page_number, text) VALUES (?, ?, ?)",
+                                [(path, number, text) for number, text in enumerate(pages, start=1) if text],
+                            )
+                            conn.execute("""
+                                INSERT INTO pdf_files (path, mtime_ns, size, page_count, error)
+                                VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT(path) DO UPDATE SET
+                                    mtime_ns = excluded.mtime_ns,
+                                    size = excluded.size,
+                                    page_count = excluded.page_count,
+                                    error = excluded.error
+                            """, (path, mtime_ns, size, len(pages), error))
+                        if error:
+                            logger.warning(f"Could not extract text from {path}: {error}")
+                        indexed += 1
+                finally:
+                    # On stop, drop the extractions not started yet instead of waiting for all of them
+                    pool.shutdown(cancel_futures=True)
+                return indexed
+            finally:
+                conn.close()
+
+    def start(self, interval_seconds: float = 300):
+        """Runs index_pending() now and then every interval_seconds on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.index_pending()
+                except Exception as e:
+                    logger.error(f"PDF text indexing failed: {e}")
+                self._stop.wait(interval_seconds)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="pdf-text-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def search_pdf_text(cleaned_query: str, limit: int = 5,
+                    index_path: str = DEFAULT_INDEX_PATH) -> list[tuple[str, int, float]]:
+    """
+    Finds PDFs whose extracted text mentions the words of the query (as prefixes).
+    Returns up to `limit` (path, best_page_number, coverage) tuples, where coverage is the
+    fraction of query words found on that page. Best match first: highest coverage, then bm25.
+    Returns [] if the index hasn't been built yet.
+    """
+    terms = utils.default_process(cleaned_query).split()
+    if not terms or not os.path.exists(index_path):
+        return []
+    match_expression = " OR ".join(f'"{term}"*' for term in terms)
+
+    conn = sqlite3.connect(f'file:{index_path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute("""
+            SELECT p.path, p.page_number, p.text
+            FROM pdf_pages_fts
+            JOIN pdf_pages AS p ON p.id = pdf_pages_fts.rowid
+            WHERE pdf_pages_fts MATCH ?
+            ORDER BY bm25(pdf_pages_fts)
+            LIMIT ?
+        """, (match_expression, limit * 20)).fetchall()
+    except sqlite3.OperationalError as e:
+        logger.error(f"PDF text search failed: {e}")
+        return []
+    finally:
+        conn.close()
+
+    # Several pages of the same PDF can match, keep each file's best page
+    best_by_path = {}
+    for bm25_order, (path, page_number, text) in enumerate(rows):
+        words = set(utils.default_process(text).split())
+        covered = sum(1 for term in terms if any(word.startswith(term) for word in words))
+        coverage = covered / len(terms)
+        current = best_by_path.get(path)
+        if current is None or coverage > current[2]:
+            best_by_path[path] = (path, page_number, coverage, bm25_order)
+
+    ranked = sorted(best_by_path.values(), key=lambda match: (-match[2], match[3]))
+    return [(path, page_number, coverage) for path, page_number, coverage, _ in ranked[:limit]]
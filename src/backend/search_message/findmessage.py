@@ -1,63 +1,149 @@
+from __future__ import annotations
+
 import sqlite3
 import os
-from rapidfuzz import process
+from search_message.message_index import get_message_index
+from search_message.fts_search import search_fts
+from search_message.message_context import add_context
+from search_message.semantic_index import get_semantic_index
+from search_message.hybrid_search import hybrid_search, DEFAULT_BUDGETS_MS
+from search_message.search_filters import build_message_filters, FilterError
+
+# The ways find_messages can search, see its docstring
+MODES = ("auto", "fts", "fuzzy", "semantic", "hybrid")
 
-def search_imessages(query: str, top_k: int = 5):
+def search_imessages(query: str, top_k: int = 5, db_path: str = os.path.join("out", "output.db"), mode: str = "auto",
+                     contact: str | None = None, start_date=None, end_date=None, is_from_me: bool | None = None):
     """
     Performs a fuzzy search for messages in the database using rapidfuzz.
     Always returns a string, either with results or a 'not found' message.
+    See find_messages for the arguments and for results with message IDs.
+    """
+    try:
+        content, _ = find_messages(query, top_k=top_k, db_path=db_path, mode=mode, contact=contact,
+                                   start_date=start_date, end_date=end_date, is_from_me=is_from_me)
+    except FilterError as e:
+        return str(e)
+    return content
+
+def find_messages(query: str, top_k: int = 5, db_path: str = os.path.join("out", "output.db"), mode: str = "auto",
+                  contact: str | None = None, start_date=None, end_date=None, is_from_me: bool | None = None,
+                  context: int = 0, weights: dict | None = None, stages: dict | None = None) -> tuple[str, list[dict]]:
     """
+    search_imessages, returning the readable string plus the matches themselves: one dict per
+    distinct text (see message_index.message_match) with the message_id, handle_id and timestamp
+    of its newest matching message and all of the messages that share the text.
+    With context > 0 every match also gets that many neighbouring messages on each side.
+
+    contact, start_date/end_date ('YYYY-MM-DD', inclusive) and is_from_me restrict the search
+    to matching messages before anything is scored: as SQL predicates on the FTS query, or
+    as a mask over the in-memory index. Raises FilterError for an unknown or ambiguous contact or
+    a bad date (see build_message_filters), so callers can tell it apart from an empty result.
+
+    mode:
+      "fuzzy"    - score every message in the in-memory index
+      "fts"      - pre-filter candidates with the FTS5 index, then re-rank them with rapidfuzz
+      "semantic" - nearest message embeddings (see semantic_index), for matches by meaning
+      "hybrid"   - keyword candidates re-ranked on fuzzy, word coverage and embedding signals,
+                   recency and contact breaking ties (see hybrid_search); weights overrides its DEFAULT_WEIGHTS, and a `stages` dict
+                   is filled with each stage's timing
+      "auto"     - try "fts" first, fall back to "fuzzy" if it finds nothing (or there's no FTS index),
+                   and then to "semantic" if the messages have been embedded
+    Raises ValueError for any other mode.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of: {', '.join(MODES)}")
+
     # Clean the query to remove the "search" keyword for better matching
     cleaned_query = query.lower().replace('search', '').strip()
 
+    filters = build_message_filters(contact, start_date, end_date, is_from_me, db_path=db_path)
+
     try:
-        # ---------- 1. Connect to the database and load all messages ----------
-        db_path = os.path.join("out", "output.db")
-        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
-        # Fetching as a dictionary makes it easier to work with the data later
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # We need to fetch all messages to perform the fuzzy search in memory.
-        cursor.execute("""
-            SELECT date_time, text 
-            FROM messages 
-            WHERE text IS NOT NULL AND text != ''
-        """)
-        
-        all_messages = cursor.fetchall()
-        conn.close()
-
-        if not all_messages:
-            return "There are no messages in the database to search."
-
-        # ---------- 2. Perform fuzzy search in memory ----------
-        # Create a dictionary mapping the message text to the full row object
-        # This allows us to easily retrieve the date after finding a text match
-        message_map = {msg['text']: msg for msg in all_messages}
-        
-        # 'process.extract' finds the best matches from a list of choices.
-        # It returns a list of tuples: (text, score, original_index)
-        matches = process.extract(cleaned_query, message_map.keys(), limit=top_k, score_cutoff=60)
+        matches = None
+
+        # ---------- 0. Multi-stage retrieval, fusing every signal ----------
+        if mode == "hybrid":
+            index = get_message_index(db_path)
+            index.refresh()
+            if not len(index):
+                return "There are no messages in the database to search.", []
+
+            pipeline = hybrid_search(cleaned_query, top_k=top_k, db_path=db_path, filters=filters, weights=weights)
+            if stages is not None:
+                stages.update(pipeline['stages'])
+            matches = pipeline['matches']
+
+        # ---------- 1. Narrow down candidates with the full-text index ----------
+        if mode in ("fts", "auto"):
+            # Returns a list of match dicts, or None without an FTS index
+            matches = search_fts(cleaned_query, top_k=top_k, score_cutoff=60, db_path=db_path, filters=filters)
+
+        # ---------- 2. Fuzzy search against the long-lived, pre-normalized index ----------
+        if mode == "fuzzy" or (mode == "auto" and not matches):
+            index = get_message_index(db_path)
+            index.refresh()
+
+            if not len(index):
+                return "There are no messages in the database to search.", []
+
+            matches = index.search(cleaned_query, top_k=top_k, score_cutoff=60, filters=filters)
+
+        # ---------- 3. Match by meaning against the message embeddings ----------
+        if mode == "semantic" or (mode == "auto" and not matches):
+            try:
+                # None until the messages have been embedded. The automatic fallback gets the
+                # hybrid pipeline's semantic budget rather than wait for a cold model to load
+                timeout = DEFAULT_BUDGETS_MS['semantic'] / 1000 if mode == "auto" else None
+                matches = get_semantic_index(db_path).search(cleaned_query, top_k=top_k, filters=filters,
+                                                             timeout=timeout)
+            except Exception as e:
+                if mode == "semantic":
+                    raise
+                print(f"Semantic search unavailable: {e}")
+            if mode == "semantic" and matches is None:
+                return "Semantic search isn't ready yet: the messages haven't been embedded.", []
 
         if not matches:
-            return f"No messages found that closely match your query: '{query}'"
+            return f"No messages found that closely match your query: '{query}'", []
 
-        # ---------- 3. Format results as readable strings ----------
+        add_context(matches, context, db_path=db_path)
+
+        # ---------- 4. Format results as readable strings ----------
         readable_results = []
-        for match_text, score, _ in matches:
-            original_message = message_map[match_text]
-            date_str = original_message['date_time'].split(' ')[0]  # Get 'YYYY-MM-DD'
-            readable_results.append(f"{date_str}: {match_text}")
+        for match in matches:
+            readable_results.append(f"{match['date']}: {match['text']}")
 
-        return "\n\n".join(readable_results)
+        return "\n\n".join(readable_results), matches
 
     except sqlite3.Error as e:
         print(f"Database error in search_imessages: {e}")
-        return f"A database error occurred while searching for messages: {e}"
+        return f"A database error occurred while searching for messages: {e}", []
     except Exception as e:
         print(f"An unexpected error occurred in search_imessages: {e}")
-        return f"An unexpected error occurred: {e}"
+        return f"An unexpected error occurred: {e}", []
+
+def search_imessages_batch(queries: list[str], top_k: int = 5, db_path: str = os.path.join("out", "output.db"),
+                           score_cutoff: float = 60, contact: str | None = None, start_date=None, end_date=None,
+                           is_from_me: bool | None = None, context: int = 0) -> list[list[dict]]:
+    """
+    Fuzzy searches many queries in one pass over the in-memory index (rapidfuzz cdist on all cores),
+    instead of one search_imessages call per query. Takes the same filters and context as find_messages.
+    Returns one list of match dicts per query, best match first.
+    Raises FilterError for an unknown contact or a bad date.
+    """
+    filters = build_message_filters(contact, start_date, end_date, is_from_me, db_path=db_path)
+    # Same cleaning as search_imessages
+    cleaned_queries = [query.lower().replace('search', '').strip() for query in queries]
+
+    index = get_message_index(db_path)
+    index.refresh()
+    all_matches = index.search_many(cleaned_queries, top_k=top_k, score_cutoff=score_cutoff, filters=filters)
+    if context:
+        # Repeated queries share their match lists, so only fill each list once
+        for matches in {id(matches): matches for matches in all_matches}.values():
+            add_context(matches, context, db_path=db_path)
+    return all_matches
 
 # --- Example Usage ---
 if __name__ == "__main__":
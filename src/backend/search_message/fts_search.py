@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from rapidfuzz import process, fuzz, utils
+
+from search_message.message_index import message_entry, message_match, MAX_OCCURRENCES
+from search_message.search_filters import sql_predicates
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+
+
+def has_fts_index(conn: sqlite3.Connection) -> bool:
+    """True if the export contains the messages_fts table built by save_to_sql."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Turns a free-form query into an FTS5 MATCH expression.
+    Every word becomes a quoted prefix term and the terms are OR'ed together,
+    so bm25 ranks messages that contain more of the words higher.
+    """
+    terms = utils.default_process(query).split()
+    return " OR ".join(f'"{term}"*' for term in terms)
+
+
+def fts_candidates(conn: sqlite3.Connection, query: str, limit: int = 500,
+                   filters: dict | None = None) -> list[tuple]:
+    """
+    Returns up to `limit` (message_id, handle_id, date_ts, is_from_me, text) candidates for a query,
+    best bm25 score first. Filters (see search_filters.build_message_filters) are applied in the same query.
+    """
+    match_expression = build_match_expression(query)
+    if not match_expression:
+        return []
+
+    filter_sql, filter_params = sql_predicates(filters, alias='m')
+    cursor = conn.execute(f"""
+        SELECT m.message_id, m.handle_id, m.date_ts, m.is_from_me, m.text
+        FROM messages_fts
+        JOIN messages AS m ON m.rowid = messages_fts.rowid
+        WHERE messages_fts MATCH ?{filter_sql}
+        ORDER BY bm25(messages_fts)
+        LIMIT ?
+    """, (match_expression, *filter_params, limit))
+    return [row for row in cursor if row[4]]
+
+
+def text_occurrences(conn: sqlite3.Connection, text: str, filters: dict | None = None) -> list[tuple] | None:
+    """
+    Every message with exactly this text (passing the filters), newest first, as
+    (message_id, handle_id, date_ts, is_from_me) rows. The FTS index finds the messages that contain
+    its words as a phrase, so this never scans the messages table. None if the text has no words to match.
+    """
+    terms = utils.default_process(text).split()
+    if not terms:
+        return None
+
+    filter_sql, filter_params = sql_predicates(filters, alias='m')
+    return conn.execute(f"""
+        SELECT m.message_id, m.handle_id, m.date_ts, m.is_from_me
+        FROM messages_fts
+        JOIN messages AS m ON m.rowid = messages_fts.rowid
+        WHERE messages_fts MATCH ? AND m.text = ?{filter_sql}
+        ORDER BY m.message_id DESC
+    """, (f'"{" ".join(terms)}"', text, *filter_params)).fetchall()
+
+
+def search_fts(query: str, top_k: int = 5, score_cutoff: float = 60,
+               db_path: str = DEFAULT_DB_PATH, candidate_limit: int = 500,
+               filters: dict | None = None) -> list[dict] | None:
+    """
+    Pre-filters messages with FTS5 MATCH/bm25 and re-ranks only those candidates with rapidfuzz.
+    Returns one match dict per distinct text (see message_index.message_match), best match first,
+    or None if the export has no FTS index.
+    """
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        if not has_fts_index(conn):
+            return None
+        candidates = fts_candidates(conn, query, limit=candidate_limit, filters=filters)
+
+        # Identical texts collapse into one entry, same as the in-memory index
+        rows_for_text = {}
+        for row in candidates:
+            rows_for_text.setdefault(row[4], []).append(row[:4])
+        texts = list(rows_for_text.keys())
+
+        matches = process.extract(
+            utils.default_process(query),
+            [utils.default_process(text) for text in texts],
+            scorer=fuzz.WRatio,
+            processor=None,
+            limit=top_k,
+            score_cutoff=score_cutoff,
+        )
+
+        results = []
+        for _, score, index in matches:
+            text = texts[index]
+            # The candidates stop at candidate_limit, so look up all of the text's messages
+            rows = text_occurrences(conn, text, filters)
+            if not rows:
+                rows = sorted(rows_for_text[text], reverse=True)
+            results.append(message_match(text, score, [message_entry(*row) for row in rows[:MAX_OCCURRENCES]],
+                                         len(rows)))
+        return results
+    finally:
+        conn.close()
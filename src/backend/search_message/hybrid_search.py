@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+from search_message.fts_search import has_fts_index, fts_candidates
+from search_message.message_index import get_message_index
+from search_message.semantic_index import get_semantic_index, SEMANTIC_SCORE_CUTOFF
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+
+# How much each signal counts in the fused score. The relevance signals rank the texts; recency
+# and contact split CONTEXT_SHARE of the score between them. Signals a text doesn't have (no
+# embedding yet) are left out and the remaining weights of their group renormalized.
+DEFAULT_WEIGHTS = {
+    'fuzzy': 0.6,      # rapidfuzz WRatio of the query and the text
+    'coverage': 0.15,  # share of the query's words the text contains
+    'semantic': 0.25,  # cosine similarity of the embeddings, once the messages are embedded
+    'recency': 0.6,    # newer messages first, halving every RECENCY_HALF_LIFE_DAYS
+    'contact': 0.4,    # messages with the people you talk to the most
+}
+RELEVANCE_SIGNALS = ('fuzzy', 'coverage', 'semantic')
+CONTEXT_SIGNALS = ('recency', 'contact')
+# Most of the 0-1 score recency and contact can move, so they only break ties between texts that
+# match about equally well: an exact phrase (WRatio 95) stays ahead of the same words scattered
+# through a longer text (85.5) however old it is
+CONTEXT_SHARE = 0.04
+# Milliseconds each stage may take. The candidates and semantic budgets are enforced (see
+# hybrid_search); fuzzy and rerank are only reported, their work is capped by the candidate counts.
+DEFAULT_BUDGETS_MS = {
+    'candidates': 500,
+    'fuzzy': 100,
+    'semantic': 400,
+    'rerank': 50,
+}
+# Texts the candidate stage hands to fuzzy scoring
+CANDIDATE_LIMIT = 500
+# Best fuzzy candidates that go on to embedding similarity and the final ranking
+RERANK_LIMIT = 100
+# Nearest embeddings added to the candidates, for matches by meaning that share no words
+SEMANTIC_CANDIDATES = 50
+# A result needs this fuzzy score (same bar as search_imessages) or SEMANTIC_SCORE_CUTOFF similarity
+FUZZY_CUTOFF = 60
+RECENCY_HALF_LIFE_DAYS = 180
+# Texts per process.extract call when the fallback scan checks its deadline
+SCAN_CHUNK = 50_000
+
+
+class StageTimer:
+    """Wall time of each pipeline stage against its budget, reported as the response's "stages"."""
+
+    def __init__(self, budgets_ms: dict):
+        self.budgets_ms = budgets_ms
+        self.stages = {}
+        self._name = None
+        self._started = 0.0
+        self.deadline = 0.0
+
+    def start(self, name: str):
+        self._name = name
+        self._started = time.perf_counter()
+        self.deadline = self._started + self.budgets_ms.get(name, float('inf')) / 1000
+
+    def expired(self) -> bool:
+        return time.perf_counter() > self.deadline
+
+    def finish(self, candidates_in: int, candidates_out: int, **notes):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        budget_ms = self.budgets_ms.get(self._name)
+        self.stages[self._name] = {
+            'ms': round(elapsed_ms, 2),
+            'budget_ms': budget_ms,
+            'over_budget': budget_ms is not None and elapsed_ms > budget_ms,
+            'in': candidates_in,
+            'out': candidates_out,
+            **notes,
+        }
+
+
+def first_unique(text_ids: np.ndarray) -> np.ndarray:
+    """text_ids without repeats and -1s, keeping the order of first appearance."""
+    text_ids = text_ids[text_ids >= 0]
+    _, first = np.unique(text_ids, return_index=True)
+    return text_ids[np.sort(first)]
+
+
+def fts_text_candidates(query: str, snapshot: dict, db_path: str, filters: dict | None, limit: int,
+                        timer: StageTimer) -> np.ndarray | None:
+    """
+    Text ids of the best bm25 matches, or None without an FTS index or when SQLite had to be
+    interrupted at the stage deadline (bm25 sorts before the first row comes back, so an
+    interrupted query has nothing to hand on).
+    """
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        if not has_fts_index(conn):
+            return None
+        conn.set_progress_handler(lambda: int(timer.expired()), 1000)
+        try:
+            rows = fts_candidates(conn, query, limit=limit, filters=filters)
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                raise
+            return None
+    finally:
+        conn.close()
+    message_ids = [row[0] for row in rows]
+    return first_unique(get_message_index(db_path).text_ids_for_messages(message_ids, snapshot))
+
+
+def scan_candidates(cleaned_query: str, snapshot: dict, limit: int, timer: StageTimer) -> tuple[np.ndarray, bool]:
+    """
+    Fuzzy scores every text chunk by chunk until the deadline: the fallback for queries whose
+    words appear nowhere (typos). Returns (text ids best first, whether the scan finished).
+    """
+    choices = snapshot['choices']
+    best = []
+    finished = True
+    for begin in range(0, len(choices), SCAN_CHUNK):
+        if begin and timer.expired():
+            finished = False
+            break
+        matches = process.extract(cleaned_query, choices[begin:begin + SCAN_CHUNK], scorer=fuzz.WRatio,
+                                  processor=None, limit=limit, score_cutoff=FUZZY_CUTOFF)
+        best.extend((score, begin + index) for _, score, index in matches)
+    best.sort(key=lambda match: -match[0])
+    indexes = np.array([index for _, index in best[:limit]], dtype=np.int64)
+    text_ids = indexes if snapshot['text_ids'] is None else snapshot['text_ids'][indexes]
+    return text_ids, finished
+
+
+def candidate_texts(query: str, cleaned_query: str, snapshot: dict, db_path: str, filters: dict | None,
+                    limit: int, timer: StageTimer) -> tuple[np.ndarray, str]:
+    """
+    Stage 1: cheap lexical candidates, best first, from the in-memory token index. Until that
+    is built (in the background, after every reload) they come from FTS5 instead. Without an
+    FTS index, or when FTS runs out of time, this waits for the token index rather than
+    answering with nothing, so the budget is overrun once instead of matches being missed.
+    """
+    index = get_message_index(db_path)
+    candidates = None
+    if not index.token_index_ready(snapshot['normalized']):
+        index.warm_token_index()
+        candidates = fts_text_candidates(query, snapshot, db_path, filters, limit, timer)
+        source = 'fts'
+    if candidates is None:
+        source = 'tokens' if index.token_index_ready(snapshot['normalized']) else 'tokens (built now)'
+        candidates = index.token_candidates(cleaned_query, snapshot, limit)
+    if not len(candidates):
+        # At least one chunk is scanned even past the deadline
+        candidates, finished = scan_candidates(cleaned_query, snapshot, limit, timer)
+        source = 'scan' if finished else 'partial scan'
+    return candidates, source
+
+
+def fuzzy_scores(cleaned_query: str, text_ids: np.ndarray, snapshot: dict) -> np.ndarray:
+    """WRatio (0-100) of the query with each text."""
+    if not len(text_ids):
+        return np.zeros(0, dtype=np.float32)
+    normalized = snapshot['normalized']
+    return process.cdist([cleaned_query], [normalized[text_id] for text_id in text_ids.tolist()],
+                         scorer=fuzz.WRatio, processor=None, dtype=np.float32)[0]
+
+
+def word_coverage(cleaned_query: str, text_ids: np.ndarray, snapshot: dict) -> np.ndarray:
+    """0-1: share of the query's distinct words each text contains. WRatio gives a text holding
+    one of the words the same score as one holding all of them."""
+    words = set(cleaned_query.split())
+    if not words:
+        return np.zeros(len(text_ids), dtype=np.float32)
+    normalized = snapshot['normalized']
+    return np.array([len(words.intersection(normalized[text_id].split())) / len(words)
+                     for text_id in text_ids.tolist()], dtype=np.float32)
+
+
+_handle_counts = None
+
+
+def contact_affinity(occurrences: dict, handle_ids: np.ndarray) -> np.ndarray:
+    """0-1 per handle: log of the messages exchanged with it, relative to the most talked-to handle."""
+    global _handle_counts
+    cached = _handle_counts
+    if cached is None or cached[0] is not occurrences['handle_id']:
+        counts = np.bincount(occurrences['handle_id']) if len(occurrences['handle_id']) else np.zeros(1)
+        cached = _handle_counts = (occurrences['handle_id'], np.log1p(counts) / max(np.log1p(counts.max()), 1e-9))
+    affinity = cached[1]
+    return np.where(handle_ids < len(affinity), affinity[np.minimum(handle_ids, len(affinity) - 1)], 0)
+
+
+def recency_scores(date_ts: np.ndarray, newest_ts: int) -> np.ndarray:
+    """0-1: 1 for the newest message in the export, halving every RECENCY_HALF_LIFE_DAYS."""
+    age_days = np.maximum(newest_ts - date_ts, 0) / 86400
+    return np.power(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+
+
+def fuse(signals: dict[str, np.ndarray], weights: dict[str, float]) -> np.ndarray:
+    """Weighted mean (0-1) of the 0-1 signals; NaN signals are skipped and the other weights renormalized."""
+    total = np.zeros(len(next(iter(signals.values()))), dtype=np.float64)
+    weight_sum = np.zeros_like(total)
+    for name, values in signals.items():
+        weight = weights.get(name, 0)
+        if weight <= 0:
+            continue
+        available = ~np.isnan(values)
+        total[available] += weight * values[available]
+        weight_sum[available] += weight
+    return np.divide(total, weight_sum, out=np.zeros_like(total), where=weight_sum > 0)
+
+
+def rank_scores(signals: dict[str, np.ndarray], weights: dict[str, float]) -> np.ndarray:
+    """0-1 ranking score: the fused relevance signals, plus the fused context signals scaled to CONTEXT_SHARE."""
+    relevance = fuse({name: signals[name] for name in RELEVANCE_SIGNALS}, weights)
+    context = fuse({name: signals[name] for name in CONTEXT_SIGNALS}, weights)
+    return (1 - CONTEXT_SHARE) * relevance + CONTEXT_SHARE * context
+
+
+def hybrid_search(query: str, top_k: int = 5, db_path: str = DEFAULT_DB_PATH, filters: dict | None = None,
+                  weights: dict | None = None, budgets_ms: dict | None = None,
+                  candidate_limit: int = CANDIDATE_LIMIT, rerank_limit: int = RERANK_LIMIT) -> dict:
+    """
+    Multi-stage message search. Every stage only sees the previous stage's best candidates:
+        candidates  IDF-weighted token index (FTS5 bm25 while it's being built), or a deadline-bound
+                    fuzzy scan when no word of the query appears anywhere
+        fuzzy       WRatio of those candidates, the best rerank_limit go on
+        semantic    embedding similarity of the survivors plus the nearest embeddings (if embedded)
+        rerank      fuses fuzzy, word coverage and semantic with `weights`, recency and contact
+                    affinity only breaking ties (see rank_scores)
+    weights and budgets_ms override DEFAULT_WEIGHTS / DEFAULT_BUDGETS_MS key by key.
+    Budgets: candidates interrupts FTS5 and the fallback scan at its deadline (but waits for the
+    token index rather than return nothing); semantic skips the stage when the query can't be
+    embedded in time (the vector is cached once it arrives) and skips the nearest-embedding scan
+    when the embed used the whole budget. fuzzy and rerank are advisory: they are only reported,
+    their cost being bounded by candidate_limit and rerank_limit.
+    Returns {"matches": [...], "stages": {...}}: match dicts (see message_index.message_match) whose
+    score is the fused 0-100 score, with each signal under "scores"; and per stage its time, budget
+    and candidate counts.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    timer = StageTimer({**DEFAULT_BUDGETS_MS, **(budgets_ms or {})})
+    index = get_message_index(db_path)
+    index.refresh()
+    snapshot = index.snapshot(filters)
+    cleaned_query = utils.default_process(query)
+    result = {'matches': [], 'stages': timer.stages}
+    if not cleaned_query or not len(snapshot['choices']):
+        return result
+
+    # ---------- 1. Candidate generation ----------
+    timer.start('candidates')
+    candidates, source = candidate_texts(query, cleaned_query, snapshot, db_path, filters, candidate_limit, timer)
+    timer.finish(len(snapshot['choices']), len(candidates), source=source)
+
+    # ---------- 2. Fuzzy scoring, keep the best rerank_limit ----------
+    timer.start('fuzzy')
+    fuzzy = fuzzy_scores(cleaned_query, candidates, snapshot)
+    scored = len(candidates)
+    best = np.argsort(-fuzzy, kind='stable')[:rerank_limit]
+    candidates, fuzzy = candidates[best], fuzzy[best]
+    timer.finish(scored, len(candidates))
+
+    # ---------- 3. Embedding similarity, plus the nearest embeddings as extra candidates ----------
+    semantic = np.full(len(candidates), np.nan, dtype=np.float32)
+    semantic_index = get_semantic_index(db_path)
+    if weights.get('semantic', 0) > 0 and semantic_index.is_ready():
+        timer.start('semantic')
+        scored = len(candidates)
+        notes = {}
+        try:
+            query_vector = semantic_index.query_vector(query, timeout=timer.deadline - time.perf_counter())
+            if query_vector is None:
+                # Ollama too slow (cold model load, busy): rank without embeddings this time
+                notes['skipped'] = 'embedding over budget'
+            else:
+                nearest = np.zeros(0, dtype=np.int64)
+                if not timer.expired():
+                    known = set(candidates.tolist())
+                    nearest = np.array([text_id for text_id, _ in
+                                        semantic_index.nearest_texts(query_vector, SEMANTIC_CANDIDATES, snapshot)[0]
+                                        if text_id not in known], dtype=np.int64)
+                    candidates = np.concatenate([candidates, nearest])
+                    fuzzy = np.concatenate([fuzzy, fuzzy_scores(cleaned_query, nearest, snapshot)])
+                semantic = semantic_index.similarity(query_vector[0], candidates, snapshot)
+                notes['added'] = len(nearest)
+        except Exception as e:
+            # Ollama down or the model missing: rank without embeddings
+            logger.warning(f"Semantic stage skipped: {e}")
+            notes['error'] = str(e)
+        timer.finish(scored, len(candidates), **notes)
+
+    # ---------- 4. Fuse every signal and keep the top_k ----------
+    timer.start('rerank')
+    occurrences = snapshot['occurrences']
+    newest = index.newest_occurrences(candidates, snapshot)
+    signals = {
+        'fuzzy': fuzzy / 100,
+        'coverage': word_coverage(cleaned_query, candidates, snapshot),
+        'semantic': np.clip(semantic, 0, 1),
+        'recency': recency_scores(occurrences['date_ts'][newest], int(occurrences['date_ts'].max())),
+        'contact': contact_affinity(occurrences, occurrences['handle_id'][newest]),
+    }
+    fused = rank_scores(signals, weights)
+    # Recency and contact only reorder results that match the query by words or by meaning
+    relevant = (fuzzy >= FUZZY_CUTOFF) | (np.nan_to_num(semantic) * 100 >= SEMANTIC_SCORE_CUTOFF)
+    ranked = [position for position in np.argsort(-fused, kind='stable').tolist() if relevant[position]][:top_k]
+
+    matches = index.results([(int(candidates[position]), round(float(fused[position]) * 100, 2))
+                             for position in ranked], {**snapshot, 'text_ids': None})
+    for match, position in zip(matches, ranked):
+        match['scores'] = {name: None if np.isnan(values[position]) else round(float(values[position]) * 100, 2)
+                           for name, values in signals.items()}
+    timer.finish(len(candidates), len(matches))
+
+    result['matches'] = matches
+    return result
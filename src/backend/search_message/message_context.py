@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+from search_message.message_index import message_entry
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+# Most neighbouring messages fetched on each side of a message
+MAX_CONTEXT = 50
+
+
+def neighbours(conn: sqlite3.Connection, handle_id: int, date_ts: int, message_id: int,
+               before: int = 5, after: int = 5) -> tuple[list[dict], list[dict]]:
+    """
+    The `before` messages just before and the `after` messages just after one message in the same
+    conversation, both oldest first. Each side is one seek on idx_messages_handle_date
+    (handle_id, date_ts; message_id breaks ties between messages sent in the same second).
+    """
+    earlier = conn.execute("""
+        SELECT message_id, handle_id, date_ts, is_from_me, text
+        FROM messages
+        WHERE handle_id = ? AND (date_ts, message_id) < (?, ?)
+        ORDER BY date_ts DESC, message_id DESC
+        LIMIT ?
+    """, (handle_id, date_ts, message_id, before)).fetchall() if before > 0 else []
+    later = conn.execute("""
+        SELECT message_id, handle_id, date_ts, is_from_me, text
+        FROM messages
+        WHERE handle_id = ? AND (date_ts, message_id) > (?, ?)
+        ORDER BY date_ts, message_id
+        LIMIT ?
+    """, (handle_id, date_ts, message_id, after)).fetchall() if after > 0 else []
+    return [message_entry(*row) for row in reversed(earlier)], [message_entry(*row) for row in later]
+
+
+def get_message_context(message_id: int, before: int = 5, after: int = 5,
+                        db_path: str = DEFAULT_DB_PATH) -> dict | None:
+    """
+    A message with up to `before`/`after` (capped at MAX_CONTEXT) neighbouring messages from its conversation:
+        {"message": {...}, "before": [...], "after": [...]}
+    Returns None if there is no such message.
+    """
+    before = max(0, min(before, MAX_CONTEXT))
+    after = max(0, min(after, MAX_CONTEXT))
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        row = conn.execute("""
+            SELECT message_id, handle_id, date_ts, is_from_me, text
+            FROM messages
+            WHERE message_id = ?
+        """, (message_id,)).fetchone()
+        if row is None:
+            return None
+        earlier, later = neighbours(conn, row[1], row[2], row[0], before, after)
+    finally:
+        conn.close()
+    return {'message': message_entry(*row), 'before': earlier, 'after': later}
+
+
+def add_context(matches: list[dict], context: int, db_path: str = DEFAULT_DB_PATH) -> list[dict]:
+    """
+    Adds "context": {"before": [...], "after": [...]} (context messages on each side, capped at
+    MAX_CONTEXT) around every match's representative message, over one connection.
+    """
+    context = max(0, min(context, MAX_CONTEXT))
+    if not context or not matches:
+        return matches
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        for match in matches:
+            earlier, later = neighbours(conn, match['handle_id'], match['timestamp'], match['message_id'],
+                                        context, context)
+            match['context'] = {'before': earlier, 'after': later}
+    finally:
+        conn.close()
+    return matches
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from array import array
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+from common.fuzzy_match import cdist_top_k
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+# Most occurrences listed per distinct text in a search result ("ok" can have thousands)
+MAX_OCCURRENCES = 50
+
+
+class MessageIndex:
+    """
+    Long-lived fuzzy search index over the messages table of output.db.
+
+    The texts are loaded and normalized (lowercased, punctuation stripped) once,
+    kept in flat tuples, and only reloaded when the database file's mtime changes.
+    Next to them, NumPy arrays with one entry per message (id, handle, timestamp, direction)
+    let filtered searches mask down to the matching messages before anything is scored,
+    and map every distinct text back to all of its messages.
+    """
+
+    def __init__(self, db_path: str | None = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        # Parallel arrays, one entry per distinct message text
+        self.texts: tuple[str, ...] = ()
+        self.normalized: tuple[str, ...] = ()
+        # Parallel arrays, one entry per message, in message_id order
+        self.occurrences = empty_occurrences()
+        # Positions into occurrences grouped by text (see _load)
+        self.occurrence_order = np.zeros(0, dtype=np.int64)
+        self.occurrence_starts = np.zeros(1, dtype=np.int64)
+        # (normalized texts it was built from, inverted index), see token_index()
+        self._tokens = None
+        self._tokens_lock = threading.Lock()
+        self._tokens_thread = None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def is_stale(self) -> bool:
+        """True if the database file changed since the index was last loaded."""
+        if self.db_path is None:
+            # Loaded straight from C++ columns, there is no file to watch
+            return False
+        try:
+            return os.stat(self.db_path).st_mtime_ns != self._mtime_ns
+        except FileNotFoundError:
+            return self._mtime_ns is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reloads the index if the database file changed (or if force is set).
+        Returns True if a reload happened.
+        """
+        if not force and not self.is_stale():
+            return False
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            if not force and not self.is_stale():
+                return False
+
+            mtime_ns = os.stat(self.db_path).st_mtime_ns
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+            try:
+                rows = conn.execute("""
+                    SELECT message_id, handle_id, date_ts, is_from_me, text
+                    FROM messages
+                    WHERE text IS NOT NULL AND text != ''
+                    ORDER BY message_id
+                """).fetchall()
+            finally:
+                conn.close()
+
+            message_ids, handle_ids, date_ts, is_from_me, texts = zip(*rows) if rows else ((),) * 5
+            self._load(message_ids, handle_ids, date_ts, is_from_me, texts)
+            self._mtime_ns = mtime_ns
+
+        print(f"Loaded {len(self.texts)} messages into the search index from {self.db_path}")
+        return True
+
+    def load_columns(self, columns: dict):
+        """
+        Loads the index from the arrays returned by IMessageDatabase.Database.get_message_columns(),
+        skipping output.db entirely.
+        """
+        with self._lock:
+            self._load(columns['message_id'], columns['handle_id'], columns['timestamp'],
+                       columns['is_from_me'], texts_from_columns(columns))
+
+    def _load(self, message_ids, handle_ids, date_ts, is_from_me, texts):
+        # Every distinct text is stored and normalized once; messages point at it by text_id
+        text_ids_by_text = {}
+        text_ids = np.empty(len(texts), dtype=np.int64)
+        keep = np.ones(len(texts), dtype=bool)
+        for position, text in enumerate(texts):
+            if not text:
+                keep[position] = False
+                continue
+            text_ids[position] = text_ids_by_text.setdefault(text, len(text_ids_by_text))
+
+        occurrences = {
+            'message_id': np.asarray(message_ids, dtype=np.int64)[keep],
+            'handle_id': np.asarray(handle_ids, dtype=np.int64)[keep],
+            'date_ts': np.asarray(date_ts, dtype=np.int64)[keep],
+            'is_from_me': np.asarray(is_from_me, dtype=bool)[keep],
+            'text_id': text_ids[keep],
+        }
+        unique_texts = tuple(text_ids_by_text)
+        # Every text's messages as one contiguous run, newest first (like the original message_map
+        # keyed by text, the newest message represents the text):
+        # occurrence_order[occurrence_starts[t]:occurrence_starts[t + 1]] are text t's messages
+        positions = np.arange(len(occurrences['text_id']))
+        occurrence_order = np.lexsort((-positions, occurrences['text_id']))
+        occurrence_starts = np.zeros(len(unique_texts) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(occurrences['text_id'], minlength=len(unique_texts)), out=occurrence_starts[1:])
+
+        # Build the new arrays fully before swapping them in, so concurrent
+        # searches always see a consistent snapshot.
+        self.normalized = tuple(utils.default_process(text) for text in unique_texts)
+        self.occurrence_order = occurrence_order
+        self.occurrence_starts = occurrence_starts
+        self.occurrences = occurrences
+        self.texts = unique_texts
+
+    def filter_mask(self, filters: dict, occurrences: dict | None = None) -> np.ndarray:
+        """
+        Boolean mask over the messages for build_message_filters()-style filters
+        (handle_ids, start_ts, end_ts, is_from_me; None means no restriction).
+        """
+        occurrences = self.occurrences if occurrences is None else occurrences
+        mask = np.ones(len(occurrences['message_id']), dtype=bool)
+        if filters.get('handle_ids') is not None:
+            mask &= np.isin(occurrences['handle_id'], np.asarray(filters['handle_ids'], dtype=np.int64))
+        if filters.get('start_ts') is not None:
+            mask &= occurrences['date_ts'] >= filters['start_ts']
+        if filters.get('end_ts') is not None:
+            mask &= occurrences['date_ts'] < filters['end_ts']
+        if filters.get('is_from_me') is not None:
+            mask &= occurrences['is_from_me'] == bool(filters['is_from_me'])
+        return mask
+
+    def snapshot(self, filters: dict | None) -> dict:
+        """
+        The current arrays plus what to score: every text, or only the texts of the messages
+        that pass the filters. text_ids and mask are None when nothing is filtered out.
+        """
+        snapshot = {
+            'texts': self.texts,
+            'occurrences': self.occurrences,
+            'order': self.occurrence_order,
+            'starts': self.occurrence_starts,
+            'text_ids': None,
+            'mask': None,
+            'choices': self.normalized,
+            'normalized': self.normalized,
+        }
+        if filters:
+            mask = self.filter_mask(filters, snapshot['occurrences'])
+            text_ids = np.unique(snapshot['occurrences']['text_id'][mask])
+            normalized = self.normalized
+            snapshot.update(mask=mask, text_ids=text_ids,
+                            choices=[normalized[text_id] for text_id in text_ids.tolist()])
+        return snapshot
+
+    @staticmethod
+    def newest_occurrences(text_ids: np.ndarray, snapshot: dict) -> np.ndarray:
+        """Position in snapshot['occurrences'] of every text's newest message that passes the snapshot's filters."""
+        order, starts, mask = snapshot['order'], snapshot['starts'], snapshot['mask']
+        if mask is None:
+            return order[starts[text_ids]]
+        newest = np.empty(len(text_ids), dtype=np.int64)
+        for i, text_id in enumerate(text_ids.tolist()):
+            positions = order[starts[text_id]:starts[text_id + 1]]
+            newest[i] = positions[mask[positions]][0]
+        return newest
+
+    @staticmethod
+    def text_ids_for_messages(message_ids, snapshot: dict) -> np.ndarray:
+        """Text id of every message id (-1 if it isn't in the index), through the message_id-sorted occurrences."""
+        all_ids = snapshot['occurrences']['message_id']
+        message_ids = np.asarray(message_ids, dtype=np.int64)
+        if not len(all_ids):
+            return np.full(len(message_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(all_ids, message_ids), len(all_ids) - 1)
+        return np.where(all_ids[positions] == message_ids, snapshot['occurrences']['text_id'][positions], -1)
+
+    def token_index(self, normalized: tuple[str, ...] | None = None) -> tuple[dict, np.ndarray, np.ndarray]:
+        """
+        Inverted index over the normalized texts: (token -> token id, postings, starts), where
+        postings[starts[i]:starts[i + 1]] are the ids of the texts containing token i.
+        Built on first use (only needed when output.db has no FTS index) and after every reload.
+        """
+        normalized = self.normalized if normalized is None else normalized
+        with self._tokens_lock:
+            if self._tokens is not None and self._tokens[0] is normalized:
+                return self._tokens[1]
+
+            vocabulary = {}
+            token_ids = array('q')
+            text_ids = array('q')
+            for text_id, text in enumerate(normalized):
+                for token in set(text.split()):
+                    token_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                    text_ids.append(text_id)
+            token_ids = np.frombuffer(token_ids, dtype=np.int64)
+            postings = np.frombuffer(text_ids, dtype=np.int64)[np.argsort(token_ids, kind='stable')]
+            starts = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(token_ids, minlength=len(vocabulary)), out=starts[1:])
+
+            self._tokens = (normalized, (vocabulary, postings, starts))
+            return self._tokens[1]
+
+    def token_index_ready(self, normalized: tuple[str, ...] | None = None) -> bool:
+        """True if token_index() is built for these normalized texts (default: the current ones)."""
+        tokens = self._tokens
+        return tokens is not None and tokens[0] is (self.normalized if normalized is None else normalized)
+
+    def warm_token_index(self):
+        """Builds token_index() on a background thread, unless it's built or already being built."""
+        if self.token_index_ready() or (self._tokens_thread is not None and self._tokens_thread.is_alive()):
+            return
+        self._tokens_thread = threading.Thread(target=self.token_index, name="message-token-index", daemon=True)
+        self._tokens_thread.start()
+
+    def token_candidates(self, cleaned_query: str, snapshot: dict, limit: int = 500) -> np.ndarray:
+        """
+        Ids of up to `limit` texts sharing the most (IDF weighted) words with an already
+        normalized query, best first. Only texts in the snapshot (after its filters) are returned.
+        """
+        vocabulary, postings, starts = self.token_index(snapshot['normalized'])
+        scores = np.zeros(len(snapshot['texts']), dtype=np.float32)
+        for token in set(cleaned_query.split()):
+            token_id = vocabulary.get(token)
+            if token_id is None:
+                continue
+            texts_with_token = postings[starts[token_id]:starts[token_id + 1]]
+            if len(texts_with_token):
+                scores[texts_with_token] += np.log(len(scores) / len(texts_with_token))
+        if snapshot['text_ids'] is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[snapshot['text_ids']] = True
+            scores[~allowed] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    @staticmethod
+    def results(matches, snapshot: dict) -> list[dict]:
+        """(choice index, score) pairs -> match dicts (see message_match), best first."""
+        occurrences, order, starts, mask = (snapshot['occurrences'], snapshot['order'],
+                                            snapshot['starts'], snapshot['mask'])
+        results = []
+        for index, score in matches:
+            text_id = index if snapshot['text_ids'] is None else int(snapshot['text_ids'][index])
+            positions = order[starts[text_id]:starts[text_id + 1]]
+            if mask is not None:
+                positions = positions[mask[positions]]
+            results.append(message_match(snapshot['texts'][text_id], score, [
+                message_entry(occurrences['message_id'][position], occurrences['handle_id'][position],
+                              occurrences['date_ts'][position], occurrences['is_from_me'][position])
+                for position in positions[:MAX_OCCURRENCES].tolist()
+            ], len(positions)))
+        return results
+
+    def search(self, query: str, top_k: int = 5, score_cutoff: float = 60,
+               filters: dict | None = None) -> list[dict]:
+        """
+        Fuzzy matches the query against every indexed message, or with filters (see
+        search_filters.build_message_filters) only against the messages that pass them.
+        Returns one match dict per distinct text (see message_match), best match first.
+        """
+        self.refresh()
+
+        # Take a local reference to the current snapshot in case a refresh swaps it mid-search
+        snapshot = self.snapshot(filters)
+        cleaned_query = utils.default_process(query)
+        if not cleaned_query or not len(snapshot['choices']):
+            return []
+
+        # The choices are already normalized, so skip the processor on each comparison
+        matches = process.extract(
+            cleaned_query,
+            snapshot['choices'],
+            scorer=fuzz.WRatio,
+            processor=None,
+            limit=top_k,
+            score_cutoff=score_cutoff,
+        )
+        return self.results(((index, score) for _, score, index in matches), snapshot)
+
+    def search_many(self, queries: list[str], top_k: int = 5, score_cutoff: float = 60,
+                    filters: dict | None = None) -> list[list[dict]]:
+        """
+        search() for many queries at once: one rapidfuzz cdist call scores every query against
+        every message on all cores. Returns one list of match dicts per query; repeated queries
+        share the same list.
+        """
+        self.refresh()
+        snapshot = self.snapshot(filters)
+        cleaned_queries = [utils.default_process(query) for query in queries]
+        results = cdist_top_k(cleaned_queries, snapshot['choices'], top_k=top_k, score_cutoff=score_cutoff)
+        # cdist_top_k hands repeated queries the same list, so build their match dicts once
+        converted = {}
+        for matches in results:
+            if id(matches) not in converted:
+                converted[id(matches)] = self.results(matches, snapshot)
+        return [converted[id(matches)] for matches in results]
+
+
+def empty_occurrences() -> dict:
+    return {
+        'message_id': np.zeros(0, dtype=np.int64),
+        'handle_id': np.zeros(0, dtype=np.int64),
+        'date_ts': np.zeros(0, dtype=np.int64),
+        'is_from_me': np.zeros(0, dtype=bool),
+        'text_id': np.zeros(0, dtype=np.int64),
+    }
+
+
+def format_date(date_ts: int) -> str:
+    """UTC epoch seconds -> 'YYYY-MM-DD', the date shown next to a search result."""
+    return str(np.datetime64(int(date_ts), 's').astype('datetime64[D]'))
+
+
+def message_entry(message_id, handle_id, date_ts, is_from_me, text: str | None = None) -> dict:
+    """One message as search results and context windows return it; text is left out when it's known."""
+    entry = {
+        'message_id': int(message_id),
+        'handle_id': int(handle_id) if handle_id is not None else None,
+        'timestamp': int(date_ts),
+        'date': format_date(date_ts),
+        'is_from_me': bool(is_from_me),
+    }
+    if text is not None:
+        entry['text'] = text
+    return entry
+
+
+def message_match(text: str, score: float, occurrences: list[dict], occurrence_count: int) -> dict:
+    """
+    A search hit for one distinct text. The newest matching message (occurrences[0]) represents
+    it: its message_id, handle_id, timestamp and date are copied to the top level.
+    occurrences lists up to MAX_OCCURRENCES of the messages with this exact text, newest first;
+    occurrence_count is how many there are in total.
+    """
+    return {
+        **occurrences[0],
+        'text': text,
+        'score': score,
+        'occurrence_count': occurrence_count,
+        'occurrences': occurrences,
+    }
+
+
+def texts_from_columns(columns: dict) -> list[str]:
+    """
+    Decodes the Arrow-style text buffer (text_data + text_offsets) from get_message_columns().
+    The buffer is copied out once and then sliced, rather than once per message.
+    """
+    data = columns['text_data'].tobytes()
+    offsets = columns['text_offsets'].tolist()
+    return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+
+_indexes: dict[str, MessageIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_message_index(db_path: str = DEFAULT_DB_PATH) -> MessageIndex:
+    """Returns the process-wide MessageIndex for a database, creating it on first use."""
+    key = os.path.abspath(db_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = MessageIndex(db_path)
+        return _indexes[key]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import datetime
+import os
+
+from summarize.contact_resolver import get_contact_resolver, is_ambiguous
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+# A filter silently narrows every result, so a fuzzy-only contact match has to be closer than
+# the MIN_FUZZY_SCORE the resolver keeps (exact hits score 100, nicknames and initials 95)
+MIN_CONTACT_SCORE = 85
+# How many contacts to look at, and to list when the name is ambiguous
+CONTACT_CANDIDATES = 5
+
+
+class FilterError(ValueError):
+    """A search filter that can't be applied, with a message that can be shown to the user."""
+
+
+def parse_date(value, end_of_day: bool = False) -> int | None:
+    """
+    'YYYY-MM-DD' (or an ISO datetime, or a date/datetime) -> UTC epoch seconds, the unit of
+    messages.date_ts. A bare end date includes that whole day.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        when = value
+    elif isinstance(value, datetime.date):
+        when = datetime.datetime(value.year, value.month, value.day)
+        if end_of_day:
+            when += datetime.timedelta(days=1)
+    elif not isinstance(value, str):
+        raise FilterError(f"'{value}' is not a date, use YYYY-MM-DD")
+    else:
+        try:
+            when = datetime.datetime.fromisoformat(value.strip())
+        except ValueError:
+            raise FilterError(f"'{value}' is not a date, use YYYY-MM-DD")
+        if end_of_day and len(value.strip()) == 10:
+            when += datetime.timedelta(days=1)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return int(when.timestamp())
+
+
+def build_message_filters(contact: str | None = None, start_date=None, end_date=None,
+                          is_from_me: bool | None = None, db_path: str = DEFAULT_DB_PATH) -> dict | None:
+    """
+    Turns user-facing filters into what the search path applies before any scoring:
+        handle_ids   the contact's iMessage/SMS handles (resolved through the contacts table), or None
+        start_ts     inclusive UTC epoch seconds, or None
+        end_ts       exclusive UTC epoch seconds, or None (an end date includes its whole day)
+        is_from_me   True for sent, False for received, None for both
+    Returns None when no filter is set. Raises FilterError for an unknown contact, one that only
+    matches fuzzily below MIN_CONTACT_SCORE, an ambiguous one (listing the candidates), a bad date
+    or a value of the wrong type.
+    """
+    filters = {
+        'handle_ids': None,
+        'start_ts': parse_date(start_date),
+        'end_ts': parse_date(end_date, end_of_day=True),
+        'is_from_me': None if is_from_me is None else bool(is_from_me),
+    }
+    if contact is not None and not isinstance(contact, str):
+        raise FilterError("The contact filter must be a name or a phone number.")
+    if contact and contact.strip():
+        candidates = get_contact_resolver(db_path).resolve(contact, top_k=CONTACT_CANDIDATES)
+        if not candidates or candidates[0]['match_score'] < MIN_CONTACT_SCORE:
+            closest = f" The closest is {candidates[0]['display_name']}." if candidates else ''
+            raise FilterError(f"I couldn't find a contact matching '{contact}'.{closest}")
+        if is_ambiguous(candidates):
+            names = ', '.join(candidate['display_name'] for candidate in candidates)
+            raise FilterError(f"'{contact}' matches several contacts: {names}. Which one did you mean?")
+        if not candidates[0]['handle_ids']:
+            raise FilterError(f"{candidates[0]['display_name']} has no messages to search.")
+        filters['handle_ids'] = candidates[0]['handle_ids']
+        filters['contact_name'] = candidates[0]['display_name']
+
+    if all(filters[key] is None for key in ('handle_ids', 'start_ts', 'end_ts', 'is_from_me')):
+        return None
+    return filters
+
+
+def sql_predicates(filters: dict | None, alias: str = 'm') -> tuple[str, list]:
+    """
+    The filters as an SQL condition on messages (AND-ed, starting with ' AND '), plus its parameters.
+    handle_id + date_ts are served by idx_messages_handle_date, date_ts alone by idx_messages_date.
+    """
+    if not filters:
+        return '', []
+    clauses = []
+    params = []
+    if filters.get('handle_ids') is not None:
+        clauses.append(f"{alias}.handle_id IN ({', '.join(['?'] * len(filters['handle_ids']))})")
+        params.extend(filters['handle_ids'])
+    if filters.get('start_ts') is not None:
+        clauses.append(f"{alias}.date_ts >= ?")
+        params.append(filters['start_ts'])
+    if filters.get('end_ts') is not None:
+        clauses.append(f"{alias}.date_ts < ?")
+        params.append(filters['end_ts'])
+    if filters.get('is_from_me') is not None:
+        clauses.append(f"{alias}.is_from_me = ?")
+        params.append(int(filters['is_from_me']))
+    return ''.join(f" AND {clause}" for clause in clauses), params
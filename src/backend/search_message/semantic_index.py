@@ -0,0 +1,558 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import numpy as np
+import ollama
+
+from search_message.message_index import get_message_index, DEFAULT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Small, CPU-friendly embedding model served by the same local Ollama as the summaries
+EMBEDDING_MODEL = "nomic-embed-text"
+# nomic-embed-text is trained with task prefixes for asymmetric (query -> document) search
+DOCUMENT_PREFIX = "search_document: "
+QUERY_PREFIX = "search_query: "
+# Texts per Ollama embed call; every batch is written to disk as soon as it's done
+EMBED_BATCH_SIZE = 128
+# Longer messages are truncated before embedding, the model's context is 2048 tokens
+MAX_EMBED_CHARS = 4000
+STORAGE_DTYPES = ('float16', 'int8')
+# Unit vectors are stored as int8 by scaling each component to [-127, 127]
+INT8_SCALE = 127
+# Upper bound on the float32 copy of the matrix made while scoring; bigger matrices are scored in chunks
+MAX_SCORE_CHUNK_BYTES = 64 * 1024 * 1024
+# From this many vectors on, queries only score the rows of the nearest IVF clusters
+ANN_MIN_ROWS = 200_000
+# Clusters scored per query, out of about sqrt(rows)
+ANN_PROBES = 16
+ANN_TRAINING_SAMPLE = 50_000
+ANN_TRAINING_ITERATIONS = 10
+# Cosine similarity x 100, to sit on the same 0-100 scale as the rapidfuzz scores
+SEMANTIC_SCORE_CUTOFF = 40
+# Query vectors kept for repeated searches
+QUERY_CACHE_SIZE = 256
+# Query embeds that may still be running after their caller gave up; past that new ones aren't started
+MAX_PENDING_QUERY_EMBEDS = 4
+
+
+def text_keys(texts) -> np.ndarray:
+    """64-bit hash of every text, which is how stored vectors are matched back to messages."""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for text in texts), dtype=np.uint64, count=len(texts))
+
+
+def ollama_embed(texts: list[str], model: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Embeds a batch of texts with the local Ollama server. Returns a (len(texts), dim) float32 array."""
+    response = ollama.embed(model=model, input=texts)
+    return np.asarray(response['embeddings'], dtype=np.float32)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k_columns(scores: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+    """Per row of a (queries x candidates) score matrix, the k best (column, score) pairs, best first."""
+    if not scores.shape[1]:
+        return [[] for _ in range(scores.shape[0])]
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    results = []
+    for row in range(scores.shape[0]):
+        order = best[row][np.argsort(-scores[row, best[row]], kind='stable')]
+        results.append([(int(column), float(scores[row, column])) for column in order])
+    return results
+
+
+class EmbeddingStore:
+    """
+    Unit-length message embeddings on disk, in a folder next to output.db:
+
+        meta.json       model, dimension, dtype and row count; rewritten last, so it's the commit point
+        vectors.bin     the (rows, dim) matrix, float16 or int8, memory-mapped for queries
+        keys.bin        uint64 text_keys() hash per row
+        centroids.npy   IVF cluster centers (float32), once there are ANN_MIN_ROWS rows
+        clusters.bin    int32 cluster of every row
+
+    Rows are only ever appended, so new messages cost one embedding each and readers keep
+    working on the rows they already mapped.
+    """
+
+    def __init__(self, folder: str, model: str = EMBEDDING_MODEL, dtype: str = 'float16'):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"dtype must be one of {STORAGE_DTYPES}")
+        self.folder = folder
+        self.model = model
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._meta_mtime_ns = None
+        self.meta = {}
+        self.vectors = np.zeros((0, 0), dtype=dtype)
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.centroids = None
+        self.clusters = np.zeros(0, dtype=np.int32)
+        # Rows grouped by cluster: cluster_order[cluster_starts[c]:cluster_starts[c + 1]]
+        self.cluster_order = np.zeros(0, dtype=np.int64)
+        self.cluster_starts = np.zeros(1, dtype=np.int64)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def is_stale(self) -> bool:
+        """True if meta.json changed since the store was last mapped."""
+        try:
+            return os.stat(self.path('meta.json')).st_mtime_ns != self._meta_mtime_ns
+        except FileNotFoundError:
+            return self._meta_mtime_ns is not None
+
+    def refresh(self, force: bool = False):
+        """(Re)maps the files if another process or thread appended to them."""
+        if not force and not self.is_stale():
+            return
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            try:
+                mtime_ns = os.stat(self.path('meta.json')).st_mtime_ns
+                with open(self.path('meta.json')) as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                mtime_ns, meta = None, {}
+            self._map(meta)
+            self._meta_mtime_ns = mtime_ns
+
+    def _map(self, meta: dict):
+        rows, dim = meta.get('rows', 0), meta.get('dim', 0)
+        if rows:
+            vectors = np.memmap(self.path('vectors.bin'), dtype=meta['dtype'], mode='r', shape=(rows, dim))
+            keys = np.array(np.memmap(self.path('keys.bin'), dtype=np.uint64, mode='r', shape=(rows,)))
+        else:
+            vectors, keys = np.zeros((0, dim), dtype=meta.get('dtype', self.dtype)), np.zeros(0, dtype=np.uint64)
+
+        centroids, clusters = None, np.zeros(0, dtype=np.int32)
+        if rows and meta.get('ann_rows'):
+            centroids = np.load(self.path('centroids.npy'))
+            clusters = np.array(np.memmap(self.path('clusters.bin'), dtype=np.int32, mode='r', shape=(rows,)))
+        cluster_order = np.argsort(clusters, kind='stable')
+        cluster_starts = np.zeros((len(centroids) if centroids is not None else 0) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(clusters, minlength=len(cluster_starts) - 1), out=cluster_starts[1:])
+
+        self.vectors, self.centroids, self.clusters = vectors, centroids, clusters
+        self.cluster_order, self.cluster_starts = cluster_order, cluster_starts
+        self.meta = meta
+        self.keys = keys
+
+    def matches_config(self) -> bool:
+        """False if the stored vectors came from another model or dtype, and have to be rebuilt."""
+        return not self.meta or (self.meta.get('model') == self.model and self.meta.get('dtype') == self.dtype)
+
+    def _write_meta(self, meta: dict):
+        temp_path = self.path('meta.json.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.path('meta.json'))
+
+    def clear(self):
+        """Deletes every stored vector."""
+        with self._lock:
+            for name in ('meta.json', 'vectors.bin', 'keys.bin', 'centroids.npy', 'clusters.bin'):
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+        self.refresh(force=True)
+
+    def append(self, keys: np.ndarray, vectors: np.ndarray):
+        """Appends unit vectors (float32) with their text keys, quantized to the store's dtype."""
+        if not len(keys):
+            return
+        self.refresh()
+        os.makedirs(self.folder, exist_ok=True)
+        with self._lock:
+            rows, dim = self.meta.get('rows', 0), self.meta.get('dim', vectors.shape[1])
+            if vectors.shape[1] != dim:
+                raise ValueError(f"Expected {dim}-dimensional vectors, got {vectors.shape[1]}")
+            if self.dtype == 'int8':
+                stored = np.clip(np.rint(vectors * INT8_SCALE), -INT8_SCALE, INT8_SCALE).astype(np.int8)
+            else:
+                stored = vectors.astype(np.float16)
+
+            files = [('vectors.bin', stored), ('keys.bin', np.asarray(keys, dtype=np.uint64))]
+            if self.centroids is not None:
+                clusters = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+                files.append(('clusters.bin', clusters))
+            for name, array in files:
+                # Drop whatever an interrupted append left past the committed rows, then add the new ones
+                with open(self.path(name), 'ab') as f:
+                    f.truncate(rows * array[:1].nbytes)
+                    f.write(np.ascontiguousarray(array).tobytes())
+            self._write_meta({**self.meta, 'model': self.model, 'dtype': self.dtype, 'dim': dim,
+                              'rows': rows + len(keys)})
+        # Forced: two appends can land within one mtime tick
+        self.refresh(force=True)
+
+    def needs_ann(self) -> bool:
+        """True once the store is big enough for an IVF index, or has doubled since it was trained."""
+        rows = len(self)
+        return rows >= ANN_MIN_ROWS and rows >= 2 * self.meta.get('ann_rows', 0)
+
+    def train_ann(self, seed: int = 0):
+        """
+        Clusters the vectors (spherical k-means on a sample, about sqrt(rows) clusters) and assigns
+        every row to its nearest cluster, so queries only score the rows of the closest clusters.
+        """
+        self.refresh()
+        rows = len(self)
+        cluster_count = max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+        sample = self.rows_as_float(np.sort(rng.choice(rows, size=min(rows, ANN_TRAINING_SAMPLE), replace=False)))
+        centroids = sample[rng.choice(len(sample), size=min(cluster_count, len(sample)), replace=False)]
+        for _ in range(ANN_TRAINING_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            # Clusters that lost every member keep their old center
+            empty = ~np.bincount(assignment, minlength=len(centroids)).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums).astype(np.float32)
+
+        clusters = np.empty(rows, dtype=np.int32)
+        step = self.chunk_rows()
+        for begin in range(0, rows, step):
+            block = self.rows_as_float(slice(begin, begin + step))
+            clusters[begin:begin + step] = np.argmax(block @ centroids.T, axis=1)
+
+        with self._lock:
+            np.save(self.path('centroids.npy'), centroids)
+            clusters.tofile(self.path('clusters.bin'))
+            self._write_meta({**self.meta, 'ann_rows': rows})
+        self.refresh(force=True)
+
+    def chunk_rows(self) -> int:
+        return max(1, MAX_SCORE_CHUNK_BYTES // (4 * max(1, self.vectors.shape[1])))
+
+    def rows_as_float(self, rows) -> np.ndarray:
+        """Stored rows (an index array or a slice) as float32 unit vectors."""
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        return block / INT8_SCALE if self.vectors.dtype == np.int8 else block
+
+    def score_rows(self, query_vectors: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Cosine similarity of every query with every row (or the given rows): (queries, rows) float32."""
+        count = len(self) if rows is None else len(rows)
+        scores = np.empty((len(query_vectors), count), dtype=np.float32)
+        step = self.chunk_rows()
+        for begin in range(0, count, step):
+            end = min(begin + step, count)
+            block = self.rows_as_float(slice(begin, end) if rows is None else rows[begin:end])
+            scores[:, begin:end] = query_vectors @ block.T
+        return scores
+
+    def candidate_rows(self, query_vector: np.ndarray, probes: int = ANN_PROBES) -> np.ndarray:
+        """Rows of the `probes` clusters whose centers are closest to the query."""
+        centroid_scores = self.centroids @ query_vector
+        nearest = np.argpartition(-centroid_scores, min(probes, len(centroid_scores)) - 1)[:probes]
+        return np.sort(np.concatenate([self.cluster_order[self.cluster_starts[cluster]:self.cluster_starts[cluster + 1]]
+                                       for cluster in nearest]))
+
+    def top_k(self, query_vectors: np.ndarray, k: int, rows: np.ndarray | None = None,
+              allowed: np.ndarray | None = None) -> list[list[tuple[int, float]]]:
+        """
+        The k most similar rows per query, as (row, cosine) pairs, best first. Scores all rows
+        (or the given ones) in one matrix product, or with an IVF index only the nearest clusters.
+        allowed (one bool per row) leaves rows out without giving up the IVF index.
+        """
+        self.refresh()
+        if rows is None and self.centroids is not None and len(self) >= ANN_MIN_ROWS:
+            results = []
+            for query_vector in query_vectors:
+                candidates = self.candidate_rows(query_vector)
+                if allowed is not None:
+                    candidates = candidates[allowed[candidates]]
+                matches = top_k_columns(self.score_rows(query_vector[None, :], candidates), k)[0]
+                results.append([(int(candidates[column]), score) for column, score in matches])
+            return results
+
+        if rows is None and allowed is not None:
+            rows = np.flatnonzero(allowed)
+        matches = top_k_columns(self.score_rows(query_vectors, rows), k)
+        if rows is None:
+            return matches
+        return [[(int(rows[column]), score) for column, score in query_matches] for query_matches in matches]
+
+
+class SemanticIndex:
+    """
+    Embedding search over the distinct message texts of output.db.
+
+    Texts are embedded offline in batches (index_pending, or start() to keep up with new exports
+    in the background) into an EmbeddingStore next to output.db. Queries embed only the query and
+    map the best rows back to messages through the in-memory MessageIndex, so results, filters and
+    duplicate occurrences work exactly like the fuzzy search.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, model: str = EMBEDDING_MODEL, dtype: str = 'float16',
+                 embed=ollama_embed):
+        self.db_path = db_path
+        self.embed = embed
+        self.store = EmbeddingStore(os.path.join(os.path.dirname(db_path), 'message_embeddings'), model, dtype)
+        self._mapping_lock = threading.Lock()
+        self._mapping_key = None
+        self._mapping = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Reentrant: a future that is already done runs its callback right away, under the lock
+        self._query_lock = threading.RLock()
+        self._query_vectors = OrderedDict()
+        self._pending_queries = {}
+        self._query_pool = None
+        self._pass_lock = threading.Lock()
+
+    def text_rows(self, texts: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (row of every text or -1, text id of every row or -1) between a MessageIndex snapshot's
+        texts and the store. Cached until either side changes.
+        """
+        with self._mapping_lock:
+            if self._mapping_key is not None and self._mapping_key[0] is texts and self._mapping_key[1] == len(self.store):
+                return self._mapping
+
+            if self._mapping_key is not None and self._mapping_key[0] is texts:
+                keys = self._mapping[2]
+            else:
+                keys = text_keys(texts)
+            store_keys = self.store.keys
+            text_rows = np.full(len(keys), -1, dtype=np.int64)
+            row_texts = np.full(len(store_keys), -1, dtype=np.int64)
+            if len(store_keys) and len(keys):
+                order = np.argsort(store_keys, kind='stable')
+                positions = np.minimum(np.searchsorted(store_keys[order], keys), len(order) - 1)
+                found = store_keys[order][positions] == keys
+                text_rows[found] = order[positions[found]]
+                row_texts[text_rows[found]] = np.flatnonzero(found)
+
+            self._mapping = (text_rows, row_texts, keys)
+            self._mapping_key = (texts, len(self.store))
+            return self._mapping
+
+    def pending_texts(self) -> list[tuple[int, str]]:
+        """(key, text) of every distinct message text that has no vector yet."""
+        index = get_message_index(self.db_path)
+        index.refresh()
+        self.store.refresh()
+        texts = index.texts
+        text_rows, _, keys = self.text_rows(texts)
+        return [(keys[text_id], texts[text_id]) for text_id in np.flatnonzero(text_rows < 0).tolist()]
+
+    def index_pending(self, batch_size: int = EMBED_BATCH_SIZE, progress=None) -> int:
+        """
+        Embeds every message text that isn't in the store yet, batch by batch, and trains the IVF
+        index once the store is big enough. Returns the number of texts embedded.
+        """
+        with self._pass_lock:
+            self.store.refresh()
+            if not self.store.matches_config():
+                logger.info(f"Embeddings were built with {self.store.meta.get('model')} ({self.store.meta.get('dtype')}), rebuilding")
+                self.store.clear()
+
+            pending = self.pending_texts()
+            if pending:
+                logger.info(f"Embedding {len(pending)} message texts with {self.store.model}")
+            done = 0
+            for begin in range(0, len(pending), batch_size):
+                if self._stop.is_set():
+                    break
+                batch = pending[begin:begin + batch_size]
+                vectors = normalize_rows(self.embed([DOCUMENT_PREFIX + text[:MAX_EMBED_CHARS] for _, text in batch],
+                                                    self.store.model))
+                self.store.append(np.array([key for key, _ in batch], dtype=np.uint64), vectors)
+                done += len(batch)
+                if progress:
+                    progress(done, len(pending))
+
+            if self.store.needs_ann() and not self._stop.is_set():
+                logger.info(f"Training the IVF index over {len(self.store)} embeddings")
+                self.store.train_ann()
+            return done
+
+    def search(self, query: str, top_k: int = 5, score_cutoff: float = SEMANTIC_SCORE_CUTOFF,
+               filters: dict | None = None, timeout: float | None = None) -> list[dict] | None:
+        """
+        The message texts closest in meaning to the query, as match dicts (see
+        message_index.message_match) with cosine similarity x 100 as the score.
+        Returns None if nothing has been embedded yet. With a timeout (seconds), the query is
+        embedded through query_vector() and there are no matches when that doesn't finish in time.
+        """
+        results = self.search_many([query], top_k=top_k, score_cutoff=score_cutoff, filters=filters,
+                                   timeout=timeout)
+        return None if results is None else results[0]
+
+    def is_ready(self) -> bool:
+        """True once there are embeddings from the configured model to search."""
+        self.store.refresh()
+        return bool(len(self.store)) and self.store.matches_config()
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """Unit query vectors, one embed call for all of them."""
+        return normalize_rows(self.embed([QUERY_PREFIX + query for query in queries], self.store.model))
+
+    def query_vector(self, query: str, timeout: float | None = None) -> np.ndarray | None:
+        """
+        One query's unit vector (shaped (1, dim), like embed_queries), cached for repeated queries.
+        With a timeout, returns None when the embed call (a cold model load alone can take seconds)
+        doesn't finish in time; it keeps running in the background and its vector is cached for the
+        next search. Raises whatever the embed call raised (Ollama down, model missing).
+        """
+        key = (self.store.model, query)
+        with self._query_lock:
+            vector = self._query_vectors.get(key)
+            if vector is not None:
+                self._query_vectors.move_to_end(key)
+                return vector
+            future = self._pending_queries.get(key)
+            if future is None:
+                if len(self._pending_queries) >= MAX_PENDING_QUERY_EMBEDS:
+                    return None
+                if self._query_pool is None:
+                    self._query_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+                future = self._pending_queries[key] = self._query_pool.submit(self.embed_queries, [query])
+                future.add_done_callback(lambda done: self._cache_query_vector(key, done))
+        try:
+            return future.result(timeout=None if timeout is None else max(timeout, 0))
+        except FutureTimeoutError:
+            return None
+
+    def _cache_query_vector(self, key, future):
+        with self._query_lock:
+            self._pending_queries.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._query_vectors[key] = future.result()
+            while len(self._query_vectors) > QUERY_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+
+    def nearest_texts(self, query_vectors: np.ndarray, k: int, snapshot: dict) -> list[list[tuple[int, float]]]:
+        """
+        The k texts of a MessageIndex snapshot (after its filters) closest to every query vector,
+        as (text_id, cosine) pairs, best first.
+        """
+        text_rows, row_texts, _ = self.text_rows(snapshot['texts'])
+        rows = allowed = None
+        if snapshot['text_ids'] is not None:
+            rows = text_rows[snapshot['text_ids']]
+            rows = np.sort(rows[rows >= 0])
+            if not len(rows):
+                return [[] for _ in query_vectors]
+        elif (row_texts < 0).any():
+            # Texts whose messages are gone from output.db can't be returned. The store keeps their
+            # rows, so skip them inside the search rather than scoring every other row exactly
+            allowed = row_texts >= 0
+        return [[(int(row_texts[row]), score) for row, score in matches]
+                for matches in self.store.top_k(query_vectors, k, rows, allowed=allowed)]
+
+    def similarity(self, query_vector: np.ndarray, text_ids: np.ndarray, snapshot: dict) -> np.ndarray:
+        """Cosine similarity of the query with each of the snapshot's texts (NaN for texts not embedded yet)."""
+        text_rows, _, _ = self.text_rows(snapshot['texts'])
+        rows = text_rows[text_ids]
+        similarity = np.full(len(text_ids), np.nan, dtype=np.float32)
+        embedded = rows >= 0
+        if embedded.any():
+            similarity[embedded] = self.store.score_rows(query_vector[None, :], rows[embedded])[0]
+        return similarity
+
+    def search_many(self, queries: list[str], top_k: int = 5, score_cutoff: float = SEMANTIC_SCORE_CUTOFF,
+                    filters: dict | None = None, timeout: float | None = None) -> list[list[dict]] | None:
+        """
+        search() for many queries: one embed call and one matrix product for all of them.
+        With a timeout, shared by all of the queries, each one goes through query_vector() instead
+        and the queries not embedded in time get no matches.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        if not self.is_ready():
+            return None
+
+        index = get_message_index(self.db_path)
+        index.refresh()
+        snapshot = index.snapshot(filters)
+
+        results = [[] for _ in queries]
+        positions = [position for position, query in enumerate(queries) if query.strip()]
+        if not positions:
+            return results
+        if deadline is None:
+            query_vectors = self.embed_queries([queries[position] for position in positions])
+        else:
+            vectors = [self.query_vector(queries[position], timeout=deadline - time.perf_counter())
+                       for position in positions]
+            positions = [position for position, vector in zip(positions, vectors) if vector is not None]
+            if not positions:
+                return results
+            query_vectors = np.concatenate([vector for vector in vectors if vector is not None])
+        # Scored per text, so results are already one per distinct text
+        text_snapshot = {**snapshot, 'text_ids': None}
+        for position, matches in zip(positions, self.nearest_texts(query_vectors, top_k, snapshot)):
+            scored = [(text_id, score * 100) for text_id, score in matches if score * 100 >= score_cutoff]
+            results[position] = index.results(scored, text_snapshot)
+        return results
+
+    def start(self, interval_seconds: float = 300):
+        """Runs index_pending() now and then every interval_seconds on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.index_pending()
+                except Exception as e:
+                    logger.error(f"Message embedding failed: {e}")
+                self._stop.wait(interval_seconds)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="message-embedder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_indexes: dict[str, SemanticIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_semantic_index(db_path: str = DEFAULT_DB_PATH) -> SemanticIndex:
+    """Returns the process-wide SemanticIndex for a database, creating it on first use."""
+    key = os.path.abspath(db_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = SemanticIndex(db_path)
+        return _indexes[key]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Embed the messages of output.db for semantic search")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--dtype', choices=STORAGE_DTYPES, default='float16')
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    semantic_index = SemanticIndex(args.db, model=args.model, dtype=args.dtype)
+    count = semantic_index.index_pending(
+        batch_size=args.batch_size,
+        progress=lambda done, total: print(f"\r{done}/{total} texts embedded", end='', flush=True))
+    print(f"\nEmbedded {count} new texts, {len(semantic_index.store)} in {semantic_index.store.folder}")
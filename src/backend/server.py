@@ -1,13 +1,25 @@
+from __future__ import annotations
+
 import datetime
+import hashlib
+import json
+import mimetypes
 import os
-import shutil
-from flask import Flask, request, jsonify, url_for, send_from_directory
+import queue
+import threading
+from flask import Flask, request, jsonify, url_for, send_from_directory, send_file, abort, Response, stream_with_context
 from flask_cors import CORS
 
 # --- Import your custom logic modules ---
-from summarize.summarize import handle_summarize_request
-from find_pdf.find_pdf import load_pdf, find_pdf
-from search_message.findmessage import search_imessages
+from summarize.summarize import handle_summarize_request, TIME_PERIOD_PATTERN
+from find_pdf.find_pdf import find_pdf, find_pdfs
+from search_message.findmessage import find_messages, search_imessages_batch
+from search_message.message_context import get_message_context, MAX_CONTEXT
+from search_message.message_index import get_message_index
+from search_message.search_filters import FilterError
+from find_pdf.attachment_catalog import get_attachment_catalog, DOCUMENT_KINDS
+from find_pdf.pdf_text_index import PdfTextIndexer
+from search_message.semantic_index import get_semantic_index
 
 # --- INITIALIZE THE FLASK APP ---
 app = Flask(__name__)
@@ -18,6 +30,46 @@ CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+OUTPUT_DB_PATH = os.path.join("out", "output.db")
+# Debug mode, with the auto-reloader; FLASK_DEBUG=0 turns both off
+DEBUG = os.environ.get("FLASK_DEBUG", "1") != "0"
+# How often an idle summary stream sends an SSE comment, so dropped clients are noticed
+SSE_KEEPALIVE_SECONDS = 10
+# Most queries one /api/search/batch request may carry
+MAX_BATCH_QUERIES = 1000
+# How chat messages are searched (see search_message.findmessage.find_messages): the multi-stage
+# pipeline ranking on fuzzy, word coverage and embedding scores, recency and contact breaking ties
+MESSAGE_SEARCH_MODE = "hybrid"
+# Overrides for hybrid_search.DEFAULT_WEIGHTS, e.g. {"semantic": 0.5}
+MESSAGE_SEARCH_WEIGHTS = None
+# Keys of the optional "filters" object message searches accept
+MESSAGE_FILTER_KEYS = ('contact', 'start_date', 'end_date', 'is_from_me')
+
+# Load the message search index once for the lifetime of the process.
+# It reloads itself whenever output.db changes on disk.
+message_index = get_message_index(OUTPUT_DB_PATH)
+try:
+    message_index.refresh()
+    # The hybrid search's candidate stage, built in the background
+    message_index.warm_token_index()
+except Exception as e:
+    print(f"Message index not loaded at startup: {e}")
+
+# Same for the attachment catalog: read chat.db's attachments once, then only new rows
+CHAT_DB_PATH = os.path.join("out", "chat.db")
+attachment_catalog = get_attachment_catalog(CHAT_DB_PATH)
+try:
+    attachment_catalog.refresh()
+except Exception as e:
+    print(f"Attachment catalog not loaded at startup: {e}")
+
+# Extract PDF text into out/pdf_text.db in the background, so PDFs can be found by content
+pdf_text_indexer = PdfTextIndexer(chat_db_path=CHAT_DB_PATH)
+
+# Embed new messages in the background for semantic search. Opt in with SEMANTIC_SEARCH=1,
+# after `ollama pull nomic-embed-text`; the first pass embeds the whole export.
+SEMANTIC_SEARCH = os.environ.get("SEMANTIC_SEARCH") == "1"
+semantic_index = get_semantic_index(OUTPUT_DB_PATH)
 
 
 # --- INTENT CLASSIFICATION UTILITY ---
@@ -44,91 +96,399 @@ def serve_file(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
 
-# --- API ENDPOINT ---
-@app.route("/api/ai-response", methods=["POST"])
-def handle_ai_response():
+def attachment_etag(attachment_id: int, info: os.stat_result) -> str:
+    # Opaque validator from the file's identity and stat, so the PDF is never read just to hash it
+    return hashlib.sha1(f"{attachment_id}:{info.st_mtime_ns}:{info.st_size}".encode()).hexdigest()
+
+
+def attachment_mimetype(entry: dict) -> str:
+    return entry['mime_type'] or mimetypes.guess_type(entry['filename'])[0] or 'application/octet-stream'
+
+
+@app.route('/files/attachments/<int:attachment_id>')
+def serve_attachment(attachment_id):
     """
-    Handles requests by categorizing the user's intent and routing to the correct logic module.
+    Streams a cataloged attachment straight from its path in the Messages folder, no copy.
+    Only attachment IDs known to the catalog can be served, never arbitrary paths.
+    Supports conditional GET (ETag / If-None-Match, Last-Modified) and HTTP Range requests.
     """
-    data = request.get_json()
-    user_message = data.get('message')
+    entry = attachment_catalog.get(attachment_id)
+    if entry is None:
+        abort(404)
 
-    if not user_message:
-        return jsonify({"error": "No message provided"}), 400
+    full_path = entry['full_path']
+    try:
+        info = os.stat(full_path)
+    except OSError:
+        abort(404)
 
-    print(f"Received message: '{user_message}'")
-    intent = categorize_query(user_message)
-    print(f"Detected intent: '{intent}'")
-    
+    etag = attachment_etag(attachment_id, info)
+    mimetype = attachment_mimetype(entry)
+
+    return send_file(
+        full_path,
+        mimetype=mimetype,
+        download_name=entry['filename'],
+        conditional=True,  # answers If-None-Match/If-Modified-Since with 304 and Range with 206
+        etag=etag,
+        last_modified=info.st_mtime,
+        max_age=3600,
+    )
+
+
+# --- ROUTING ---
+def route_message(user_message: str, intent: str, filters: dict | None = None,
+                  selection: dict | None = None) -> tuple[dict, int]:
+    """
+    Routes a message to the correct logic module based on its intent.
+    filters (see message_filters) only apply to message searches, selection (see
+    summarize_selection) only to summaries.
+    Returns the response body and its HTTP status.
+    """
     # --- Route to the appropriate logic based on the detected intent ---
     if 'summarize' in intent:
         print("Routing to conversation summarization...")
         print(f"User message: '{user_message}'")
         
         # Use the new enhanced summarize handler
-        result = handle_summarize_request(user_message, "out/output.db")
+        result = handle_summarize_request(user_message, OUTPUT_DB_PATH, **(selection or {}))
         
         # Return appropriate response based on whether there was an error
         if 'error' in result:
-            return jsonify(result), 400  # Return error with 400 status
+            return result, 400  # Return error with 400 status
         else:
-            return jsonify(result)  # Return successful summary
+            return result, 200  # Return successful summary
 
     elif 'pdf' in intent:
         print("Routing to PDF search...")
-        all_pdfs = load_pdf()
-        found_pdf_info = find_pdf(user_message, all_pdfs)
-        
-        print(f"Here is the pdfs{all_pdfs}")
+        file_url_for = lambda attachment_id: url_for('serve_attachment', attachment_id=attachment_id, _external=True)
+        return pdf_search_response(user_message, file_url_for), 200
 
-        if found_pdf_info:
-            filename = found_pdf_info.get('filename')
-            full_path = found_pdf_info.get('full_path')
-            
-            if filename and full_path and os.path.exists(full_path):
-                destination = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                shutil.copy2(full_path, destination)
-                file_url = url_for('serve_file', filename=filename, _external=True)
-                
-                return jsonify({
-                    "content": f"I found the file: {filename}",
-                    "file_url": file_url,
-                    "file_name": filename,
-                    "file_type": "pdf",
-                    "is_pdf": True,
-                    "timestamp": datetime.datetime.now().isoformat()
-                })
-        
-        return jsonify({
-            "content": "Sorry, I couldn't find a PDF matching that description.",
-            "is_pdf": True,
-            "timestamp": datetime.datetime.now().isoformat()
-        })
-
-    else:  # Default case for 'message' intent (fuzzy search)
-        print("Routing to fuzzy message search...")
-        
-        # Clean the query to remove common instruction words for better results
-        cleaned_query = user_message.lower()
-        for word in ['search for', 'search', 'find']:
-            cleaned_query = cleaned_query.replace(word, '')
-        cleaned_query = cleaned_query.strip()
-        
-        # Use the original message if cleaning results in an empty string
-        final_query = cleaned_query if cleaned_query else user_message
+    else:  # Default case for 'message' intent (hybrid search)
+        print("Routing to message search...")
+        try:
+            return message_search_response(user_message, filters), 200
+        except FilterError as e:
+            return {"error": str(e)}, 400
+
+
+def message_filters(data) -> dict:
+    """
+    The request's optional "filters" object as search_imessages keyword arguments:
+        {"contact": "Jane Doe", "start_date": "2024-01-01", "end_date": "2024-06-30", "is_from_me": false}
+    Raises FilterError when it isn't an object, has unknown keys or a value of the wrong type.
+    """
+    filters = data.get('filters') if isinstance(data, dict) else None
+    if filters is None:
+        return {}
+    if not isinstance(filters, dict):
+        raise FilterError("'filters' must be an object")
+    unknown = set(filters) - set(MESSAGE_FILTER_KEYS)
+    if unknown:
+        raise FilterError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    for key in ('contact', 'start_date', 'end_date'):
+        if filters.get(key) is not None and not isinstance(filters[key], str):
+            raise FilterError(f"'{key}' must be a string")
+    if filters.get('is_from_me') is not None and not isinstance(filters['is_from_me'], bool):
+        raise FilterError("'is_from_me' must be true or false")
+    return {key: filters[key] for key in MESSAGE_FILTER_KEYS if filters.get(key) is not None}
+
+
+def summarize_selection(data) -> dict:
+    """
+    The contact and period a summarize request has already settled on, e.g. when the user picks
+    one of the candidates of an earlier answer, as handle_summarize_request keyword arguments:
+        {"handle_ids": [3, 4], "time_period": "2024-09"}
+    Both are optional. Raises ValueError when either is malformed.
+    """
+    if not isinstance(data, dict):
+        return {}
+    selection = {}
+    handle_ids = data.get('handle_ids')
+    if handle_ids is not None:
+        if (not isinstance(handle_ids, list) or not handle_ids
+                or not all(isinstance(handle_id, int) and not isinstance(handle_id, bool) for handle_id in handle_ids)):
+            raise ValueError("'handle_ids' must be a list of integers")
+        selection['handle_ids'] = handle_ids
+    time_period = data.get('time_period')
+    if time_period is not None:
+        if not isinstance(time_period, str) or not TIME_PERIOD_PATTERN.fullmatch(time_period):
+            raise ValueError("'time_period' must be recent, this_month, last_month, this_year, last_year, YYYY or YYYY-MM")
+        selection['time_period'] = time_period
+    return selection
+
+
+def pdf_search_response(user_message: str, file_url_for) -> dict:
+    """Finds the PDF a message asks for; file_url_for(attachment_id) builds the link to serve it."""
+    # Matches against the cached attachment catalog, no chat.db scan per request
+    found_pdf_info = find_pdf(user_message)
 
-        content = search_imessages(query=final_query, top_k=5)
-        if not content:
-            content = "I couldn't find any messages that matched your query."
+    if found_pdf_info:
+        filename = found_pdf_info.get('filename')
+        full_path = found_pdf_info.get('full_path')
         
-        return jsonify({
-            'content': content,
-            'is_message': True,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
+        if filename and full_path and os.path.exists(full_path):
+            # Served in place by attachment ID, so same-named files never collide
+            file_url = file_url_for(found_pdf_info['attachment_id'])
+            
+            return {
+                "content": f"I found the file: {filename}",
+                "file_url": file_url,
+                "file_name": filename,
+                "file_type": "pdf",
+                "is_pdf": True,
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+    
+    return {
+        "content": "Sorry, I couldn't find a PDF matching that description.",
+        "is_pdf": True,
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+
+
+def message_search_response(user_message: str, filters: dict | None = None) -> dict:
+    """
+    Searches the exported messages for a message's query, restricted by filters if given.
+    Raises FilterError for an unknown contact or a bad date.
+    """
+    # Clean the query to remove common instruction words for better results
+    cleaned_query = user_message.lower()
+    for word in ['search for', 'search', 'find']:
+        cleaned_query = cleaned_query.replace(word, '')
+    cleaned_query = cleaned_query.strip()
+    
+    # Use the original message if cleaning results in an empty string
+    final_query = cleaned_query if cleaned_query else user_message
+
+    stages = {}
+    content, matches = find_messages(query=final_query, top_k=5, db_path=OUTPUT_DB_PATH, mode=MESSAGE_SEARCH_MODE,
+                                     weights=MESSAGE_SEARCH_WEIGHTS, stages=stages, **(filters or {}))
+    if not content:
+        content = "I couldn't find any messages that matched your query."
+    
+    return {
+        'content': content,
+        # message_id/handle_id/timestamp per match, for jumping to the conversation
+        'matches': matches,
+        # Per-stage timings of the search pipeline
+        'stages': stages,
+        'is_message': True,
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+
+
+def batch_search_response(data, file_url_for) -> tuple[dict, int]:
+    """
+    Runs a list of queries against the message index or the attachment catalog in one batch.
+    Body: {"queries": [...], "type": "messages" | "attachments", "top_k": 5, "kinds": ["pdf"],
+           "filters": {...}, "context": 0}
+    filters (see message_filters) and context (neighbouring messages per side) only apply to messages.
+    Returns the response body (one result per query, in order) and its HTTP status.
+    """
+    if not isinstance(data, dict):
+        return {"error": "Expected a JSON object"}, 400
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return {"error": "'queries' must be a list of strings"}, 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return {"error": f"At most {MAX_BATCH_QUERIES} queries per request"}, 400
+    try:
+        top_k = max(1, min(int(data.get('top_k', 5)), 100))
+    except (TypeError, ValueError):
+        return {"error": "'top_k' must be an integer"}, 400
+
+    search_type = data.get('type', 'messages')
+    if search_type == 'messages':
+        try:
+            context = max(0, min(int(data.get('context', 0)), MAX_CONTEXT))
+        except (TypeError, ValueError):
+            return {"error": "'context' must be an integer"}, 400
+        try:
+            all_matches = search_imessages_batch(queries, top_k=top_k, db_path=OUTPUT_DB_PATH, context=context,
+                                                 **message_filters(data))
+        except FilterError as e:
+            return {"error": str(e)}, 400
+        results = [{'query': query, 'matches': matches} for query, matches in zip(queries, all_matches)]
+    elif search_type == 'attachments':
+        kinds = data.get('kinds') or ['pdf']
+        if not isinstance(kinds, list) or not all(isinstance(kind, str) and kind in DOCUMENT_KINDS for kind in kinds):
+            return {"error": f"'kinds' must be a list of: {', '.join(DOCUMENT_KINDS)}"}, 400
+        kinds = tuple(kinds)
+        all_matches = find_pdfs(queries, kinds=kinds, top_k=top_k)
+        results = [{
+            'query': query,
+            'matches': [{
+                'attachment_id': entry['attachment_id'],
+                'file_name': entry['filename'],
+                'file_type': entry['kind'],
+                'file_url': file_url_for(entry['attachment_id']),
+                'matched_page': entry.get('matched_page'),
+                'score': score,
+            } for entry, score in matches],
+        } for query, matches in zip(queries, all_matches)]
+    else:
+        return {"error": "'type' must be 'messages' or 'attachments'"}, 400
+
+    return {'results': results, 'timestamp': datetime.datetime.now().isoformat()}, 200
+
+
+# --- API ENDPOINTS ---
+@app.route("/api/search/batch", methods=["POST"])
+def handle_batch_search():
+    """Scores many search queries at once, for scripts and automation rather than the chat UI."""
+    file_url_for = lambda attachment_id: url_for('serve_attachment', attachment_id=attachment_id, _external=True)
+    result, status = batch_search_response(request.get_json(silent=True), file_url_for)
+    return jsonify(result), status
+
+
+def message_context_response(message_id: int, args) -> tuple[dict, int]:
+    """A message and its neighbours; args are the query parameters (before/after, default 5 each)."""
+    try:
+        before = int(args.get('before', 5))
+        after = int(args.get('after', 5))
+    except (TypeError, ValueError):
+        return {"error": "'before' and 'after' must be integers"}, 400
+    result = get_message_context(message_id, before=before, after=after, db_path=OUTPUT_DB_PATH)
+    if result is None:
+        return {"error": f"No message with id {message_id}"}, 404
+    return result, 200
+
+
+@app.route("/api/messages/<int:message_id>/context")
+def handle_message_context(message_id):
+    """The messages around a search result, in the same conversation."""
+    result, status = message_context_response(message_id, request.args)
+    return jsonify(result), status
+
+
+def read_user_message() -> tuple[str | None, dict]:
+    """The request's message and its whole JSON body ({} when it isn't a JSON object)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, {}
+    return data.get('message'), data
+
+
+@app.route("/api/ai-response", methods=["POST"])
+def handle_ai_response():
+    """
+    Handles requests by categorizing the user's intent and routing to the correct logic module.
+    """
+    user_message, data = read_user_message()
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    try:
+        filters = message_filters(data)
+        selection = summarize_selection(data)
+    except ValueError as e:  # FilterError included
+        return jsonify({"error": str(e)}), 400
+
+    print(f"Received message: '{user_message}'")
+    intent = categorize_query(user_message)
+    print(f"Detected intent: '{intent}'")
+
+    result, status = route_message(user_message, intent, filters, selection)
+    return jsonify(result), status
+
+
+class StreamCancelled(BaseException):
+    """
+    Raised inside the summarize worker once the streaming client has gone away.
+    A BaseException, so the summarizer's `except Exception` handlers don't turn it into an error result.
+    """
+
+
+def format_sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/api/ai-response/stream", methods=["POST"])
+def handle_ai_response_stream():
+    """
+    Same as /api/ai-response, but answers with Server-Sent Events:
+        progress  {"message": "contact resolved: ..."} / "N messages loaded" / "chunk k/n"
+        token     {"content": "..."} pieces of the summary as the model generates them
+        done      the same JSON body /api/ai-response returns, plus its "status"
+    Only summaries stream; other intents send a single done event.
+    """
+    user_message, data = read_user_message()
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    print(f"Received streaming message: '{user_message}'")
+    intent = categorize_query(user_message)
+    print(f"Detected intent: '{intent}'")
+
+    try:
+        filters = message_filters(data)
+        selection = summarize_selection(data)
+    except ValueError as e:  # FilterError included
+        return jsonify({"error": str(e)}), 400
+
+    if 'summarize' not in intent:
+        result, status = route_message(user_message, intent, filters)
+        return Response(format_sse('done', {**result, 'status': status}), mimetype='text/event-stream')
+
+    def generate():
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def emit(event, payload):
+            # Called from the worker; raising here unwinds the Ollama stream and any chunk pool
+            if cancelled.is_set():
+                raise StreamCancelled()
+            events.put((event, payload))
+
+        def work():
+            try:
+                result = handle_summarize_request(
+                    user_message, OUTPUT_DB_PATH,
+                    progress=lambda message: emit('progress', {'message': message}),
+                    on_token=lambda token: emit('token', {'content': token}),
+                    **selection,
+                )
+                events.put(('done', {**result, 'status': 400 if 'error' in result else 200}))
+            except StreamCancelled:
+                pass
+            finally:
+                events.put(None)
+
+        threading.Thread(target=work, name="summarize-stream", daemon=True).start()
+        try:
+            yield format_sse('progress', {'message': 'summarizing'})
+            while True:
+                try:
+                    item = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Writing is the only way to notice a closed connection while the model is busy
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield format_sse(*item)
+        finally:
+            # Runs on normal completion and on GeneratorExit when the client disconnects
+            cancelled.set()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 # --- RUN THE SERVER ---
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # The debug reloader runs this module in a watcher process and a serving process,
+    # only the serving one (WERKZEUG_RUN_MAIN set) should spawn the indexing pool.
+    # Without the reloader (debug off) this process is the serving one.
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        pdf_text_indexer.start()
+        if SEMANTIC_SEARCH:
+            semantic_index.start()
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
 
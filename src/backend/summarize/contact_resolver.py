@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+DEFAULT_DB_PATH = os.path.join("out", "output.db")
+
+# Fuzzy matches at or below this score are ignored, same threshold find_contact_by_name always used
+MIN_FUZZY_SCORE = 60
+# A runner-up this close to the best match makes the lookup ambiguous
+AMBIGUITY_MARGIN = 5
+
+# Common English nicknames -> the given names they are short for
+NICKNAMES = {
+    'alex': ('alexander', 'alexandra', 'alexis'),
+    'andy': ('andrew',),
+    'ben': ('benjamin',),
+    'bill': ('william',),
+    'bob': ('robert',),
+    'cathy': ('catherine', 'cathleen'),
+    'chris': ('christopher', 'christina', 'christine'),
+    'dan': ('daniel',),
+    'dave': ('david',),
+    'ed': ('edward',),
+    'jen': ('jennifer',),
+    'jenny': ('jennifer',),
+    'jim': ('james',),
+    'joe': ('joseph',),
+    'kate': ('katherine', 'kathryn', 'catherine'),
+    'katie': ('katherine', 'kathryn'),
+    'liz': ('elizabeth',),
+    'matt': ('matthew',),
+    'mike': ('michael',),
+    'nick': ('nicholas',),
+    'pat': ('patrick', 'patricia'),
+    'rob': ('robert',),
+    'sam': ('samuel', 'samantha'),
+    'steve': ('steven', 'stephen'),
+    'sue': ('susan',),
+    'tom': ('thomas',),
+    'tony': ('anthony',),
+    'will': ('william',),
+}
+
+
+def phone_keys(phone: str) -> list[str]:
+    """Digits of a phone number, plus the last 10 digits so '+1 (555) 010-9999' matches '5550109999'."""
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) < 7:
+        return []
+    keys = [digits]
+    if len(digits) > 10:
+        keys.append(digits[-10:])
+    return keys
+
+
+class ContactResolver:
+    """
+    Resolves a name (or phone number) from a user query to a contact in output.db.
+
+    Built once per version of the database file and then queried in memory:
+      - an exact-match dict over normalized first/last/full names, emails and phone digits
+      - a nickname and initials index ('bob' -> Robert, 'jd' -> John Doe)
+      - a flat array of normalized names for rapidfuzz (extract, or cdist for many queries)
+    """
+
+    def __init__(self, db_path: str | None = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self.contacts: tuple[dict, ...] = ()
+        self._exact: dict[str, tuple[int, ...]] = {}
+        self._aliases: dict[str, tuple[int, ...]] = {}
+        self.choices: tuple[str, ...] = ()
+        self.choice_contacts = np.zeros(0, dtype=np.int64)
+        self._by_handle: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def is_stale(self) -> bool:
+        """True if the database file changed since the resolver was last built."""
+        if self.db_path is None:
+            return False
+        try:
+            return os.stat(self.db_path).st_mtime_ns != self._mtime_ns
+        except FileNotFoundError:
+            return self._mtime_ns is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuilds the indexes if the database file changed (or if force is set)."""
+        if not force and not self.is_stale():
+            return False
+
+        with self._lock:
+            if not force and not self.is_stale():
+                return False
+
+            mtime_ns = os.stat(self.db_path).st_mtime_ns
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = conn.execute("""
+                    SELECT phone_number, email, first_name, last_name,
+                           imessage_handle_id, sms_handle_id
+                    FROM contacts
+                """).fetchall()
+            finally:
+                conn.close()
+
+            self.load_contacts([dict(row) for row in rows])
+            self._mtime_ns = mtime_ns
+        return True
+
+    def load_contacts(self, contacts: list[dict]):
+        """Builds every index from a list of contact rows."""
+        exact: dict[str, list[int]] = {}
+        aliases: dict[str, list[int]] = {}
+        choices: list[str] = []
+        choice_contacts: list[int] = []
+        by_handle: dict[int, int] = {}
+
+        def add(index: dict, key: str, contact_index: int):
+            if key:
+                bucket = index.setdefault(key, [])
+                if contact_index not in bucket:
+                    bucket.append(contact_index)
+
+        for i, contact in enumerate(contacts):
+            first = utils.default_process(contact['first_name'] or '')
+            last = utils.default_process(contact['last_name'] or '')
+            full = f"{first} {last}".strip()
+
+            names = [name for name in (first, last, full) if name]
+            for name in names:
+                add(exact, name, i)
+            if contact.get('email'):
+                add(exact, contact['email'].strip().lower(), i)
+            for key in phone_keys(contact['phone_number']):
+                add(exact, key, i)
+
+            # Nicknames only make sense for the given name
+            for nickname, given_names in NICKNAMES.items():
+                if first in given_names:
+                    add(aliases, nickname, i)
+                    if last:
+                        add(aliases, f"{nickname} {last}", i)
+            if first and last:
+                add(aliases, first[0] + last[0], i)
+
+            # The fuzzy choices are the same strings find_contact_by_name always searched
+            for name in names:
+                choices.append(name)
+                choice_contacts.append(i)
+            if contact['phone_number']:
+                choices.append(utils.default_process(contact['phone_number']))
+                choice_contacts.append(i)
+
+            for handle_id in (contact['imessage_handle_id'], contact['sms_handle_id']):
+                if handle_id:
+                    by_handle.setdefault(handle_id, i)
+
+        # Build everything before swapping it in, so concurrent lookups see a consistent snapshot
+        self._exact = {key: tuple(value) for key, value in exact.items()}
+        self._aliases = {key: tuple(value) for key, value in aliases.items()}
+        self.choices = tuple(choices)
+        self.choice_contacts = np.array(choice_contacts, dtype=np.int64)
+        self._by_handle = by_handle
+        self.contacts = tuple(contacts)
+
+    def _candidate(self, contact_index: int, score: float) -> dict:
+        contact = self.contacts[contact_index]
+        handle_ids = []
+        if contact['imessage_handle_id']:
+            handle_ids.append(contact['imessage_handle_id'])
+        if contact['sms_handle_id']:
+            handle_ids.append(contact['sms_handle_id'])
+        return {
+            'contact': contact,
+            'handle_ids': handle_ids,
+            'match_score': score,
+            'display_name': f"{contact['first_name'] or ''} {contact['last_name'] or ''}".strip() or contact['phone_number'] or 'Unknown'
+        }
+
+    def resolve(self, search_name: str, top_k: int = 5) -> list[dict]:
+        """
+        Returns up to top_k candidate contacts for a name, best first, one entry per contact.
+        Exact name/phone/email hits score 100 and nickname or initials hits 95, both straight
+        from the dicts; only when neither exists is the query fuzzy matched with rapidfuzz
+        (kept only above MIN_FUZZY_SCORE).
+        """
+        self.refresh()
+        query = utils.default_process(search_name or '')
+        if not query:
+            return []
+
+        scores: dict[int, float] = {}
+        exact_keys = [query, (search_name or '').strip().lower()] + phone_keys(search_name)
+        for key in exact_keys:
+            for contact_index in self._exact.get(key, ()):
+                scores[contact_index] = 100
+        if not scores:
+            for contact_index in self._aliases.get(query, ()):
+                scores[contact_index] = 95
+
+        if not scores and self.choices:
+            # Only scan the choices when the dicts found nothing. Ask for extra matches,
+            # several choices can belong to the same contact
+            for _, score, choice_index in process.extract(query, self.choices, scorer=fuzz.WRatio, processor=None,
+                                                          limit=top_k * 4, score_cutoff=MIN_FUZZY_SCORE + 1e-9):
+                contact_index = int(self.choice_contacts[choice_index])
+                if score > scores.get(contact_index, 0):
+                    scores[contact_index] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [self._candidate(contact_index, score) for contact_index, score in ranked]
+
+    def by_handle_ids(self, handle_ids: list[int]) -> dict | None:
+        """
+        The contact owning these handle IDs, as a candidate scoring 100 (see resolve()), or None if
+        they don't all belong to the same contact. Used when the user already picked a contact.
+        """
+        self.refresh()
+        owners = {self._by_handle.get(handle_id) for handle_id in handle_ids}
+        if len(owners) != 1 or None in owners:
+            return None
+        return self._candidate(owners.pop(), 100)
+
+    def resolve_many(self, search_names: list[str], top_k: int = 5) -> list[list[dict]]:
+        """
+        Fuzzy resolves many names at once with a single rapidfuzz cdist call on all cores.
+        Returns one candidate list per name, like resolve() without the exact/alias shortcuts.
+        """
+        self.refresh()
+        queries = [utils.default_process(name or '') for name in search_names]
+        if not self.choices or not queries:
+            return [[] for _ in search_names]
+
+        matrix = process.cdist(queries, self.choices, scorer=fuzz.WRatio, processor=None, workers=-1)
+        contact_count = len(self.contacts)
+        results = []
+        for row in matrix:
+            # Best score per contact: scatter the choice scores onto their contacts
+            best = np.zeros(contact_count, dtype=np.float64)
+            np.maximum.at(best, self.choice_contacts, row)
+            order = np.argsort(-best, kind='stable')[:top_k]
+            results.append([self._candidate(int(i), float(best[i])) for i in order if best[i] > MIN_FUZZY_SCORE])
+        return results
+
+
+def is_ambiguous(candidates: list[dict]) -> bool:
+    """True if the runner-up scores within AMBIGUITY_MARGIN of the best match."""
+    return len(candidates) > 1 and candidates[0]['match_score'] - candidates[1]['match_score'] <= AMBIGUITY_MARGIN
+
+
+_resolvers: dict[str, ContactResolver] = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_contact_resolver(db_path: str = DEFAULT_DB_PATH) -> ContactResolver:
+    """Returns the process-wide ContactResolver for a database, creating it on first use."""
+    key = os.path.abspath(db_path)
+    with _resolvers_lock:
+        if key not in _resolvers:
+            _resolvers[key] = ContactResolver(db_path)
+        return _resolvers[key]
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+import ollama
+
+from summarize.summary_cache import SummaryCache
+
+# llama3 has an 8k context; leave room for the system prompt, instructions and the answer
+CHUNK_TOKEN_BUDGET = 3000
+# Ollama serves one model instance, more parallel requests only queue up on the GPU/CPU
+MAX_WORKERS = 2
+
+CHUNK_SYSTEM_PROMPT = "You are an assistant that summarizes part of a longer conversation. Summarize this excerpt concisely, keeping names, decisions, plans and important moments, so it can be merged with summaries of the other parts."
+REDUCE_SYSTEM_PROMPT = "You are an assistant that summarizes conversations. You are given summaries of consecutive parts of one conversation, in order. Merge them into a single concise summary, highlighting key topics and important moments."
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English), no tokenizer needed."""
+    return len(text) // 4 + 1
+
+
+def split_into_windows(lines: list[str], token_budget: int = CHUNK_TOKEN_BUDGET) -> list[list[str]]:
+    """
+    Splits conversation lines into consecutive windows of at most token_budget tokens.
+    Lines are never split across windows; a single line over the budget is truncated.
+    Windows only depend on the lines before them, so appending messages only changes the last one.
+    """
+    windows = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if line_tokens > token_budget:
+            line = line[:token_budget * 4]
+            line_tokens = token_budget
+        if current and current_tokens + line_tokens > token_budget:
+            windows.append(current)
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+def chat(model: str, system_prompt: str, user_prompt: str,
+         on_token: Callable[[str], None] | None = None) -> str:
+    """
+    One Ollama chat call. With on_token, the answer is streamed and every piece is passed
+    to on_token as it arrives; if on_token raises, the stream is closed and the error propagates.
+    """
+    messages = [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
+    if on_token is None:
+        response = ollama.chat(model=model, messages=messages)
+        return response['message']['content'].strip()
+
+    stream = ollama.chat(model=model, messages=messages, stream=True)
+    pieces = []
+    try:
+        for chunk in stream:
+            piece = chunk['message']['content']
+            if piece:
+                pieces.append(piece)
+                on_token(piece)
+    finally:
+        # Closes the HTTP response to Ollama, so an abandoned generation stops early
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+    return ''.join(pieces).strip()
+
+
+_async_client: ollama.AsyncClient | None = None
+
+
+def get_async_client() -> ollama.AsyncClient:
+    """The shared ollama.AsyncClient, created on first use inside the running event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = ollama.AsyncClient()
+    return _async_client
+
+
+async def achat(model: str, system_prompt: str, user_prompt: str,
+                on_token: Callable[[str], None] | None = None) -> str:
+    """Async version of chat(), for the ASGI server. Cancelling the task closes the Ollama request."""
+    messages = [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
+    client = get_async_client()
+    if on_token is None:
+        response = await client.chat(model=model, messages=messages)
+        return response['message']['content'].strip()
+
+    pieces = []
+    async for chunk in await client.chat(model=model, messages=messages, stream=True):
+        piece = chunk['message']['content']
+        if piece:
+            pieces.append(piece)
+            on_token(piece)
+    return ''.join(pieces).strip()
+
+
+async def gather_all(coroutines) -> list:
+    """
+    asyncio.gather() that cancels the other tasks when one fails. A plain gather only does that
+    when it is cancelled itself, and leaves the rest talking to Ollama after an error.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes conversations too long for one prompt.
+
+    Map: every period (usually a month) is split into token-budgeted windows, which are
+    summarized concurrently by a small worker pool. Window summaries are cached by their
+    content, so a yearly summary reuses the windows of every month already summarized and
+    new messages only cost a call for the last window of their month.
+    Reduce: the window summaries are merged in order, in several rounds if they don't fit
+    in one prompt together.
+    """
+
+    def __init__(self, model: str, prompt_version: str, handle_ids: list[int],
+                 cache: SummaryCache | None = None, max_workers: int = MAX_WORKERS,
+                 token_budget: int = CHUNK_TOKEN_BUDGET, progress: Callable[[str], None] | None = None):
+        self.model = model
+        # Chunk summaries use their own prompt, version them apart from the final summaries
+        self.prompt_version = f"{prompt_version}-chunk"
+        self.handle_ids = handle_ids
+        self.cache = cache
+        self.max_workers = max_workers
+        self.token_budget = token_budget
+        self.progress = progress
+
+    def _report(self, message: str):
+        if self.progress:
+            self.progress(message)
+
+    def _summarize_window(self, cache_key: str, lines: list[str], contact_name: str, period: str) -> str:
+        excerpt = "\n".join(lines)
+        fingerprint = hashlib.sha1(excerpt.encode('utf-8')).hexdigest()
+        if self.cache:
+            cached = self.cache.get(self.handle_ids, cache_key, self.model, self.prompt_version, fingerprint)
+            if cached is not None:
+                return cached
+
+        summary = chat(self.model, CHUNK_SYSTEM_PROMPT,
+                       f"Summarize this part of a conversation with {contact_name} from {period}:\n\n{excerpt}")
+        if self.cache and summary:
+            self.cache.put(self.handle_ids, cache_key, self.model, self.prompt_version, fingerprint, summary)
+        return summary
+
+    def map(self, periods: list[tuple[str, list[str]]], contact_name: str) -> list[str]:
+        """Summarizes every window of every (period, lines) pair. Returns the summaries in order."""
+        jobs = []
+        for period, lines in periods:
+            for index, window in enumerate(split_into_windows(lines, self.token_budget)):
+                jobs.append((f"{period}#{index}", window, period))
+
+        summaries = [None] * len(jobs)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {pool.submit(self._summarize_window, cache_key, window, contact_name, period): position
+                       for position, (cache_key, window, period) in enumerate(jobs)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                summaries[futures[future]] = future.result()
+                self._report(f"chunk {done}/{len(jobs)}")
+        except BaseException:
+            # A failed chunk or a cancelled request (progress raising) drops the chunks not started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return summaries
+
+    def reduce(self, partials: list[str], contact_name: str, label: str,
+               on_token: Callable[[str], None] | None = None) -> str:
+        """
+        Merges ordered partial summaries into one, hierarchically if they don't fit in one prompt.
+        Only the final merge is streamed to on_token.
+        """
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > self.token_budget:
+            groups = split_into_windows(partials, self.token_budget)
+            if len(groups) == len(partials):
+                break  # Every partial is as big as the budget, merging more rounds won't shrink them
+            self._report(f"merging {len(partials)} partial summaries")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                partials = list(pool.map(lambda group: self._merge(group, contact_name, label), groups))
+
+        if len(partials) == 1:
+            if on_token:
+                on_token(partials[0])
+            return partials[0]
+        return self._merge(partials, contact_name, label, on_token=on_token)
+
+    def _merge(self, partials: list[str], contact_name: str, label: str,
+               on_token: Callable[[str], None] | None = None) -> str:
+        if len(partials) == 1:
+            return partials[0]
+        numbered = "\n\n".join(f"Part {number}:\n{partial}" for number, partial in enumerate(partials, start=1))
+        return chat(self.model, REDUCE_SYSTEM_PROMPT,
+                    f"Merge these summaries of a conversation with {contact_name} from {label}:\n\n{numbered}",
+                    on_token=on_token)
+
+    def summarize(self, periods: list[tuple[str, list[str]]], contact_name: str, label: str,
+                  on_token: Callable[[str], None] | None = None) -> str:
+        partials = self.map(periods, contact_name)
+        if not partials:
+            return ""
+        return self.reduce(partials, contact_name, label, on_token=on_token)
+
+    # --- async versions, used by the ASGI server ---
+    # Same windows, cache keys and prompts; the worker pool is replaced by a semaphore
+    # around achat(), and cache reads/writes go to a thread so SQLite never blocks the loop.
+
+    async def _asummarize_window(self, cache_key: str, lines: list[str], contact_name: str, period: str) -> str:
+        excerpt = "\n".join(lines)
+        fingerprint = hashlib.sha1(excerpt.encode('utf-8')).hexdigest()
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, self.handle_ids, cache_key, self.model,
+                                             self.prompt_version, fingerprint)
+            if cached is not None:
+                return cached
+
+        summary = await achat(self.model, CHUNK_SYSTEM_PROMPT,
+                              f"Summarize this part of a conversation with {contact_name} from {period}:\n\n{excerpt}")
+        if self.cache and summary:
+            await asyncio.to_thread(self.cache.put, self.handle_ids, cache_key, self.model,
+                                    self.prompt_version, fingerprint, summary)
+        return summary
+
+    async def amap(self, periods: list[tuple[str, list[str]]], contact_name: str) -> list[str]:
+        jobs = []
+        for period, lines in periods:
+            for index, window in enumerate(split_into_windows(lines, self.token_budget)):
+                jobs.append((f"{period}#{index}", window, period))
+
+        slots = asyncio.Semaphore(self.max_workers)
+        done = 0
+
+        async def run(cache_key, window, period):
+            nonlocal done
+            async with slots:
+                summary = await self._asummarize_window(cache_key, window, contact_name, period)
+            done += 1
+            self._report(f"chunk {done}/{len(jobs)}")
+            return summary
+
+        # A failed chunk or a cancelled request cancels the chunks still running
+        return await gather_all(run(*job) for job in jobs)
+
+    async def areduce(self, partials: list[str], contact_name: str, label: str,
+                      on_token: Callable[[str], None] | None = None) -> str:
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def merge(group, stream=None):
+            if len(group) == 1:
+                return group[0]
+            numbered = "\n\n".join(f"Part {number}:\n{partial}" for number, partial in enumerate(group, start=1))
+            async with slots:
+                return await achat(self.model, REDUCE_SYSTEM_PROMPT,
+                                   f"Merge these summaries of a conversation with {contact_name} from {label}:\n\n{numbered}",
+                                   on_token=stream)
+
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > self.token_budget:
+            groups = split_into_windows(partials, self.token_budget)
+            if len(groups) == len(partials):
+                break
+            self._report(f"merging {len(partials)} partial summaries")
+            partials = await gather_all(merge(group) for group in groups)
+
+        if len(partials) == 1:
+            if on_token:
+                on_token(partials[0])
+            return partials[0]
+        return await merge(partials, stream=on_token)
+
+    async def asummarize(self, periods: list[tuple[str, list[str]]], contact_name: str, label: str,
+                         on_token: Callable[[str], None] | None = None) -> str:
+        partials = await self.amap(periods, contact_name)
+        if not partials:
+            return ""
+        return await self.areduce(partials, contact_name, label, on_token=on_token)
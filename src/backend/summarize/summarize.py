@@ -1,12 +1,28 @@
+from __future__ import annotations
+
 import sqlite3
 import re
-from rapidfuzz import process
 import itertools
 from operator import itemgetter
-import ollama
+from typing import Callable
 import os
 import datetime
 
+from summarize.summary_cache import get_summary_cache, message_fingerprint, combine_fingerprints
+from summarize.map_reduce import MapReduceSummarizer, chat, estimate_tokens, CHUNK_TOKEN_BUDGET
+from summarize.contact_resolver import get_contact_resolver, is_ambiguous
+from common.rollups import contact_months
+
+SUMMARY_MODEL = "llama3"
+# Bump whenever SYSTEM_PROMPT or the summary request wording changes, so cached summaries are redone
+PROMPT_VERSION = "1"
+
+MONTH_NAMES = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+               'september', 'october', 'november', 'december']
+
+# Every time_period extract_contact_name_from_query can return
+TIME_PERIOD_PATTERN = re.compile(r'recent|this_month|last_month|this_year|last_year|\d{4}(-\d{2})?')
+
 SYSTEM_PROMPT = "You are an assistant that summarizes conversations. Summarize the following conversation concisely, highlighting key topics and important moments."
 
 def extract_contact_name_from_query(user_message: str) -> tuple[str, str]:
@@ -15,9 +31,11 @@ def extract_contact_name_from_query(user_message: str) -> tuple[str, str]:
     - "summarize my conversation with John"
     - "summarize conversation with Jane Doe from last month"
     - "summarize messages with mom this month"
+    - "summarize messages with mom from 2024"
     
     Returns: (contact_name, time_period)
-    time_period can be: "recent", "this_month", "last_month", or specific "YYYY-MM"
+    time_period can be: "recent", "this_month", "last_month", "this_year", "last_year",
+    specific "YYYY-MM" or a whole year "YYYY"
     """
     # Convert to lowercase for pattern matching
     message_lower = user_message.lower()
@@ -28,14 +46,28 @@ def extract_contact_name_from_query(user_message: str) -> tuple[str, str]:
         time_period = "this_month"
     elif "last month" in message_lower:
         time_period = "last_month"
+    elif "this year" in message_lower:
+        time_period = "this_year"
+    elif "last year" in message_lower:
+        time_period = "last_year"
     else:
-        # Check for specific month/year patterns like "september 2024" or "2024-09"
+        # Check for specific month/year patterns like "2024-09" or "september 2024"
         month_pattern = r'(\d{4})[/-](\d{1,2})'
         month_match = re.search(month_pattern, message_lower)
         if month_match:
             year = month_match.group(1)
             month = month_match.group(2).zfill(2)
             time_period = f"{year}-{month}"
+        else:
+            named_month = re.search(rf'\b({"|".join(MONTH_NAMES)})\s+(\d{{4}})\b', message_lower)
+            if named_month:
+                month = MONTH_NAMES.index(named_month.group(1)) + 1
+                time_period = f"{named_month.group(2)}-{month:02d}"
+            elif not any(re.search(rf'\b{name}\b', message_lower) for name in MONTH_NAMES):
+                # A bare year like "2024" asks for the whole year, but not when a month was meant
+                year_match = re.search(r'\b(\d{4})\b', message_lower)
+                if year_match:
+                    time_period = year_match.group(1)
     
     # Simple and reliable pattern to extract name after "with"
     # Look for "with" followed by the name, stopping at common time indicators or end of string
@@ -64,122 +96,73 @@ def extract_contact_name_from_query(user_message: str) -> tuple[str, str]:
     
     return "", time_period
 
-def find_contact_by_name(db_path: str, search_name: str) -> dict:
+def find_contact_by_name(db_path: str, search_name: str, top_k: int = 5) -> dict:
     """
-    Search for a contact by first name, last name, or phone number.
+    Search for a contact by first name, last name, nickname, initials or phone number.
     Returns dict with contact info and handle_ids, or None if not found.
+    When several contacts match about equally well, 'candidates' lists the top_k of them
+    (best first) so the UI can ask which one was meant.
     """
     if not search_name.strip():
         return None
     
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get all contacts
-        cursor.execute("""
-            SELECT phone_number, email, first_name, last_name, 
-                   imessage_handle_id, sms_handle_id
-            FROM contacts
-        """)
-        
-        contacts = cursor.fetchall()
-        conn.close()
-        
-        if not contacts:
-            return None
-        
-        # Prepare contact data for fuzzy matching
-        contact_data = []
-        for contact in contacts:
-            # Create searchable strings for each contact
-            searchable_names = []
-            
-            if contact['first_name']:
-                searchable_names.append(contact['first_name'].lower())
-            if contact['last_name']:
-                searchable_names.append(contact['last_name'].lower())
-            if contact['first_name'] and contact['last_name']:
-                full_name = f"{contact['first_name']} {contact['last_name']}".lower()
-                searchable_names.append(full_name)
-            if contact['phone_number']:
-                searchable_names.append(contact['phone_number'])
-            
-            contact_data.append({
-                'contact': contact,
-                'searchable_names': searchable_names
-            })
-        
-        # Fuzzy search across all searchable names
-        search_lower = search_name.lower()
-        best_match = None
-        best_score = 0
-        
-        print(f"Searching for: '{search_lower}'")
-        
-        # First try exact matches (case insensitive)
-        for contact_info in contact_data:
-            for searchable_name in contact_info['searchable_names']:
-                if search_lower == searchable_name.lower():
-                    print(f"Found exact match: '{searchable_name}' for contact {contact_info['contact']}")
-                    best_match = contact_info['contact']
-                    best_score = 100
-                    break
-            if best_match:
-                break
-        
-        # If no exact match, try fuzzy matching
-        if not best_match:
-            all_searchable_names = []
-            contact_lookup = {}
-            
-            for contact_info in contact_data:
-                for searchable_name in contact_info['searchable_names']:
-                    all_searchable_names.append(searchable_name.lower())
-                    contact_lookup[searchable_name.lower()] = contact_info['contact']
-            
-            print(f"Available contacts for fuzzy matching: {all_searchable_names}")
-            
-            # Use rapidfuzz for fuzzy matching across all names at once
-            fuzzy_result = process.extractOne(search_lower, all_searchable_names)
-            
-            print(f"Fuzzy match result: {fuzzy_result}")
-            
-            if fuzzy_result and fuzzy_result[1] > 60:  # 60% threshold
-                matched_name = fuzzy_result[0]
-                best_score = fuzzy_result[1]
-                best_match = contact_lookup[matched_name]
-                print(f"Selected fuzzy match: '{matched_name}' with score {best_score}%")
-        
-        if best_match:
-            # Get all possible handle_ids for this contact
-            handle_ids = []
-            if best_match['imessage_handle_id']:
-                handle_ids.append(best_match['imessage_handle_id'])
-            if best_match['sms_handle_id']:
-                handle_ids.append(best_match['sms_handle_id'])
-            
-            return {
-                'contact': best_match,
-                'handle_ids': handle_ids,
-                'match_score': best_score,
-                'display_name': f"{best_match['first_name'] or ''} {best_match['last_name'] or ''}".strip() or best_match['phone_number'] or 'Unknown'
-            }
-        
-        return None
-        
+        candidates = get_contact_resolver(db_path).resolve(search_name, top_k=top_k)
     except sqlite3.Error as e:
         print(f"Database error in find_contact_by_name: {e}")
         return None
     except Exception as e:
         print(f"Error in find_contact_by_name: {e}")
         return None
+    
+    if not candidates:
+        return None
+    
+    best_match = dict(candidates[0])
+    if is_ambiguous(candidates):
+        best_match['candidates'] = [
+            {'display_name': c['display_name'], 'match_score': c['match_score'], 'handle_ids': c['handle_ids']}
+            for c in candidates
+        ]
+    return best_match
 
-def process_conversation_with_contact(db_path: str, handle_ids: list[int], contact_name: str, time_period: str = "recent") -> str:
+def month_range(year: int, month: int | None = None) -> tuple[int, int]:
+    """[start, end) of a month (or of the whole year) in UTC epoch seconds, the unit of messages.date_ts."""
+    start = datetime.datetime(year, month or 1, 1, tzinfo=datetime.timezone.utc)
+    if month is None or month == 12:
+        end = datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+    else:
+        end = datetime.datetime(year, month + 1, 1, tzinfo=datetime.timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+def fetch_period_messages(conn: sqlite3.Connection, handle_ids: list[int], year: int,
+                          month: int | None = None) -> list[sqlite3.Row]:
+    """A contact's messages in one month (or one year), oldest first, through idx_messages_handle_date."""
+    start_ts, end_ts = month_range(year, month)
+    placeholders = ', '.join(['?'] * len(handle_ids))
+    return conn.execute(f"""
+        SELECT
+            message_id,
+            handle_id,
+            date_ts,
+            year,
+            month,
+            is_from_me,
+            text
+        FROM messages
+        WHERE handle_id IN ({placeholders}) AND date_ts >= ? AND date_ts < ?
+        ORDER BY date_ts ASC
+    """, [*handle_ids, start_ts, end_ts]).fetchall()
+
+def load_conversation(db_path: str, handle_ids: list[int], contact_name: str, time_period: str = "recent",
+                      progress: Callable[[str], None] | None = None) -> dict | str:
     """
-    Process conversations for a specific contact and return a summary string.
-    Enhanced version of process_all_conversations for a single contact.
+    Loads a contact's messages and picks the month (or year) to summarize.
+    Returns a dict with the conversation 'periods' [(YYYY-MM, lines)], 'period_label',
+    'fingerprint', 'total_messages', 'whole_year' and 'all_months', or an error string.
+    Does no LLM work, so both the sync and the async server can run it in a worker thread.
+    The available months come from the contact_month_counts rollup and only the messages of
+    the target month (or year) are read, so the cost doesn't grow with the contact's history.
     """
     if not os.path.exists(db_path):
         current_dir = os.getcwd()
@@ -188,67 +171,44 @@ def process_conversation_with_contact(db_path: str, handle_ids: list[int], conta
     if not handle_ids:
         return f"No valid handle IDs found for {contact_name}"
 
-    placeholders = ', '.join(['?'] * len(handle_ids))
-    query = f"""
-        SELECT
-            handle_id,
-            date_time,
-            is_from_me,
-            text
-        FROM messages
-        WHERE handle_id IN ({placeholders})
-        ORDER BY date_time ASC
-    """
+    # Determine which month to summarize
+    now = datetime.datetime.now()
+    target_year = None
+    target_month = None
+    whole_year = False
     
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(query, handle_ids)
-        
-        messages = cursor.fetchall()
-        conn.close()
-        
-        if not messages:
-            return f"No messages found with {contact_name}"
-        
-        # Determine which month to summarize
-        now = datetime.datetime.now()
-        target_year = None
-        target_month = None
-        
-        if time_period == "this_month":
-            target_year = now.year
-            target_month = now.month
-        elif time_period == "last_month":
-            last_month = now.replace(day=1) - datetime.timedelta(days=1)
-            target_year = last_month.year
-            target_month = last_month.month
-        elif time_period.startswith("20") and "-" in time_period:  # Specific year-month like "2024-09"
-            try:
-                year_str, month_str = time_period.split("-")
-                target_year = int(year_str)
-                target_month = int(month_str)
-            except ValueError:
-                pass
-        
-        # Group messages by year/month
-        def ym_key(row):
-            date_string = row['date_time']
-            if date_string:
-                try:
-                    dt = datetime.datetime.strptime(date_string.split()[0], "%Y-%m-%d")
-                    return (dt.year, dt.month)
-                except (ValueError, IndexError):
-                    pass
-            return (None, None)
-        
-        # Group all messages by month
+    if time_period == "this_year":
+        target_year = now.year
+        whole_year = True
+    elif time_period == "last_year":
+        target_year = now.year - 1
+        whole_year = True
+    elif re.fullmatch(r'\d{4}', time_period):
+        target_year = int(time_period)
+        whole_year = True
+    elif time_period == "this_month":
+        target_year = now.year
+        target_month = now.month
+    elif time_period == "last_month":
+        last_month = now.replace(day=1) - datetime.timedelta(days=1)
+        target_year = last_month.year
+        target_month = last_month.month
+    elif time_period.startswith("20") and "-" in time_period:  # Specific year-month like "2024-09"
+        try:
+            year_str, month_str = time_period.split("-")
+            target_year = int(year_str)
+            target_month = int(month_str)
+        except ValueError:
+            pass
+    
+    def build_months(messages):
+        """Groups rows by (year, month) into conversation lines and fingerprints."""
         monthly_conversations = {}
-        for month_key, messages_for_month in itertools.groupby(messages, key=ym_key):
-            year, month = month_key
-            if not year:
-                continue
+        monthly_fingerprints = {}
+        for month_key, messages_for_month in itertools.groupby(messages, key=itemgetter('year', 'month')):
+            messages_for_month = list(messages_for_month)
+            last_message_id = max(row['message_id'] for row in messages_for_month)
+            monthly_fingerprints[month_key] = message_fingerprint(last_message_id, len(messages_for_month))
             
             conversation_lines = []
             for row in messages_for_month:
@@ -257,119 +217,251 @@ def process_conversation_with_contact(db_path: str, handle_ids: list[int], conta
                     conversation_lines.append(f"{sender}: {row['text'].strip()}")
             
             if len(conversation_lines) >= 3:  # Only keep substantial conversations
-                monthly_conversations[(year, month)] = conversation_lines
-        
-        if not monthly_conversations:
-            return f"No substantial conversations found with {contact_name}"
-        
-        # Determine which month to actually summarize
-        if target_year and target_month:
-            # User specified a specific month
-            target_key = (target_year, target_month)
-            if target_key not in monthly_conversations:
-                available_months = [f"{y}-{m:02d}" for y, m in sorted(monthly_conversations.keys(), reverse=True)]
-                return f"No conversations found with {contact_name} for {target_year:04d}-{target_month:02d}. Available months: {', '.join(available_months[:5])}{'...' if len(available_months) > 5 else ''}"
-            
-            conversation_to_summarize = monthly_conversations[target_key]
-            summary_month_key = target_key
-        else:
-            # Default to most recent month
-            most_recent_key = max(monthly_conversations.keys())
-            conversation_to_summarize = monthly_conversations[most_recent_key]
-            summary_month_key = most_recent_key
-        
-        year, month = summary_month_key
-        conversation = "\n".join(conversation_to_summarize)
-        total_messages = len(conversation_to_summarize)
-        
-        # Generate summary for the single selected month
+                monthly_conversations[month_key] = conversation_lines
+        return monthly_conversations, monthly_fingerprints
+    
+    try:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
         try:
-            response = ollama.chat(
-                model="llama3",
-                messages=[
-                    {'role': 'system', 'content': SYSTEM_PROMPT},
-                    {'role': 'user', 'content': f"Summarize this conversation with {contact_name} from {year:04d}-{month:02d}:\n\n{conversation}"}
-                ]
-            )
-            summary_text = response['message']['content'].strip()
+            month_counts = contact_months(conn, handle_ids)
+            if not month_counts:
+                return f"No messages found with {contact_name}"
+            all_months = sorted(month_counts, reverse=True)
             
-            if summary_text:
-                # Show available months for context
-                all_months = sorted(monthly_conversations.keys(), reverse=True)
-                available_months = [f"{y}-{m:02d}" for y, m in all_months]
-                
-                header = f"**Conversation Summary with {contact_name} ({year:04d}-{month:02d})**\n"
-                header += f"*Messages in this month: {total_messages}*\n"
-                if len(all_months) > 1:
-                    header += f"*Other available months: {', '.join(available_months[:5])}{'...' if len(available_months) > 5 else ''}*\n"
-                header += "\n"
-                
-                return header + summary_text
+            if whole_year:
+                if not any(year == target_year for year, _ in all_months):
+                    available_years = sorted({y for y, _ in all_months}, reverse=True)
+                    return f"No conversations found with {contact_name} for {target_year:04d}. Available years: {', '.join(str(y) for y in available_years)}"
+                messages = fetch_period_messages(conn, handle_ids, target_year)
+                monthly_conversations, monthly_fingerprints = build_months(messages)
+                summary_keys = sorted(monthly_conversations)
+                if not summary_keys:
+                    return f"No substantial conversations found with {contact_name} for {target_year:04d}"
+                period_label = f"{target_year:04d}"
+                # The year changes whenever one of its months does
+                summary_fingerprint = combine_fingerprints([monthly_fingerprints[key] for key in summary_keys])
+            elif target_year and target_month:
+                # User specified a specific month
+                target_key = (target_year, target_month)
+                if target_key not in month_counts:
+                    available_months = [f"{y}-{m:02d}" for y, m in all_months]
+                    return f"No conversations found with {contact_name} for {target_year:04d}-{target_month:02d}. Available months: {', '.join(available_months[:5])}{'...' if len(available_months) > 5 else ''}"
+                messages = fetch_period_messages(conn, handle_ids, target_year, target_month)
+                monthly_conversations, monthly_fingerprints = build_months(messages)
+                if target_key not in monthly_conversations:
+                    return f"No substantial conversations found with {contact_name} for {target_year:04d}-{target_month:02d}"
+                summary_keys = [target_key]
+                period_label = f"{target_year:04d}-{target_month:02d}"
+                summary_fingerprint = monthly_fingerprints[target_key]
             else:
-                return f"Error: Empty summary generated for {contact_name} ({year:04d}-{month:02d})"
-                
-        except Exception as e:
-            return f"Error generating summary for {contact_name} ({year:04d}-{month:02d}): {str(e)}"
+                # Default to the most recent month with a substantial conversation
+                for month_key in all_months:
+                    messages = fetch_period_messages(conn, handle_ids, *month_key)
+                    monthly_conversations, monthly_fingerprints = build_months(messages)
+                    if month_key in monthly_conversations:
+                        break
+                else:
+                    return f"No substantial conversations found with {contact_name}"
+                summary_keys = [month_key]
+                period_label = f"{month_key[0]:04d}-{month_key[1]:02d}"
+                summary_fingerprint = monthly_fingerprints[month_key]
+        finally:
+            conn.close()
+        
+        if progress:
+            progress(f"{len(messages)} messages loaded")
+        
+        periods = [(f"{y:04d}-{m:02d}", monthly_conversations[(y, m)]) for y, m in summary_keys]
+        return {
+            'periods': periods,
+            'period_label': period_label,
+            'fingerprint': summary_fingerprint,
+            'total_messages': sum(len(lines) for _, lines in periods),
+            'whole_year': whole_year,
+            'all_months': all_months,
+        }
             
     except sqlite3.Error as e:
         return f"Database error: {str(e)}"
     except Exception as e:
         return f"Unexpected error during summarization: {str(e)}"
 
-def handle_summarize_request(user_message: str, output_db_path: str) -> dict:
+def needs_map_reduce(conversation: dict) -> bool:
+    """True if the conversation spans several months or doesn't fit in a single prompt."""
+    periods = conversation['periods']
+    return len(periods) > 1 or estimate_tokens("\n".join(periods[0][1])) > CHUNK_TOKEN_BUDGET
+
+def summary_prompt(contact_name: str, conversation: dict) -> str:
+    lines = conversation['periods'][0][1]
+    return f"Summarize this conversation with {contact_name} from {conversation['period_label']}:\n\n" + "\n".join(lines)
+
+def format_summary(contact_name: str, conversation: dict, summary_text: str) -> str:
+    """Adds the header (period, message count, other months) to a generated summary."""
+    period_label = conversation['period_label']
+    if not summary_text:
+        return f"Error: Empty summary generated for {contact_name} ({period_label})"
+    
+    # Show available months for context
+    all_months = conversation['all_months']
+    available_months = [f"{y}-{m:02d}" for y, m in all_months]
+    
+    header = f"**Conversation Summary with {contact_name} ({period_label})**\n"
+    if conversation['whole_year']:
+        header += f"*Messages in this year: {conversation['total_messages']} across {len(conversation['periods'])} months*\n"
+    else:
+        header += f"*Messages in this month: {conversation['total_messages']}*\n"
+    if len(all_months) > 1:
+        header += f"*Other available months: {', '.join(available_months[:5])}{'...' if len(available_months) > 5 else ''}*\n"
+    header += "\n"
+    
+    return header + summary_text
+
+def summary_cache_key(handle_ids: list[int], conversation: dict) -> tuple:
+    return (handle_ids, conversation['period_label'], SUMMARY_MODEL, PROMPT_VERSION, conversation['fingerprint'])
+
+def process_conversation_with_contact(db_path: str, handle_ids: list[int], contact_name: str, time_period: str = "recent",
+                                      progress: Callable[[str], None] | None = None,
+                                      on_token: Callable[[str], None] | None = None) -> str:
     """
-    Main handler for summarize requests. Parses user input, finds contact, and generates summary.
-    Returns a dict with the response data.
+    Process conversations for a specific contact and return a summary string.
+    Enhanced version of process_all_conversations for a single contact.
+
+    progress receives short status messages ("N messages loaded", "chunk k/n") and on_token
+    receives the summary text as the model streams it; both are optional.
     """
+    conversation = load_conversation(db_path, handle_ids, contact_name, time_period, progress=progress)
+    if isinstance(conversation, str):
+        return conversation
+    period_label = conversation['period_label']
+    
+    # Generate summary for the selected month (or year)
     try:
-        # Extract contact name from user message
-        contact_name, time_period = extract_contact_name_from_query(user_message)
-        
-        if not contact_name:
-            return {
-                'content': "I couldn't identify who you want me to summarize conversations with. Please try something like: 'summarize my conversation with John' or 'summarize messages with Jane Doe'",
-                'error': 'no_contact_specified',
-                'is_summarize': True,
-                'timestamp': datetime.datetime.now().isoformat()
-            }
-        
-        print(f"Extracted contact name: '{contact_name}', time period: '{time_period}'")
-        
-        # Find the contact in the database
-        contact_info = find_contact_by_name(output_db_path, contact_name)
+        # A month's summary only changes when its messages do, so closed months come from the cache
+        summary_cache = get_summary_cache(db_path)
+        cache_key = summary_cache_key(handle_ids, conversation)
+        summary_text = summary_cache.get(*cache_key)
+        
+        if summary_text is None:
+            if not needs_map_reduce(conversation):
+                # Fits in one prompt, no need for map-reduce
+                summary_text = chat(SUMMARY_MODEL, SYSTEM_PROMPT, summary_prompt(contact_name, conversation), on_token=on_token)
+            else:
+                print(f"Summarizing {conversation['total_messages']} messages with {contact_name} ({period_label}) in chunks")
+                summarizer = MapReduceSummarizer(SUMMARY_MODEL, PROMPT_VERSION, handle_ids,
+                                                 cache=summary_cache, progress=progress)
+                summary_text = summarizer.summarize(conversation['periods'], contact_name, period_label, on_token=on_token)
+            if summary_text:
+                summary_cache.put(*cache_key, summary_text)
+        else:
+            print(f"Serving cached summary for {contact_name} ({period_label})")
+            if on_token:
+                on_token(summary_text)
         
+        return format_summary(contact_name, conversation, summary_text)
+            
+    except Exception as e:
+        return f"Error generating summary for {contact_name} ({period_label}): {str(e)}"
+
+def summarize_response(content: str, contact_info: dict | None = None, error: str | None = None,
+                       time_period: str | None = None) -> dict:
+    """
+    The JSON body of a summarize answer, successful (with contact_info) or not (with error).
+    time_period is the period that was summarized, so a follow-up for another candidate can reuse it.
+    """
+    response = {'content': content}
+    if contact_info:
+        response.update({
+            'contact_name': contact_info['display_name'],
+            'match_score': contact_info['match_score'],
+            'handle_ids': contact_info['handle_ids'],
+        })
+        if 'candidates' in contact_info:
+            response['candidates'] = contact_info['candidates']
+    if time_period:
+        response['time_period'] = time_period
+    if error:
+        response['error'] = error
+    response['is_summarize'] = True
+    response['timestamp'] = datetime.datetime.now().isoformat()
+    return response
+
+def resolve_summarize_request(user_message: str, output_db_path: str,
+                              progress: Callable[[str], None] | None = None,
+                              handle_ids: list[int] | None = None,
+                              time_period: str | None = None) -> tuple[dict, str] | dict:
+    """
+    Parses a summarize request and finds the contact it is about.
+    handle_ids (a contact the user already picked, e.g. from the candidates of an earlier answer)
+    and time_period take precedence over what the message says.
+    Returns (contact_info, time_period), or an error response dict.
+    """
+    # Extract contact name from user message
+    contact_name, parsed_period = extract_contact_name_from_query(user_message)
+    time_period = time_period or parsed_period
+
+    if handle_ids:
+        contact_info = get_contact_resolver(output_db_path).by_handle_ids(handle_ids)
         if not contact_info:
-            return {
-                'content': f"I couldn't find a contact matching '{contact_name}'. Please check the spelling or try using their full name.",
-                'error': 'contact_not_found',
-                'is_summarize': True,
-                'timestamp': datetime.datetime.now().isoformat()
-            }
-        
-        print(f"Found contact: {contact_info['display_name']} (match score: {contact_info['match_score']}%)")
-        print(f"Handle IDs: {contact_info['handle_ids']}")
+            return summarize_response("I couldn't find that contact anymore. Please ask again with their name.",
+                                      error='contact_not_found')
+        if progress:
+            progress(f"contact resolved: {contact_info['display_name']}")
+        return contact_info, time_period
+
+    if not contact_name:
+        return summarize_response(
+            "I couldn't identify who you want me to summarize conversations with. Please try something like: 'summarize my conversation with John' or 'summarize messages with Jane Doe'",
+            error='no_contact_specified')
+    
+    print(f"Extracted contact name: '{contact_name}', time period: '{time_period}'")
+    
+    # Find the contact in the database
+    contact_info = find_contact_by_name(output_db_path, contact_name)
+    
+    if not contact_info:
+        return summarize_response(
+            f"I couldn't find a contact matching '{contact_name}'. Please check the spelling or try using their full name.",
+            error='contact_not_found')
+    
+    print(f"Found contact: {contact_info['display_name']} (match score: {contact_info['match_score']}%)")
+    print(f"Handle IDs: {contact_info['handle_ids']}")
+    if progress:
+        progress(f"contact resolved: {contact_info['display_name']}")
+    return contact_info, time_period
+
+def handle_summarize_request(user_message: str, output_db_path: str,
+                             progress: Callable[[str], None] | None = None,
+                             on_token: Callable[[str], None] | None = None,
+                             handle_ids: list[int] | None = None,
+                             time_period: str | None = None) -> dict:
+    """
+    Main handler for summarize requests. Parses user input, finds contact, and generates summary.
+    handle_ids/time_period pick the contact and period directly (see resolve_summarize_request).
+    Returns a dict with the response data.
+    The optional progress/on_token callbacks are passed down to process_conversation_with_contact,
+    which lets the streaming endpoint report progress and forward tokens as they arrive.
+    """
+    try:
+        resolved = resolve_summarize_request(user_message, output_db_path, progress=progress,
+                                             handle_ids=handle_ids, time_period=time_period)
+        if isinstance(resolved, dict):
+            return resolved
+        contact_info, time_period = resolved
         
         # Generate conversation summary
         summary_content = process_conversation_with_contact(
             output_db_path, 
             contact_info['handle_ids'], 
             contact_info['display_name'],
-            time_period
+            time_period,
+            progress=progress,
+            on_token=on_token
         )
         
-        return {
-            'content': summary_content,
-            'contact_name': contact_info['display_name'],
-            'match_score': contact_info['match_score'],
-            'handle_ids': contact_info['handle_ids'],
-            'is_summarize': True,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
+        return summarize_response(summary_content, contact_info, time_period=time_period)
         
     except Exception as e:
-        return {
-            'content': f"An error occurred while processing your summarization request: {str(e)}",
-            'error': 'processing_error',
-            'is_summarize': True,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
\ No newline at end of file
+        return summarize_response(
+            f"An error occurred while processing your summarization request: {str(e)}",
+            error='processing_error')
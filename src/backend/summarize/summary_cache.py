@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+# 32 MiB of summary text is thousands of months, far more than anyone asks about
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def summary_cache_path(output_db_path: str) -> str:
+    """
+    The cache lives in its own file next to output.db, because output.db is replaced
+    wholesale by a full export and would lose the table.
+    """
+    return os.path.join(os.path.dirname(output_db_path), "summary_cache.db")
+
+
+def message_fingerprint(last_message_id: int, message_count: int) -> str:
+    """Identifies the set of messages a summary was built from, new messages change it."""
+    return hashlib.sha1(f"{last_message_id}:{message_count}".encode()).hexdigest()
+
+
+def combine_fingerprints(fingerprints: list[str]) -> str:
+    """Fingerprint of several months together, e.g. a whole year."""
+    return hashlib.sha1('/'.join(fingerprints).encode()).hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent cache of LLM conversation summaries.
+
+    Entries are keyed by (handle_ids, year-month, model, prompt version) and store the
+    fingerprint of the messages they were built from. A lookup only hits if the fingerprint
+    still matches, so when new messages arrive only the month they fall in is recomputed,
+    closed months keep being served from the cache. The total size of the stored summaries
+    is bounded, least recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS summary_cache (
+                    handle_ids TEXT NOT NULL,
+                    year_month TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    PRIMARY KEY (handle_ids, year_month, model, prompt_version)
+                );
+                CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at);
+            """)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.cache_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _handle_key(handle_ids: list[int]) -> str:
+        # The same contact can come back with its handle_ids in a different order
+        return ','.join(str(handle_id) for handle_id in sorted(handle_ids))
+
+    def get(self, handle_ids: list[int], year_month: str, model: str, prompt_version: str,
+            fingerprint: str) -> str | None:
+        """Returns the cached summary, or None if there is none or the messages changed since."""
+        key = (self._handle_key(handle_ids), year_month, model, prompt_version)
+        conn = self._connect()
+        try:
+            row = conn.execute("""
+                SELECT fingerprint, summary FROM summary_cache
+                WHERE handle_ids = ? AND year_month = ? AND model = ? AND prompt_version = ?
+            """, key).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            with conn:
+                conn.execute("""
+                    UPDATE summary_cache SET last_used_at = ?
+                    WHERE handle_ids = ? AND year_month = ? AND model = ? AND prompt_version = ?
+                """, (time.time(), *key))
+            return row[1]
+        finally:
+            conn.close()
+
+    def put(self, handle_ids: list[int], year_month: str, model: str, prompt_version: str,
+            fingerprint: str, summary: str):
+        """Stores a summary, replacing any older one for the same month, then evicts down to max_bytes."""
+        now = time.time()
+        size_bytes = len(summary.encode('utf-8'))
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("""
+                        INSERT INTO summary_cache (handle_ids, year_month, model, prompt_version,
+                                                   fingerprint, summary, size_bytes, created_at, last_used_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(handle_ids, year_month, model, prompt_version) DO UPDATE SET
+                            fingerprint = excluded.fingerprint,
+                            summary = excluded.summary,
+                            size_bytes = excluded.size_bytes,
+                            created_at = excluded.created_at,
+                            last_used_at = excluded.last_used_at
+                    """, (self._handle_key(handle_ids), year_month, model, prompt_version,
+                          fingerprint, summary, size_bytes, now, now))
+                    self._evict(conn)
+            finally:
+                conn.close()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM summary_cache").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until enough bytes are freed
+        to_free = total_bytes - self.max_bytes
+        evicted = []
+        for rowid, size_bytes in conn.execute("SELECT rowid, size_bytes FROM summary_cache ORDER BY last_used_at"):
+            if to_free <= 0:
+                break
+            evicted.append((rowid,))
+            to_free -= size_bytes
+        conn.executemany("DELETE FROM summary_cache WHERE rowid = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM summary_cache")
+            finally:
+                conn.close()
+
+
+_caches: dict[str, SummaryCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_summary_cache(output_db_path: str) -> SummaryCache:
+    """Returns the process-wide SummaryCache that sits next to an output.db, creating it on first use."""
+    key = os.path.abspath(summary_cache_path(output_db_path))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SummaryCache(key)
+        return _caches[key]
@@ -0,0 +1,53 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Tests import the backend packages the same way server.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+CONTACTS = [
+    # phone_number, email, first_name, last_name, imessage_handle_id, sms_handle_id
+    ('+1 (410) 555-0101', None, 'Betty', 'Taylor', 1, None),
+    ('+1 (410) 555-0102', None, 'Sarah', 'Johnson', 2, 3),
+    ('+1 (410) 555-0103', None, 'Mike', 'Johnson', 4, None),
+    ('+1 (410) 555-0104', None, 'Ann', 'Johnson', 5, None),
+    ('+1 (410) 555-0105', None, 'Brian', 'Martin', 6, 7),
+]
+
+
+def write_output_db(path: str, messages: list[tuple] = ()):
+    """
+    A small output.db with the contacts above and `messages` as (text, 'YYYY-MM-DD', handle_id,
+    is_from_me) rows, in the exported schema (see benchmarks.synthetic_data.write_output_db).
+    """
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript("""
+            CREATE TABLE contacts (phone_number TEXT, email TEXT, first_name TEXT, last_name TEXT,
+                                   imessage_handle_id INTEGER, sms_handle_id INTEGER);
+            CREATE TABLE messages (message_id INTEGER PRIMARY KEY, guid TEXT, text TEXT, date_time TEXT,
+                                   date_ts INTEGER, year INTEGER, month INTEGER, hour INTEGER,
+                                   handle_id INTEGER, is_from_me INTEGER);
+        """)
+        conn.executemany("INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?)", CONTACTS)
+        for message_id, (text, date, handle_id, is_from_me) in enumerate(messages, start=1):
+            when = datetime.datetime.fromisoformat(date).replace(hour=12, tzinfo=datetime.timezone.utc)
+            conn.execute("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                message_id, f"TEST-{message_id}", text, when.strftime('%Y-%m-%d %H:%M:%S'), int(when.timestamp()),
+                when.year, when.month, when.hour, handle_id, int(is_from_me)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def contacts_db(tmp_path) -> str:
+    """An output.db holding only contacts, for the lookups that don't touch messages."""
+    path = str(tmp_path / 'output.db')
+    write_output_db(path)
+    return path
@@ -0,0 +1,33 @@
+import pytest
+
+from search_message.findmessage import find_messages, search_imessages
+from search_message.search_filters import FilterError
+from tests.conftest import write_output_db
+
+MESSAGES = [
+    ('dinner tonight?', '2024-05-01', 6, False),
+    ('dinner tonight works', '2024-05-01', 2, True),
+]
+
+
+@pytest.fixture
+def messages_db(tmp_path) -> str:
+    path = str(tmp_path / 'output.db')
+    write_output_db(path, MESSAGES)
+    return path
+
+
+def test_contact_filter(messages_db):
+    _, matches = find_messages('dinner tonight', db_path=messages_db, mode='fuzzy', contact='Brian Martin')
+    assert [match['text'] for match in matches] == ['dinner tonight?']
+
+
+def test_filter_error_raises(messages_db):
+    with pytest.raises(FilterError):
+        find_messages('dinner tonight', db_path=messages_db, contact='Zzzyx Qwerty')
+    assert "couldn't find a contact" in search_imessages('dinner tonight', db_path=messages_db, contact='Zzzyx Qwerty')
+
+
+def test_unknown_mode(messages_db):
+    with pytest.raises(ValueError, match='Unknown search mode'):
+        find_messages('dinner tonight', db_path=messages_db, mode='fts5')
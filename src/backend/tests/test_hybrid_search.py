@@ -0,0 +1,36 @@
+import numpy as np
+
+from search_message.hybrid_search import DEFAULT_WEIGHTS, hybrid_search, rank_scores
+from tests.conftest import write_output_db
+
+# Old messages with the exact phrase, from a rare contact, against recent messages that only
+# contain the query's words, from the contact talked to the most
+MESSAGES = [
+    ('the dinner tonight', '2022-03-01', 1, False),
+    ('rent party', '2022-03-02', 1, True),
+    ('mom coffee tonight haha dinner haha', '2024-12-30', 2, False),
+    ('party party the love', '2024-12-31', 2, True),
+] + [(f"see you at {hour}", '2024-12-01', 2, hour % 2 == 0) for hour in range(1, 13)]
+
+
+def test_context_only_breaks_ties():
+    signals = {
+        'fuzzy': np.array([0.95, 0.855]),
+        'coverage': np.array([1.0, 1.0]),
+        'semantic': np.array([np.nan, np.nan]),
+        'recency': np.array([0.0, 1.0]),
+        'contact': np.array([0.0, 1.0]),
+    }
+    exact, partial = rank_scores(signals, DEFAULT_WEIGHTS)
+    assert exact > partial
+
+
+def test_exact_phrase_outranks_token_set_match(tmp_path):
+    db_path = str(tmp_path / 'output.db')
+    write_output_db(db_path, MESSAGES)
+
+    matches = hybrid_search('dinner tonight', top_k=5, db_path=db_path)['matches']
+    assert [match['text'] for match in matches[:2]] == ['the dinner tonight', 'mom coffee tonight haha dinner haha']
+
+    matches = hybrid_search('rent party', top_k=5, db_path=db_path)['matches']
+    assert matches[0]['text'] == 'rent party'
@@ -0,0 +1,35 @@
+import pytest
+
+from search_message.search_filters import FilterError, build_message_filters
+
+
+def test_exact_contact(contacts_db):
+    filters = build_message_filters(contact='Brian Martin', db_path=contacts_db)
+    assert filters['handle_ids'] == [6, 7]
+    assert filters['contact_name'] == 'Brian Martin'
+
+
+def test_misspelled_contact(contacts_db):
+    filters = build_message_filters(contact='Brian Martn', db_path=contacts_db)
+    assert filters['contact_name'] == 'Brian Martin'
+
+
+def test_unknown_contact(contacts_db):
+    with pytest.raises(FilterError, match="couldn't find a contact matching 'Zzzyx Qwerty'"):
+        build_message_filters(contact='Zzzyx Qwerty', db_path=contacts_db)
+
+
+def test_ambiguous_contact(contacts_db):
+    with pytest.raises(FilterError, match='matches several contacts') as error:
+        build_message_filters(contact='John', db_path=contacts_db)
+    for name in ('Sarah Johnson', 'Mike Johnson', 'Ann Johnson'):
+        assert name in str(error.value)
+
+
+def test_no_filters(contacts_db):
+    assert build_message_filters(db_path=contacts_db) is None
+
+
+def test_bad_date(contacts_db):
+    with pytest.raises(FilterError):
+        build_message_filters(start_date='last week', db_path=contacts_db)
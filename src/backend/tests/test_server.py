@@ -0,0 +1,11 @@
+import pytest
+
+from server import app
+
+
+@pytest.mark.parametrize('url', ['/api/ai-response', '/api/ai-response/stream'])
+@pytest.mark.parametrize('body', ['null', '[1, 2]', '"search dinner"', '{"message": "search', '{}'])
+def test_request_without_message(url, body):
+    response = app.test_client().post(url, data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "No message provided"}
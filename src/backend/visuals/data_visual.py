@@ -1,82 +1,69 @@
 # Need handle ids to access frequency of specific contacts
 
-import sqlite3
-import itertools
-from operator import itemgetter
 import matplotlib.pyplot as plt
 import pandas as pd
-from collections import defaultdict
 import numpy as np
+from visuals.message_frequency import aggregate_message_frequencies, get_all_contact_ids
 
 
 def plot_message_frequencies(db_path: str, contact_handle_ids: list[int]):
     """
     Plots the frequency of messages over time for a list of contacts.
     """
-    # Create placeholders for the IN clause, e.g., (?, ?, ?)
-    placeholders = ', '.join(['?'] * len(contact_handle_ids))
-
-    query = f"""
-    SELECT
-        handle_id,
-        strftime('%Y', date_time) AS year,
-        strftime('%m', date_time) AS month,
-        strftime('%Y-%m', date_time) AS year_month,
-        strftime('%H', date_time) AS hour,
-        is_from_me,
-        text,
-        date_time
-    FROM
-        messages
-    WHERE
-        handle_id IN ({placeholders})
-    ORDER BY
-        handle_id, year, month, date_time ASC
-    """
-
-    conn = sqlite3.connect(db_path)
-    # This makes the cursor return rows that can be accessed by column name
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(query, contact_handle_ids)
+    # The counting happens in SQL/NumPy; this just reshapes the arrays into per-contact dicts
+    frequencies = aggregate_message_frequencies(db_path, contact_handle_ids)
+    month_labels = [str(month) for month in frequencies['months']]
+    year_labels = [f"{year:04d}" for year in frequencies['years']]
 
     contact_yearly_data = {}
     contact_monthly_data = {}
     contact_totals = {}
     contact_hourly_data = {}
 
-    for handle_id, messages_for_contact in itertools.groupby(cursor, key=itemgetter('handle_id')):
+    for row, handle_id in enumerate(frequencies['handle_ids'].tolist()):
         print(f"\n===== Processing Contact handle_id: {handle_id}  =====")
 
-        yearly_counts = defaultdict(int)
-        monthly_counts = defaultdict(int)
-        hourly_counts = defaultdict(int)
-        total_messages = 0
-
-    # Group messages by month for this contact
-
-        for month_key, messages_for_month in itertools.groupby(messages_for_contact, key=lambda r: (r['year'], r['month'])):
-            year, month = month_key
-            month_str = f"{year}-{month}"
-            
-            # Process each message to count by hour as well
-            messages_list = list(messages_for_month)
-            month_count = len(messages_list)
-            
-            # Count messages by hour
-            for msg in messages_list:
-                hour = int(msg['hour'])
-                hourly_counts[hour] += 1
-            
-            monthly_counts[month_str] += month_count
-            yearly_counts[year] += month_count
-            total_messages += month_count
-
-        contact_yearly_data[handle_id] = dict(yearly_counts)
-        contact_monthly_data[handle_id] = dict(monthly_counts)
-        contact_hourly_data[handle_id] = dict(hourly_counts)
-        contact_totals[handle_id] = total_messages
-    conn.close()
+        contact_yearly_data[handle_id] = _nonzero_counts(year_labels, frequencies['yearly_counts'][row])
+        contact_monthly_data[handle_id] = _nonzero_counts(month_labels, frequencies['monthly_counts'][row])
+        contact_hourly_data[handle_id] = _nonzero_counts(range(24), frequencies['hourly_counts'][row])
+        contact_totals[handle_id] = int(frequencies['totals'][row])
+
+    return contact_yearly_data, contact_monthly_data, contact_totals, contact_hourly_data
+
+
+def _nonzero_counts(labels, counts) -> dict:
+    return {label: count for label, count in zip(labels, counts.tolist()) if count}
+
+
+def message_frequencies_from_columns(columns: dict, contact_handle_ids: list[int]):
+    """
+    Same result as plot_message_frequencies, but computed with NumPy from the arrays returned
+    by IMessageDatabase.Database.get_message_columns() instead of row by row from output.db.
+    """
+    timestamps = columns['timestamp'].astype('datetime64[s]')
+    handle_ids = columns['handle_id']
+
+    contact_yearly_data = {}
+    contact_monthly_data = {}
+    contact_totals = {}
+    contact_hourly_data = {}
+
+    for handle_id in contact_handle_ids:
+        contact_times = timestamps[handle_ids == handle_id]
+        if not len(contact_times):
+            continue
+
+        months, month_counts = np.unique(contact_times.astype('datetime64[M]'), return_counts=True)
+        years, year_counts = np.unique(contact_times.astype('datetime64[Y]'), return_counts=True)
+        hours = (contact_times - contact_times.astype('datetime64[D]')).astype('timedelta64[h]').astype(np.int64)
+        hour_counts = np.bincount(hours, minlength=24)
+
+        # Keep the same string keys ('2024', '2024-03') as the SQL version
+        contact_yearly_data[handle_id] = {str(year): int(count) for year, count in zip(years, year_counts)}
+        contact_monthly_data[handle_id] = {str(month): int(count) for month, count in zip(months, month_counts)}
+        contact_hourly_data[handle_id] = {hour: int(count) for hour, count in enumerate(hour_counts) if count}
+        contact_totals[handle_id] = len(contact_times)
+
     return contact_yearly_data, contact_monthly_data, contact_totals, contact_hourly_data
 
 
@@ -184,7 +171,7 @@ def main():
     handle_ids_to_process = [79] # Example list of 3 contacts
     
     # For all 88 contacts, you would build this list first
-    # handle_ids_to_process = get_all_contact_ids() 
+    # handle_ids_to_process = get_all_contact_ids(db_path)
     
     contact_yearly_data, contact_monthly_data, contact_totals, contact_hourly_data = plot_message_frequencies(db_path, handle_ids_to_process)
     
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import sqlite3
+import numpy as np
+
+from common.rollups import has_rollups
+
+
+def get_all_contact_ids(db_path: str) -> list[int]:
+    """Every handle_id (iMessage and SMS) that belongs to a known contact."""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = conn.execute("""
+            SELECT imessage_handle_id FROM contacts WHERE imessage_handle_id IS NOT NULL
+            UNION
+            SELECT sms_handle_id FROM contacts WHERE sms_handle_id IS NOT NULL
+        """).fetchall()
+    finally:
+        conn.close()
+    return sorted(row[0] for row in rows)
+
+
+def aggregate_message_frequencies(db_path: str, contact_handle_ids: list[int] | None = None,
+                                  use_rollups: bool = True) -> dict:
+    """
+    Counts messages per contact by month, year and hour of day.
+
+    If the export has rollup tables (built by save_to_sql/sync) they are read directly, so the
+    cost depends on contacts x months rather than on the number of messages. Otherwise SQLite
+    counts the raw messages with GROUP BY over the precomputed year/month/hour columns.
+    Either way the grouped rows are scattered into NumPy arrays, so no message text and no
+    per-message Python objects are ever created. Pass None to aggregate every contact.
+
+    Returns a dict of ready-to-plot arrays, with one row per contact:
+        handle_ids           (C,)      the contacts, sorted
+        months               (M,)      datetime64[M], every month from the first to the last message
+        monthly_counts       (C, M)
+        monthly_sent_counts  (C, M)    the part of monthly_counts with is_from_me = 1
+        years                (Y,)      int, every year from the first to the last message
+        yearly_counts        (C, Y)
+        hourly_counts        (C, 24)   by UTC hour of day
+        sent_counts          (C,)
+        totals               (C,)
+    """
+    where = ""
+    params: list[int] = []
+    if contact_handle_ids is not None:
+        if not contact_handle_ids:
+            return _empty_frequencies()
+        placeholders = ', '.join(['?'] * len(contact_handle_ids))
+        where = f"WHERE handle_id IN ({placeholders})"
+        params = list(contact_handle_ids)
+
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        if use_rollups and has_rollups(conn):
+            month_rows = conn.execute(f"""
+                SELECT handle_id, year, month, sent, sent + received
+                FROM contact_month_counts
+                {where}
+            """, params).fetchall()
+            hour_rows = conn.execute(f"""
+                SELECT handle_id, hour, sent + received
+                FROM contact_hour_counts
+                {where}
+            """, params).fetchall()
+        else:
+            rows = conn.execute(f"""
+                SELECT handle_id, year, month, hour, SUM(is_from_me), COUNT(*)
+                FROM messages
+                {where}
+                GROUP BY handle_id, year, month, hour
+            """, params).fetchall()
+            # Hour-level groups work for both scatters, bincount adds up the duplicates
+            month_rows = [(handle_id, year, month, sent, count) for handle_id, year, month, _, sent, count in rows]
+            hour_rows = [(handle_id, hour, count) for handle_id, _, _, hour, _, count in rows]
+    finally:
+        conn.close()
+
+    if not month_rows:
+        return _empty_frequencies()
+
+    return _frequencies_from_groups(np.array(month_rows, dtype=np.int64), np.array(hour_rows, dtype=np.int64))
+
+
+def _frequencies_from_groups(month_groups: np.ndarray, hour_groups: np.ndarray) -> dict:
+    """
+    month_groups rows are (handle_id, year, month, sent, count),
+    hour_groups rows are (handle_id, hour, count).
+    """
+    month_handles, group_years, group_months, group_sent, group_counts = month_groups.T
+    hour_handles, group_hours, hour_counts = hour_groups.T
+
+    handle_ids = np.unique(month_handles)
+    contact_count = len(handle_ids)
+    month_contact = np.searchsorted(handle_ids, month_handles)
+    hour_contact = np.searchsorted(handle_ids, hour_handles)
+
+    # Months as a running index (year * 12 + month - 1) so the timeline has no gaps
+    month_number = group_years * 12 + group_months - 1
+    first_month, last_month = month_number.min(), month_number.max()
+    month_count = int(last_month - first_month + 1)
+    first_year, last_year = group_years.min(), group_years.max()
+    year_count = int(last_year - first_year + 1)
+
+    def scatter(contact_index, column_index, width, weights):
+        flat = np.bincount(contact_index * width + column_index, weights=weights,
+                           minlength=contact_count * width)
+        return flat.astype(np.int64).reshape(contact_count, width)
+
+    monthly_counts = scatter(month_contact, month_number - first_month, month_count, group_counts)
+    monthly_sent_counts = scatter(month_contact, month_number - first_month, month_count, group_sent)
+    return {
+        'handle_ids': handle_ids,
+        # datetime64[M] counts months from 1970-01
+        'months': (np.arange(first_month, last_month + 1) - 1970 * 12).astype('datetime64[M]'),
+        'monthly_counts': monthly_counts,
+        'monthly_sent_counts': monthly_sent_counts,
+        'years': np.arange(first_year, last_year + 1),
+        'yearly_counts': scatter(month_contact, group_years - first_year, year_count, group_counts),
+        'hourly_counts': scatter(hour_contact, group_hours, 24, hour_counts),
+        'sent_counts': monthly_sent_counts.sum(axis=1),
+        'totals': monthly_counts.sum(axis=1),
+    }
+
+
+def _empty_frequencies() -> dict:
+    return {
+        'handle_ids': np.zeros(0, dtype=np.int64),
+        'months': np.zeros(0, dtype='datetime64[M]'),
+        'monthly_counts': np.zeros((0, 0), dtype=np.int64),
+        'monthly_sent_counts': np.zeros((0, 0), dtype=np.int64),
+        'years': np.zeros(0, dtype=np.int64),
+        'yearly_counts': np.zeros((0, 0), dtype=np.int64),
+        'hourly_counts': np.zeros((0, 24), dtype=np.int64),
+        'sent_counts': np.zeros(0, dtype=np.int64),
+        'totals': np.zeros(0, dtype=np.int64),
+    }
@@ -14,6 +14,20 @@ interface Message {
   fileType?: string;
   isMessageResponse?: boolean;
   isSummarizeResponse?: boolean;
+  progress?: string;
+  contactCandidates?: ContactCandidate[];
+  timePeriod?: string;
+}
+
+interface ContactCandidate {
+  display_name: string;
+  handle_ids: number[];
+}
+
+// A contact and period the user already picked, sent along instead of being parsed from the text
+interface SummarizeSelection {
+  handle_ids: number[];
+  time_period?: string;
 }
 
 interface AIChatbotProps {
@@ -33,6 +47,8 @@ export default function AIChatbot({ className = "" }: AIChatbotProps) {
   const [isTyping, setIsTyping] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const textareaRef = useRef<HTMLTextAreaElement>(null);
+  // Message ids; Date.now() isn't unique for the user's message and its reply placeholder
+  const nextMessageId = useRef(2);
 
   // Auto-scroll to bottom when new messages arrive
   useEffect(() => {
@@ -167,12 +183,12 @@ export default function AIChatbot({ className = "" }: AIChatbotProps) {
   };
 
   // Fetch AI response from Flask backend
-  const fetchAIResponse = async (userMessage: string) => {
+  const fetchAIResponse = async (userMessage: string, selection?: SummarizeSelection) => {
     setIsTyping(true);
 
     // Add typing indicator
     const typingMessage: Message = {
-      id: Date.now(),
+      id: nextMessageId.current++,
       content: "",
       isUser: false,
       timestamp: new Date(),
@@ -180,60 +196,118 @@ export default function AIChatbot({ className = "" }: AIChatbotProps) {
     };
     setMessages(prev => [...prev, typingMessage]);
 
+    const typingId = typingMessage.id;
+    const updateTypingMessage = (update: (msg: Message) => Message) => {
+      setMessages(prev => prev.map(msg => (msg.id === typingId ? update(msg) : msg)));
+    };
+
     try {
-      const res = await fetch("http://127.0.0.1:5000/api/ai-response", {
+      // Server-Sent Events over a POST, so read the body stream instead of using EventSource
+      const res = await fetch("http://127.0.0.1:5000/api/ai-response/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: userMessage })
+        body: JSON.stringify({ message: userMessage, ...selection })
       });
 
-      const data = await res.json();
-      const isMessageResponse = data.is_message === true;
-      const isSummarizeResponse = data.is_summarize === true;
+      if (!res.body) {
+        throw new Error("Streaming not supported");
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamedText = "";
+      let done = false;
+
+      while (!done) {
+        const { value, done: streamDone } = await reader.read();
+        if (streamDone) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; keep any partial event in the buffer
+        const events = buffer.split("\n\n");
+        buffer = events.pop() || "";
+
+        for (const rawEvent of events) {
+          let eventName = "message";
+          let dataText = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) dataText += line.slice(5).trim();
+          }
+          if (!dataText) continue;  // keep-alive comment
+          const data = JSON.parse(dataText);
+
+          if (eventName === "progress") {
+            updateTypingMessage(msg => ({ ...msg, progress: data.message }));
+          } else if (eventName === "token") {
+            // Show the summary as it is generated
+            streamedText += data.content;
+            const text = streamedText;
+            updateTypingMessage(msg => ({
+              ...msg,
+              content: text,
+              isTyping: false,
+              isSummarizeResponse: true
+            }));
+          } else if (eventName === "done") {
+            done = true;
+            updateTypingMessage(msg => ({
+              ...msg,
+              content: data.content || "No content received",
+              isTyping: false,
+              progress: undefined,
+              timestamp: new Date(data.timestamp || Date.now()),
+              fileUrl: data.file_url,
+              fileName: data.file_name,
+              fileType: data.file_type,
+              isMessageResponse: data.is_message === true,
+              isSummarizeResponse: data.is_summarize === true,
+              contactCandidates: data.candidates,
+              timePeriod: data.time_period
+            }));
+          }
+        }
+      }
 
-      setMessages(prev =>
-        prev.map(msg =>
-          msg.isTyping
-            ? { 
-                ...msg, 
-                content: data.content || "No content received", 
-                isTyping: false,
-                timestamp: new Date(data.timestamp || Date.now()),
-                fileUrl: data.file_url,
-                fileName: data.file_name,
-                fileType: data.file_type,
-                isMessageResponse: isMessageResponse,
-                isSummarizeResponse: isSummarizeResponse
-              }
-            : msg
-        )
-      );
+      if (!done) {
+        reader.cancel();
+        updateTypingMessage(msg => ({
+          ...msg,
+          content: streamedText || "No content received",
+          isTyping: false,
+          progress: undefined
+        }));
+      }
     } catch (err) {
       console.error("Error fetching AI response:", err);
-      setMessages(prev =>
-        prev.map(msg =>
-          msg.isTyping
-            ? { ...msg, content: "Error: Could not reach AI backend.", isTyping: false }
-            : msg
-        )
-      );
+      updateTypingMessage(msg => ({
+        ...msg,
+        // Keep whatever was already streamed if the connection dropped midway
+        content: msg.content || "Error: Could not reach AI backend.",
+        isTyping: false,
+        progress: undefined
+      }));
     } finally {
       setIsTyping(false);
     }
   };
 
-  const handleSendMessage = () => {
-    if (!inputMessage.trim()) return;
-
+  const sendMessage = (text: string, selection?: SummarizeSelection) => {
     const newMessage: Message = {
-      id: Date.now(),
-      content: inputMessage,
+      id: nextMessageId.current++,
+      content: text,
       isUser: true,
       timestamp: new Date(),
     };
 
     setMessages(prev => [...prev, newMessage]);
-    fetchAIResponse(inputMessage);  // call Flask backend
+    fetchAIResponse(text, selection);  // call Flask backend
+  };
+
+  const handleSendMessage = () => {
+    if (!inputMessage.trim()) return;
+    sendMessage(inputMessage);
     setInputMessage("");
   };
 
@@ -271,11 +345,18 @@ export default function AIChatbot({ className = "" }: AIChatbotProps) {
               <div className="message-content">
                 <div className={`message-bubble ${message.isUser ? 'user-bubble' : 'ai-bubble'}`}>
                   {message.isTyping ? (
-                    <div className="typing-indicator">
-                      <span></span>
-                      <span></span>
-                      <span></span>
-                    </div>
+                    <>
+                      <div className="typing-indicator">
+                        <span></span>
+                        <span></span>
+                        <span></span>
+                      </div>
+                      {message.progress && (
+                        <p className="message-text" style={{ fontSize: '12px', opacity: 0.7, marginTop: '6px' }}>
+                          {message.progress}
+                        </p>
+                      )}
+                    </>
                   ) : (
                     <>
                       {message.isMessageResponse || message.isSummarizeResponse ? 
@@ -330,6 +411,32 @@ export default function AIChatbot({ className = "" }: AIChatbotProps) {
                           </button>
                         </div>
                       )}
+                      {message.contactCandidates && message.contactCandidates.length > 1 && (
+                        <div style={{ marginTop: '10px', display: 'flex', flexWrap: 'wrap', gap: '6px', alignItems: 'center' }}>
+                          <span style={{ fontSize: '12px', opacity: 0.7 }}>Did you mean:</span>
+                          {message.contactCandidates.map(candidate => (
+                            <button
+                              key={candidate.handle_ids.join(",")}
+                              onClick={() => sendMessage(
+                                `summarize my conversation with ${candidate.display_name}`,
+                                // Phone-number names can't be parsed back out of the text, and it has no period
+                                { handle_ids: candidate.handle_ids, time_period: message.timePeriod }
+                              )}
+                              disabled={isTyping}
+                              style={{
+                                padding: '4px 10px',
+                                backgroundColor: 'rgba(0,0,0,0.05)',
+                                border: '1px solid rgba(0,0,0,0.1)',
+                                borderRadius: '12px',
+                                fontSize: '12px',
+                                cursor: 'pointer'
+                              }}
+                            >
+                              {candidate.display_name}
+                            </button>
+                          ))}
+                        </div>
+                      )}
                     </>
                   )}
                 </div>
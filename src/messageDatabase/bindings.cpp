@@ -1,6 +1,7 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h> // For automatic conversion of std::vector, std::optional, etc.
 #include <pybind11/chrono.h> // For automatic conversion of std::chrono types
+#include <pybind11/numpy.h>
 
 #include "database.h"
 #include "contact.h"
@@ -8,6 +9,26 @@
 
 namespace py = pybind11;
 
+// Hands a vector's buffer to NumPy without copying it. The vector is moved to the
+// heap and owned by a capsule, which frees it when the last array view goes away.
+template <typename T>
+py::array vector_to_array(std::vector<T>&& values, py::dtype dtype) {
+    auto* owned = new std::vector<T>(std::move(values));
+    py::capsule owner(owned, [](void* p) { delete static_cast<std::vector<T>*>(p); });
+    return py::array(dtype, {owned->size()}, {sizeof(T)}, owned->data(), owner);
+}
+
+py::dict message_columns_to_dict(MessageColumns&& columns) {
+    py::dict result;
+    result["message_id"] = vector_to_array(std::move(columns.message_ids), py::dtype::of<int64_t>());
+    result["timestamp"] = vector_to_array(std::move(columns.timestamps), py::dtype::of<int64_t>());
+    result["handle_id"] = vector_to_array(std::move(columns.handle_ids), py::dtype::of<uint32_t>());
+    result["is_from_me"] = vector_to_array(std::move(columns.is_from_me), py::dtype("bool"));
+    result["text_data"] = vector_to_array(std::move(columns.text_data), py::dtype::of<uint8_t>());
+    result["text_offsets"] = vector_to_array(std::move(columns.text_offsets), py::dtype::of<int64_t>());
+    return result;
+}
+
 // This is the single entry point for the entire Python module.
 PYBIND11_MODULE(IMessageDatabase, m) {
     m.doc() = "A C++ library for parsing and analyzing iMessage data.";
@@ -37,17 +58,34 @@ PYBIND11_MODULE(IMessageDatabase, m) {
     py::class_<MessageData>(m, "MessageData")
         // TODO: Expose members of message_data if you need them in Python,
         // for example: .def_readonly("text", &message_data::m_text);
-        .def("get_text", &MessageData::get_text);
+        .def("get_text", &MessageData::get_text)
+        .def("get_date_time", &MessageData::get_date_time)
+        .def("get_handle_id", &MessageData::get_handle_id)
+        .def("is_from_me", &MessageData::is_from_me)
+        .def("get_message_id", &MessageData::get_message_id)
+        .def("get_guid", &MessageData::get_guid);
 
 
     // 3. Now we can define the Database class that uses the types above
     py::class_<Database>(m, "Database")
-        .def(py::init<std::string, std::string>())
+        // worker_count > 1 decodes message bodies on a thread pool, 0 uses every core
+        .def(py::init<std::string, std::string, unsigned int>(),
+             py::arg("pList_folder"), py::arg("chat_db_path"), py::arg("worker_count") = 1)
+        .def_readonly_static("OUTPUT_SCHEMA_VERSION", &Database::OUTPUT_SCHEMA_VERSION)
         .def("populate_database", &Database::populate_database)
+        // Point this at a writable file to skip re-parsing unchanged .abcdp cards on later runs
+        .def("set_contact_cache_path", &Database::set_contact_cache_path)
         // Add getters so Python can get the results.
         // The return_value_policy::copy tells pybind11 to copy the vector
         // into a new Python list, which is the safest approach.
         .def("get_contacts", &Database::get_contacts, py::return_value_policy::copy)
         .def("get_messages", &Database::get_messages, py::return_value_policy::copy)
-        .def("save_to_sql", &Database::save_to_sql);
+        // Returns a dict of NumPy arrays (message_id, timestamp, handle_id, is_from_me,
+        // text_data, text_offsets) that share memory with the C++ buffers instead of copying.
+        .def("get_message_columns", [](Database& self) {
+            return message_columns_to_dict(self.get_message_columns());
+        })
+        .def("save_to_sql", &Database::save_to_sql)
+        .def("export_to_sql", &Database::export_to_sql, py::arg("output_path"), py::arg("batch_size") = 10000)
+        .def("sync", &Database::sync);
 }
\ No newline at end of file
@@ -0,0 +1,56 @@
+#pragma once
+#include <condition_variable>
+#include <deque>
+#include <mutex>
+#include <optional>
+
+// A small blocking queue with a fixed capacity, used to hand batches of rows
+// between the reader, decoder and writer threads of the message pipeline.
+// push() blocks while the queue is full, which keeps memory bounded when one
+// stage is slower than the others.
+template <typename T>
+class BoundedQueue {
+private:
+    std::deque<T> m_items;
+    size_t m_capacity;
+    bool m_closed = false;
+    std::mutex m_mutex;
+    std::condition_variable m_not_empty;
+    std::condition_variable m_not_full;
+
+public:
+    explicit BoundedQueue(size_t capacity) : m_capacity(capacity > 0 ? capacity : 1) {}
+
+    // Returns false (and drops the item) if the queue was closed
+    bool push(T item) {
+        std::unique_lock lock(m_mutex);
+        m_not_full.wait(lock, [this] { return m_closed || m_items.size() < m_capacity; });
+        if (m_closed) {
+            return false;
+        }
+        m_items.push_back(std::move(item));
+        m_not_empty.notify_one();
+        return true;
+    }
+
+    // Returns std::nullopt once the queue is closed and drained
+    std::optional<T> pop() {
+        std::unique_lock lock(m_mutex);
+        m_not_empty.wait(lock, [this] { return m_closed || !m_items.empty(); });
+        if (m_items.empty()) {
+            return std::nullopt;
+        }
+        T item = std::move(m_items.front());
+        m_items.pop_front();
+        m_not_full.notify_one();
+        return item;
+    }
+
+    // Wakes up every waiting thread. Items already queued can still be popped.
+    void close() {
+        std::lock_guard lock(m_mutex);
+        m_closed = true;
+        m_not_empty.notify_all();
+        m_not_full.notify_all();
+    }
+};
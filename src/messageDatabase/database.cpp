@@ -1,10 +1,16 @@
 #include "database.h"
 #include <iostream>
-#include <fstream>
 #include <memory>
 #include <unordered_map>
 #include <algorithm>
+#include <optional>
+#include <map>
+#include <thread>
+#include <atomic>
+#include <mutex>
 #include <plist/plist++.h>
+#include "bounded_queue.h"
+#include "mapped_file.h"
 #include <SQLiteCpp/Transaction.h> // <-- ADD THIS INCLUDE for SQLite::Transaction
 
 // We need the C header for the memory parsing function and enums
@@ -43,20 +49,22 @@ std::string normalize_phone(std::string phone) {
     return phone;
 }
 
-Database::Database(std::string pList_folder, std::string chat_db_path)
+Database::Database(std::string pList_folder, std::string chat_db_path, unsigned int worker_count)
     : m_pList_folder(pList_folder),
       m_chat_db_path(chat_db_path),
-      m_db(chat_db_path, SQLite::OPEN_READONLY)
+      m_db(chat_db_path, SQLite::OPEN_READONLY),
+      // 0 means one thread per core
+      m_worker_count(worker_count > 0 ? worker_count : std::max(1u, std::thread::hardware_concurrency()))
 {}
 
 std::optional<Contact> Database::parse_plist_file(const fs::path& file_path) {
     plist_t root_c_node = nullptr;
     try {
-        std::ifstream file(file_path, std::ios::binary);
-        if (!file) return std::nullopt;
-        std::string content((std::istreambuf_iterator<char>(file)), std::istreambuf_iterator<char>());
+        // Parse straight out of the page cache instead of copying the file into a string
+        MappedFile file(file_path);
+        if (!file.is_open()) return std::nullopt;
 
-        plist_from_memory(content.c_str(), content.length(), &root_c_node, nullptr);
+        plist_from_memory(file.data(), (uint32_t)file.size(), &root_c_node, nullptr);
         if (!root_c_node) return std::nullopt;
 
         if (plist_get_node_type(root_c_node) != PLIST_DICT) {
@@ -101,15 +109,150 @@ std::optional<Contact> Database::parse_plist_file(const fs::path& file_path) {
     return std::nullopt;
 }
 
-void Database::populate_contacts() {
+std::vector<PlistFile> Database::list_plist_files() {
+    std::vector<PlistFile> files;
     for (const auto& entry : fs::recursive_directory_iterator(m_pList_folder)) {
         if (entry.is_regular_file() && entry.path().extension() == ".abcdp") {
-            if (auto contact_opt = parse_plist_file(entry.path())) {
-                m_contacts.push_back(contact_opt.value());
-            }
+            files.push_back({
+                entry.path(),
+                (long long)entry.last_write_time().time_since_epoch().count(),
+                (long long)entry.file_size()
+            });
+        }
+    }
+    return files;
+}
+
+// Parse results of previous runs, keyed by plist path. An entry is only reused while the
+// file's mtime and size are unchanged. Cards without a phone number are cached as well
+// (with has_contact = 0) so they aren't re-parsed every time either.
+std::unordered_map<std::string, CachedPlist> load_plist_cache(SQLite::Database& cache_db) {
+    cache_db.exec("CREATE TABLE IF NOT EXISTS plist_cache ("
+                  "path TEXT PRIMARY KEY, "
+                  "mtime INTEGER, "
+                  "size INTEGER, "
+                  "has_contact INTEGER, "
+                  "phone_number TEXT, "
+                  "first_name TEXT, "
+                  "last_name TEXT)");
+
+    std::unordered_map<std::string, CachedPlist> cache;
+    SQLite::Statement query(cache_db, "SELECT path, mtime, size, has_contact, phone_number, first_name, last_name FROM plist_cache");
+    while (query.executeStep()) {
+        auto optional_text = [&query](int column) -> std::optional<std::string> {
+            const auto& value = query.getColumn(column);
+            return value.isNull() ? std::nullopt : std::optional<std::string>(value.getString());
+        };
+
+        CachedPlist entry;
+        entry.mtime = query.getColumn(1).getInt64();
+        entry.size = query.getColumn(2).getInt64();
+        if (query.getColumn(3).getInt()) {
+            entry.contact = Contact(optional_text(4), std::nullopt, optional_text(5), optional_text(6), std::nullopt, std::nullopt);
+        }
+        cache.emplace(query.getColumn(0).getString(), std::move(entry));
+    }
+    return cache;
+}
+
+void save_plist_cache(SQLite::Database& cache_db, const std::vector<PlistFile>& files,
+                      const std::vector<size_t>& parsed_indexes, const std::vector<std::optional<Contact>>& contacts,
+                      const std::unordered_map<std::string, CachedPlist>& previous_cache) {
+    SQLite::Transaction transaction(cache_db);
+
+    SQLite::Statement upsert(cache_db, "INSERT OR REPLACE INTO plist_cache VALUES (?, ?, ?, ?, ?, ?, ?)");
+    for (size_t index : parsed_indexes) {
+        const auto& file = files[index];
+        const auto& contact = contacts[index];
+        upsert.bind(1, file.path.string());
+        upsert.bind(2, (int64_t)file.mtime);
+        upsert.bind(3, (int64_t)file.size);
+        upsert.bind(4, contact.has_value() ? 1 : 0);
+        if (contact && contact->m_phone_number) upsert.bind(5, contact->m_phone_number.value()); else upsert.bind(5);
+        if (contact && contact->m_first_name) upsert.bind(6, contact->m_first_name.value()); else upsert.bind(6);
+        if (contact && contact->m_last_name) upsert.bind(7, contact->m_last_name.value()); else upsert.bind(7);
+        upsert.exec();
+        upsert.reset();
+    }
+
+    // Forget cards that were deleted from the address book
+    std::unordered_map<std::string, bool> present;
+    for (const auto& file : files) {
+        present.emplace(file.path.string(), true);
+    }
+    SQLite::Statement remove(cache_db, "DELETE FROM plist_cache WHERE path = ?");
+    for (const auto& [path, entry] : previous_cache) {
+        if (!present.count(path)) {
+            remove.bind(1, path);
+            remove.exec();
+            remove.reset();
+        }
+    }
+
+    transaction.commit();
+}
+
+void Database::populate_contacts() {
+    const std::vector<PlistFile> files = list_plist_files();
+    fingerprint_contacts(m_sync_state, files);
+
+    std::optional<SQLite::Database> cache_db;
+    std::unordered_map<std::string, CachedPlist> cache;
+    if (!m_contact_cache_path.empty()) {
+        try {
+            cache_db.emplace(m_contact_cache_path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+            cache = load_plist_cache(*cache_db);
+        } catch (const std::exception& e) {
+            std::cerr << "Warning: Could not open contact cache " << m_contact_cache_path << ": " << e.what() << std::endl;
+            cache_db.reset();
+        }
+    }
+
+    // Take whatever is still valid from the cache and queue up the rest for parsing
+    std::vector<std::optional<Contact>> contacts(files.size());
+    std::vector<size_t> to_parse;
+    for (size_t i = 0; i < files.size(); ++i) {
+        auto it = cache.find(files[i].path.string());
+        if (it != cache.end() && it->second.mtime == files[i].mtime && it->second.size == files[i].size) {
+            contacts[i] = it->second.contact;
+        } else {
+            to_parse.push_back(i);
+        }
+    }
+
+    // Parse the remaining cards on the worker pool. Each thread claims the next unparsed
+    // file and writes only its own slot, so the results keep the directory order.
+    std::atomic<size_t> next_file{0};
+    auto parse_worker = [&] {
+        for (size_t k = next_file++; k < to_parse.size(); k = next_file++) {
+            contacts[to_parse[k]] = parse_plist_file(files[to_parse[k]].path);
+        }
+    };
+    const size_t thread_count = std::min(m_worker_count, to_parse.size());
+    std::vector<std::thread> parsers;
+    for (size_t i = 1; i < thread_count; ++i) {
+        parsers.emplace_back(parse_worker);
+    }
+    parse_worker();
+    for (auto& parser : parsers) {
+        parser.join();
+    }
+
+    for (auto& contact : contacts) {
+        if (contact.has_value()) {
+            m_contacts.push_back(std::move(contact.value()));
+        }
+    }
+    std::cout << "Successfully populated " << m_contacts.size() << " contacts from plists ("
+              << to_parse.size() << " parsed, " << files.size() - to_parse.size() << " from cache)." << std::endl;
+
+    if (cache_db) {
+        try {
+            save_plist_cache(*cache_db, files, to_parse, contacts, cache);
+        } catch (const std::exception& e) {
+            std::cerr << "Warning: Could not update contact cache: " << e.what() << std::endl;
         }
     }
-    std::cout << "Successfully populated " << m_contacts.size() << " contacts from plists." << std::endl;
 
     // After loading from plists, enrich them with database info
     enrich_contacts_from_db();
@@ -158,47 +301,404 @@ void Database::enrich_contacts_from_db() {
     std::cout << "Successfully enriched contacts with handle IDs from chat.db." << std::endl;
 }
 
-void Database::populate_messages() {
+// Selects every 1:1 text message with ROWID in (?, ?]. The CASE works out the other
+// participant's handle for messages I sent, since those have handle_id = 0.
+const char* MESSAGE_QUERY_SQL = "SELECT "
+    "T1.ROWID AS message_id, T1.guid, "
+    "T1.text, T1.attributedBody, T1.date, T1.is_from_me, "
+    "T1.cache_has_attachments, T1.is_audio_message, T1.was_data_detected, T1.item_type, "
+    "CASE "
+        "WHEN T1.is_from_me = 1 THEN ( "
+            "SELECT T4.handle_id "
+            "FROM chat_handle_join AS T4 "
+            "WHERE T4.chat_id = T2.chat_id AND T4.handle_id != 0 "
+            "LIMIT 1 "
+        ") "
+        "ELSE T1.handle_id "
+    "END AS effective_handle_id "
+    "FROM message AS T1 "
+    "JOIN chat_message_join AS T2 ON T1.ROWID = T2.message_id "
+    "JOIN ( "
+        "SELECT chat_id FROM chat_handle_join "
+        "GROUP BY chat_id "
+        "HAVING COUNT(handle_id) <= 2 "
+    ") AS T3 ON T2.chat_id = T3.chat_id "
+    "WHERE T1.balloon_bundle_id IS NULL "
+    "AND T1.ROWID > ? AND T1.ROWID <= ?";
+
+// A message that belongs to more than one chat comes back once per chat, so keep the last copy
+const char* INSERT_MESSAGE_SQL = "INSERT OR REPLACE INTO messages "
+    "(message_id, guid, text, date_time, date_ts, year, month, hour, handle_id, is_from_me) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)";
+
+void Database::read_message_high_water(SyncState& state) {
+    SQLite::Statement query(m_db, "SELECT IFNULL(MAX(ROWID), 0), IFNULL(MAX(date), 0) FROM message");
+    if (query.executeStep()) {
+        state.last_message_rowid = query.getColumn(0).getInt64();
+        state.last_message_date = query.getColumn(1).getInt64();
+    }
+}
+
+void Database::read_contact_fingerprint(SyncState& state) {
+    fingerprint_contacts(state, list_plist_files());
+}
+
+void Database::fingerprint_contacts(SyncState& state, const std::vector<PlistFile>& files) {
+    // Only stat() the plists here; any added, removed or edited card changes the count or max mtime
+    state.plist_count = (long long)files.size();
+    state.plist_mtime = 0;
+    for (const auto& file : files) {
+        state.plist_mtime = std::max(state.plist_mtime, file.mtime);
+    }
+    // New handles can match existing cards, so they count as a contact change too
+    state.last_handle_rowid = m_db.execAndGet("SELECT IFNULL(MAX(ROWID), 0) FROM handle").getInt64();
+}
+
+void Database::for_each_message(long long after_rowid, long long up_to_rowid, const std::function<void(MessageData&&)>& callback) {
+    if (m_worker_count > 1) {
+        for_each_message_parallel(after_rowid, up_to_rowid, callback);
+        return;
+    }
+
+    SQLite::Statement query(m_db, MESSAGE_QUERY_SQL);
+    query.bind(1, (int64_t)after_rowid);
+    query.bind(2, (int64_t)up_to_rowid);
+
+    while (query.executeStep()) {
+        if (auto msg_opt = MessageData::from_database_row(query)) {
+            callback(std::move(msg_opt.value()));
+        }
+    }
+}
+
+void Database::for_each_message_parallel(long long after_rowid, long long up_to_rowid, const std::function<void(MessageData&&)>& callback) {
+    // Three stages:
+    //   reader thread  - steps the chat.db query and copies raw rows into batches
+    //   worker threads - decode attributedBody and validate each batch
+    //   this thread    - the writer, which calls callback in the original row order
+    // Batches carry a sequence number so the writer can put them back in order.
+    constexpr size_t ROWS_PER_BATCH = 512;
+
+    struct RawBatch {
+        size_t sequence;
+        std::vector<RawMessageRow> rows;
+    };
+    struct DecodedBatch {
+        size_t sequence;
+        std::vector<MessageData> messages;
+    };
+
+    BoundedQueue<RawBatch> raw_queue(m_worker_count * 2);
+    BoundedQueue<DecodedBatch> decoded_queue(m_worker_count * 2);
+
+    std::mutex error_mutex;
+    std::exception_ptr error;
+    auto fail = [&](std::exception_ptr e) {
+        {
+            std::lock_guard lock(error_mutex);
+            if (!error) error = e;
+        }
+        // Unblock every stage so all threads can be joined
+        raw_queue.close();
+        decoded_queue.close();
+    };
+
+    std::thread reader([&] {
+        try {
+            SQLite::Statement query(m_db, MESSAGE_QUERY_SQL);
+            query.bind(1, (int64_t)after_rowid);
+            query.bind(2, (int64_t)up_to_rowid);
+
+            RawBatch batch{0, {}};
+            batch.rows.reserve(ROWS_PER_BATCH);
+            while (query.executeStep()) {
+                batch.rows.push_back(MessageData::read_raw_row(query));
+                if (batch.rows.size() == ROWS_PER_BATCH) {
+                    const size_t next_sequence = batch.sequence + 1;
+                    if (!raw_queue.push(std::move(batch))) return;
+                    batch = RawBatch{next_sequence, {}};
+                    batch.rows.reserve(ROWS_PER_BATCH);
+                }
+            }
+            if (!batch.rows.empty()) {
+                raw_queue.push(std::move(batch));
+            }
+            raw_queue.close();
+        } catch (...) {
+            fail(std::current_exception());
+        }
+    });
+
+    std::atomic<size_t> workers_running{m_worker_count};
+    std::vector<std::thread> workers;
+    for (size_t i = 0; i < m_worker_count; ++i) {
+        workers.emplace_back([&] {
+            try {
+                while (auto batch = raw_queue.pop()) {
+                    DecodedBatch decoded{batch->sequence, {}};
+                    decoded.messages.reserve(batch->rows.size());
+                    for (auto& row : batch->rows) {
+                        if (auto msg_opt = MessageData::from_raw_row(std::move(row))) {
+                            decoded.messages.push_back(std::move(msg_opt.value()));
+                        }
+                    }
+                    if (!decoded_queue.push(std::move(decoded))) break;
+                }
+            } catch (...) {
+                fail(std::current_exception());
+            }
+            // The last worker out tells the writer there is nothing more coming
+            if (--workers_running == 0) {
+                decoded_queue.close();
+            }
+        });
+    }
+
     try {
-        // Use the new, more robust query
-        SQLite::Statement query(m_db, "SELECT "
-                    "T1.text, T1.attributedBody, T1.date, T1.is_from_me, "
-                    "T1.cache_has_attachments, T1.is_audio_message, T1.was_data_detected, T1.item_type, "
-                    "CASE "
-                        "WHEN T1.is_from_me = 1 THEN ( "
-                            "SELECT T4.handle_id "
-                            "FROM chat_handle_join AS T4 "
-                            "WHERE T4.chat_id = T2.chat_id AND T4.handle_id != 0 "
-                            "LIMIT 1 "
-                        ") "
-                        "ELSE T1.handle_id "
-                    "END AS effective_handle_id "
-                    "FROM message AS T1 "
-                    "JOIN chat_message_join AS T2 ON T1.ROWID = T2.message_id "
-                    "JOIN ( "
-                        "SELECT chat_id FROM chat_handle_join "
-                        "GROUP BY chat_id "
-                        "HAVING COUNT(handle_id) <= 2 "
-                    ") AS T3 ON T2.chat_id = T3.chat_id "
-                    "WHERE T1.balloon_bundle_id IS NULL");
-            
-        while (query.executeStep()) {
-            if (auto msg_opt = MessageData::from_database_row(query)) {
-                m_messages.push_back(msg_opt.value());
+        std::map<size_t, std::vector<MessageData>> pending;
+        size_t next_sequence = 0;
+        while (auto batch = decoded_queue.pop()) {
+            pending.emplace(batch->sequence, std::move(batch->messages));
+            while (!pending.empty() && pending.begin()->first == next_sequence) {
+                for (auto& message : pending.begin()->second) {
+                    callback(std::move(message));
+                }
+                pending.erase(pending.begin());
+                ++next_sequence;
             }
         }
+    } catch (...) {
+        fail(std::current_exception());
+    }
+
+    reader.join();
+    for (auto& worker : workers) {
+        worker.join();
+    }
+    if (error) {
+        std::rethrow_exception(error);
+    }
+}
+
+void Database::populate_messages() {
+    try {
+        // Snapshot the high-water mark first so rows that arrive mid-read are left for the next sync
+        read_message_high_water(m_sync_state);
+        for_each_message(0, m_sync_state.last_message_rowid, [this](MessageData&& message) {
+            m_messages.push_back(std::move(message));
+        });
         std::cout << "Successfully populated " << m_messages.size() << " messages from chat.db." << std::endl;
     } catch (const std::exception& e) {
         std::cerr << "Error populating messages: " << e.what() << std::endl;
     }
 }
 
+void append_message_column(MessageColumns& columns, const MessageData& message) {
+    columns.message_ids.push_back(message.get_message_id());
+    columns.timestamps.push_back(std::chrono::duration_cast<std::chrono::seconds>(message.get_date_time().time_since_epoch()).count());
+    columns.handle_ids.push_back(message.get_handle_id());
+    columns.is_from_me.push_back(message.is_from_me() ? 1 : 0);
+    const std::string& text = message.get_text();
+    columns.text_data.insert(columns.text_data.end(), text.begin(), text.end());
+    columns.text_offsets.push_back((int64_t)columns.text_data.size());
+}
+
+MessageColumns Database::get_message_columns() {
+    MessageColumns columns;
+    if (!m_messages.empty()) {
+        for (const auto& message : m_messages) {
+            append_message_column(columns, message);
+        }
+        return columns;
+    }
+
+    SyncState snapshot;
+    read_message_high_water(snapshot);
+    for_each_message(0, snapshot.last_message_rowid, [&columns](MessageData&& message) {
+        append_message_column(columns, message);
+    });
+    return columns;
+}
+
 void Database::populate_database() {
     populate_contacts();
     populate_messages();
 }
 
 
+void create_output_tables(SQLite::Database& db) {
+    db.exec("CREATE TABLE IF NOT EXISTS contacts ("
+            "phone_number TEXT, "
+            "email TEXT, "
+            "first_name TEXT, "
+            "last_name TEXT, "
+            "imessage_handle_id INTEGER, "
+            "sms_handle_id INTEGER)");
+
+    // message_id is chat.db's message.ROWID, so it doubles as this table's rowid.
+    // date_ts is UTC epoch seconds; year/month/hour are precomputed (UTC) from it
+    // so readers never have to run strftime over every row.
+    db.exec("CREATE TABLE IF NOT EXISTS messages ("
+            "message_id INTEGER PRIMARY KEY, "
+            "guid TEXT, "
+            "text TEXT, "
+            "date_time TEXT, "
+            "date_ts INTEGER, "
+            "year INTEGER, "
+            "month INTEGER, "
+            "hour INTEGER, "
+            "handle_id INTEGER, "
+            "is_from_me INTEGER)");
+
+    // Per-contact rollups for the analytics charts, kept up to date by update_rollups()
+    db.exec("CREATE TABLE IF NOT EXISTS contact_month_counts ("
+            "handle_id INTEGER, "
+            "year INTEGER, "
+            "month INTEGER, "
+            "sent INTEGER, "
+            "received INTEGER, "
+            "PRIMARY KEY (handle_id, year, month)) WITHOUT ROWID");
+    db.exec("CREATE TABLE IF NOT EXISTS contact_hour_counts ("
+            "handle_id INTEGER, "
+            "hour INTEGER, "
+            "sent INTEGER, "
+            "received INTEGER, "
+            "PRIMARY KEY (handle_id, hour)) WITHOUT ROWID");
+
+    // High-water marks of the last export, used by Database::sync
+    db.exec("CREATE TABLE IF NOT EXISTS sync_state ("
+            "key TEXT PRIMARY KEY, "
+            "value INTEGER)");
+}
+
+void create_output_indexes(SQLite::Database& db) {
+    // Per-contact range queries (WHERE handle_id IN (...) ORDER BY date_ts) become index seeks
+    db.exec("CREATE INDEX IF NOT EXISTS idx_messages_handle_date ON messages(handle_id, date_ts)");
+    db.exec("CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(date_ts)");
+
+    // Full-text index over the message text. It's an external-content table, so the
+    // text is only stored once (in messages) and FTS just keeps the inverted index.
+    // porter + unicode61 folds case, accents and simple suffixes ("dinners" -> "dinner"),
+    // which suits short, informal chat messages.
+    db.exec("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            "text, "
+            "content='messages', "
+            "content_rowid='message_id', "
+            "tokenize='porter unicode61 remove_diacritics 2')");
+}
+
+void insert_contacts(SQLite::Database& db, const std::vector<Contact>& contacts) {
+    SQLite::Statement contact_query(db, "INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?)");
+
+    for (const auto& contact : contacts) {
+        // --- CORRECTED BINDING LOGIC ---
+        // Use if/else for optional values
+        if (contact.m_phone_number.has_value()) contact_query.bind(1, contact.m_phone_number.value()); else contact_query.bind(1);
+        if (contact.m_email.has_value()) contact_query.bind(2, contact.m_email.value()); else contact_query.bind(2);
+        if (contact.m_first_name.has_value()) contact_query.bind(3, contact.m_first_name.value()); else contact_query.bind(3);
+        if (contact.m_last_name.has_value()) contact_query.bind(4, contact.m_last_name.value()); else contact_query.bind(4);
+        if (contact.m_imessage_handle_id.has_value()) contact_query.bind(5, (int)contact.m_imessage_handle_id.value()); else contact_query.bind(5);
+        if (contact.m_sms_handle_id.has_value()) contact_query.bind(6, (int)contact.m_sms_handle_id.value()); else contact_query.bind(6);
+
+        contact_query.exec();
+        contact_query.reset();
+    }
+    std::cout << "Inserted " << contacts.size() << " contacts." << std::endl;
+}
+
+void insert_message(SQLite::Statement& message_query, const MessageData& message) {
+    const auto& date_time = message.get_date_time();
+    auto formatted_time = std::format("{:%Y-%m-%d %H:%M:%S}", date_time);
+
+    const auto day = std::chrono::floor<std::chrono::days>(date_time);
+    const std::chrono::year_month_day ymd{day};
+    const std::chrono::hh_mm_ss time_of_day{std::chrono::floor<std::chrono::seconds>(date_time - day)};
+    const long long date_ts = std::chrono::duration_cast<std::chrono::seconds>(date_time.time_since_epoch()).count();
+
+    message_query.bind(1, (int64_t)message.get_message_id());
+    message_query.bind(2, message.get_guid());
+    message_query.bind(3, message.get_text());
+    message_query.bind(4, formatted_time);
+    message_query.bind(5, (int64_t)date_ts);
+    message_query.bind(6, (int)ymd.year());
+    message_query.bind(7, (int)(unsigned)ymd.month());
+    message_query.bind(8, (int)time_of_day.hours().count());
+    message_query.bind(9, (int)message.get_handle_id());
+    message_query.bind(10, message.is_from_me());
+
+    message_query.exec();
+    message_query.reset();
+}
+
+SyncState read_sync_state(SQLite::Database& db) {
+    SyncState state;
+    SQLite::Statement query(db, "SELECT key, value FROM sync_state");
+    while (query.executeStep()) {
+        const std::string key = query.getColumn(0).getString();
+        const long long value = query.getColumn(1).getInt64();
+        if (key == "last_message_rowid") state.last_message_rowid = value;
+        else if (key == "last_message_date") state.last_message_date = value;
+        else if (key == "last_handle_rowid") state.last_handle_rowid = value;
+        else if (key == "plist_mtime") state.plist_mtime = value;
+        else if (key == "plist_count") state.plist_count = value;
+    }
+    return state;
+}
+
+void write_sync_state(SQLite::Database& db, const SyncState& state) {
+    SQLite::Statement query(db, "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)");
+    const std::pair<const char*, long long> entries[] = {
+        {"last_message_rowid", state.last_message_rowid},
+        {"last_message_date", state.last_message_date},
+        {"last_handle_rowid", state.last_handle_rowid},
+        {"plist_mtime", state.plist_mtime},
+        {"plist_count", state.plist_count},
+    };
+    for (const auto& [key, value] : entries) {
+        query.bind(1, key);
+        query.bind(2, (int64_t)value);
+        query.exec();
+        query.reset();
+    }
+}
+
+// Adds the messages with message_id > after_message_id to the rollup tables.
+// Sync only ever appends rows past the previous high-water mark, so adding their
+// counts to the existing totals keeps the rollups exact.
+void update_rollups(SQLite::Database& db, long long after_message_id) {
+    SQLite::Statement month_query(db, "INSERT INTO contact_month_counts (handle_id, year, month, sent, received) "
+            "SELECT handle_id, year, month, SUM(is_from_me), SUM(1 - is_from_me) "
+            "FROM messages WHERE message_id > ? "
+            "GROUP BY handle_id, year, month "
+            "ON CONFLICT (handle_id, year, month) DO UPDATE SET "
+            "sent = sent + excluded.sent, received = received + excluded.received");
+    month_query.bind(1, (int64_t)after_message_id);
+    month_query.exec();
+
+    SQLite::Statement hour_query(db, "INSERT INTO contact_hour_counts (handle_id, hour, sent, received) "
+            "SELECT handle_id, hour, SUM(is_from_me), SUM(1 - is_from_me) "
+            "FROM messages WHERE message_id > ? "
+            "GROUP BY handle_id, hour "
+            "ON CONFLICT (handle_id, hour) DO UPDATE SET "
+            "sent = sent + excluded.sent, received = received + excluded.received");
+    hour_query.bind(1, (int64_t)after_message_id);
+    hour_query.exec();
+}
+
+// Everything that is built once the messages table is fully loaded
+void finish_output(SQLite::Database& db, const SyncState& state) {
+    // Indexes are cheaper to build once after the bulk insert than to maintain row by row
+    create_output_indexes(db);
+    db.exec("INSERT INTO messages_fts(messages_fts) VALUES('rebuild')");
+    std::cout << "Built full-text index for messages." << std::endl;
+
+    update_rollups(db, 0);
+    std::cout << "Built per-contact rollup tables." << std::endl;
+
+    write_sync_state(db, state);
+    db.exec(std::format("PRAGMA user_version = {}", Database::OUTPUT_SCHEMA_VERSION));
+}
+
 void Database::save_to_sql(const std::string& output_path) {
     try {
         SQLite::Database db(output_path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
@@ -206,55 +706,26 @@ void Database::save_to_sql(const std::string& output_path) {
 
         SQLite::Transaction transaction(db);
 
+        // The FTS index references messages, so it has to go first
+        db.exec("DROP TABLE IF EXISTS messages_fts");
+        db.exec("DROP TABLE IF EXISTS messages");
         db.exec("DROP TABLE IF EXISTS contacts");
-        db.exec("CREATE TABLE contacts ("
-                "phone_number TEXT, "
-                "email TEXT, "
-                "first_name TEXT, "
-                "last_name TEXT, "
-                "imessage_handle_id INTEGER, "
-                "sms_handle_id INTEGER)");
+        db.exec("DROP TABLE IF EXISTS sync_state");
+        db.exec("DROP TABLE IF EXISTS contact_month_counts");
+        db.exec("DROP TABLE IF EXISTS contact_hour_counts");
+        create_output_tables(db);
 
-        db.exec("DROP TABLE IF EXISTS messages");
-        db.exec("CREATE TABLE messages ("
-                "text TEXT, "
-                "date_time TEXT, "
-                "handle_id INTEGER, "
-                "is_from_me INTEGER)");
-
-        SQLite::Statement contact_query(db, "INSERT INTO contacts VALUES (?, ?, ?, ?, ?, ?)");
-        SQLite::Statement message_query(db, "INSERT INTO messages VALUES (?, ?, ?, ?)");
-
-        // Insert all contacts
-        for (const auto& contact : m_contacts) {
-            // --- CORRECTED BINDING LOGIC ---
-            // Use if/else for optional values
-            if (contact.m_phone_number.has_value()) contact_query.bind(1, contact.m_phone_number.value()); else contact_query.bind(1);
-            if (contact.m_email.has_value()) contact_query.bind(2, contact.m_email.value()); else contact_query.bind(2);
-            if (contact.m_first_name.has_value()) contact_query.bind(3, contact.m_first_name.value()); else contact_query.bind(3);
-            if (contact.m_last_name.has_value()) contact_query.bind(4, contact.m_last_name.value()); else contact_query.bind(4);
-            if (contact.m_imessage_handle_id.has_value()) contact_query.bind(5, (int)contact.m_imessage_handle_id.value()); else contact_query.bind(5);
-            if (contact.m_sms_handle_id.has_value()) contact_query.bind(6, (int)contact.m_sms_handle_id.value()); else contact_query.bind(6);
-            
-            contact_query.exec();
-            contact_query.reset();
-        }
-        std::cout << "Inserted " << m_contacts.size() << " contacts." << std::endl;
+        insert_contacts(db, m_contacts);
 
         // Insert all messages
+        SQLite::Statement message_query(db, INSERT_MESSAGE_SQL);
         for (const auto& message : m_messages) {
-            auto formatted_time = std::format("{:%Y-%m-%d %H:%M:%S}", message.get_date_time());
-
-            message_query.bind(1, message.get_text());
-            message_query.bind(2, formatted_time);
-            message_query.bind(3, (int)message.get_handle_id());
-            message_query.bind(4, message.is_from_me());
-
-            message_query.exec();
-            message_query.reset();
+            insert_message(message_query, message);
         }
         std::cout << "Inserted " << m_messages.size() << " messages." << std::endl;
 
+        finish_output(db, m_sync_state);
+
         transaction.commit();
         std::cout << "Database saved successfully." << std::endl;
 
@@ -262,3 +733,125 @@ void Database::save_to_sql(const std::string& output_path) {
         std::cerr << "Error saving to SQL database: " << e.what() << std::endl;
     }
 }
+
+void Database::export_to_sql(const std::string& output_path, size_t batch_size) {
+    // Build the export next to the real file and swap it in at the end, so readers never
+    // see a half-written database even though we commit in batches along the way.
+    const std::string temp_path = output_path + ".tmp";
+    batch_size = std::max<size_t>(batch_size, 1);
+    try {
+        fs::remove(temp_path);
+        if (m_contacts.empty()) {
+            populate_contacts();
+        }
+
+        size_t inserted = 0;
+        {
+            SQLite::Database db(temp_path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+            std::cout << "Streaming messages into: " << temp_path << std::endl;
+
+            // The file is thrown away if we fail, so there's no point paying for fsyncs
+            db.exec("PRAGMA synchronous = OFF");
+
+            std::optional<SQLite::Transaction> transaction;
+            transaction.emplace(db);
+            create_output_tables(db);
+            insert_contacts(db, m_contacts);
+
+            // Each row is parsed and bound straight into the insert, so memory stays flat
+            // no matter how large chat.db is.
+            read_message_high_water(m_sync_state);
+            SQLite::Statement message_query(db, INSERT_MESSAGE_SQL);
+            for_each_message(0, m_sync_state.last_message_rowid, [&](MessageData&& message) {
+                insert_message(message_query, message);
+                if (++inserted % batch_size == 0) {
+                    transaction->commit();
+                    transaction.emplace(db);
+                }
+            });
+            std::cout << "Inserted " << inserted << " messages." << std::endl;
+
+            finish_output(db, m_sync_state);
+            transaction->commit();
+        }
+
+        fs::rename(temp_path, output_path);
+        std::cout << "Database saved successfully." << std::endl;
+
+    } catch (const std::exception& e) {
+        std::cerr << "Error exporting to SQL database: " << e.what() << std::endl;
+        std::error_code ignored;
+        fs::remove(temp_path, ignored);
+    }
+}
+
+void Database::sync(const std::string& output_path) {
+    try {
+        bool needs_full_export = false;
+        {
+            SQLite::Database db(output_path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+            needs_full_export = db.execAndGet("PRAGMA user_version").getInt() != OUTPUT_SCHEMA_VERSION
+                || !db.tableExists("sync_state");
+
+            if (!needs_full_export) {
+                SyncState previous = read_sync_state(db);
+                SyncState current;
+                read_message_high_water(current);
+                read_contact_fingerprint(current);
+
+                // chat.db was replaced by an older or unrelated copy, so ROWIDs can't be trusted
+                needs_full_export = current.last_message_rowid < previous.last_message_rowid;
+
+                if (!needs_full_export) {
+                    SQLite::Transaction transaction(db);
+
+                    const bool contacts_changed = current.plist_count != previous.plist_count
+                        || current.plist_mtime != previous.plist_mtime
+                        || current.last_handle_rowid != previous.last_handle_rowid;
+                    if (contacts_changed) {
+                        // Contacts are small, so reload them wholesale rather than diffing cards
+                        m_contacts.clear();
+                        populate_contacts();
+                        db.exec("DELETE FROM contacts");
+                        insert_contacts(db, m_contacts);
+                    }
+
+                    // Only rows past the previous high-water mark. Edits to older messages
+                    // in chat.db are not picked up; run a full export for those.
+                    SQLite::Statement message_query(db, INSERT_MESSAGE_SQL);
+                    size_t inserted = 0;
+                    for_each_message(previous.last_message_rowid, current.last_message_rowid, [&](MessageData&& message) {
+                        insert_message(message_query, message);
+                        ++inserted;
+                    });
+
+                    // Index the new rows. They are appended after the loop so that a message
+                    // replaced within this batch is only indexed once.
+                    SQLite::Statement fts_query(db, "INSERT INTO messages_fts(rowid, text) "
+                            "SELECT message_id, text FROM messages WHERE message_id > ?");
+                    fts_query.bind(1, (int64_t)previous.last_message_rowid);
+                    fts_query.exec();
+
+                    update_rollups(db, previous.last_message_rowid);
+
+                    write_sync_state(db, current);
+                    transaction.commit();
+
+                    m_sync_state = current;
+                    std::cout << "Synced " << inserted << " new messages"
+                              << (contacts_changed ? " and refreshed contacts" : "")
+                              << " into " << output_path << std::endl;
+                }
+            }
+        }
+
+        if (needs_full_export) {
+            std::cout << "No usable sync state in " << output_path << ", running a full export." << std::endl;
+            m_contacts.clear();
+            export_to_sql(output_path);
+        }
+
+    } catch (const std::exception& e) {
+        std::cerr << "Error syncing SQL database: " << e.what() << std::endl;
+    }
+}
@@ -4,28 +4,75 @@
 #include <optional>
 #include <SQLiteCpp/Database.h>
 #include <filesystem>
+#include <functional>
 #include "contact.h"
 #include "message_data.h"
 
+// High-water marks of chat.db and the plist folder at the time of an export.
+// Saved in output.db so that Database::sync only has to read what changed since.
+struct SyncState {
+    long long last_message_rowid = 0;
+    long long last_message_date = 0; // Raw Apple timestamp of the newest message
+    long long last_handle_rowid = 0;
+    long long plist_mtime = 0; // Newest .abcdp last-write time
+    long long plist_count = 0;
+};
+
+// An .abcdp file found in the address book folder
+struct PlistFile {
+    std::filesystem::path path;
+    long long mtime;
+    long long size;
+};
+
+// A parse result remembered in the contact cache
+struct CachedPlist {
+    long long mtime = 0;
+    long long size = 0;
+    std::optional<Contact> contact; // Empty if the card had no phone number
+};
+
 class Database {
 private:
     std::string m_pList_folder;
     std::string m_chat_db_path;
     SQLite::Database m_db;
+    // Threads used to parse plists and decode message bodies. 1 keeps everything on the calling thread.
+    size_t m_worker_count;
+    // SQLite file remembering parsed plists between runs. Empty disables the cache.
+    std::string m_contact_cache_path;
 
     std::vector<Contact> m_contacts;
     std::vector<MessageData> m_messages;
+    SyncState m_sync_state;
+
+    void read_message_high_water(SyncState& state);
+    void read_contact_fingerprint(SyncState& state);
+    void fingerprint_contacts(SyncState& state, const std::vector<PlistFile>& files);
+    std::vector<PlistFile> list_plist_files();
+    // Calls callback for every parsed message with after_rowid < ROWID <= up_to_rowid
+    void for_each_message(long long after_rowid, long long up_to_rowid, const std::function<void(MessageData&&)>& callback);
+    // Same contract as for_each_message, but decodes rows on m_worker_count threads
+    void for_each_message_parallel(long long after_rowid, long long up_to_rowid, const std::function<void(MessageData&&)>& callback);
 
 
 
 public:
-    Database(std::string pList_folder, std::string chat_db_path);
+    // Bumped whenever the layout of the exported output.db changes.
+    // Stored in output.db as PRAGMA user_version.
+    static constexpr int OUTPUT_SCHEMA_VERSION = 3;
+
+    Database(std::string pList_folder, std::string chat_db_path, unsigned int worker_count = 1);
     void populate_database();
+    void set_contact_cache_path(std::string path) { m_contact_cache_path = std::move(path); }
     std::optional<Contact> parse_plist_file(const std::filesystem::path& file_path);
 
     // Add getters so Python can access the data
     const std::vector<Contact>& get_contacts() const { return m_contacts; }
     const std::vector<MessageData>& get_messages() const { return m_messages; }
+    // Columnar copy of the messages. Uses m_messages if populate_database already ran,
+    // otherwise streams straight from chat.db without materializing MessageData objects.
+    MessageColumns get_message_columns();
         // Private helpers
     void populate_contacts();
     void enrich_contacts_from_db(); // You should add this from our last conversation
@@ -34,4 +81,9 @@ public:
     void populate_messages();
 
     void save_to_sql(const std::string& output_path);
+    // Full export that streams rows from chat.db straight into output.db without filling
+    // m_messages, committing every batch_size rows. Use this for large chat.db files.
+    void export_to_sql(const std::string& output_path, size_t batch_size = 10000);
+    // Appends only what changed since the last save_to_sql/sync, falling back to a full export
+    void sync(const std::string& output_path);
 };
\ No newline at end of file
@@ -0,0 +1,42 @@
+#pragma once
+#include <filesystem>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+// Read-only memory map of a whole file, so it can be parsed in place
+// instead of being copied into a std::string first.
+class MappedFile {
+private:
+    int m_fd = -1;
+    const char* m_data = nullptr;
+    size_t m_size = 0;
+
+public:
+    explicit MappedFile(const std::filesystem::path& path) {
+        m_fd = ::open(path.c_str(), O_RDONLY);
+        if (m_fd < 0) return;
+
+        struct stat info;
+        if (::fstat(m_fd, &info) == 0 && info.st_size > 0) {
+            void* data = ::mmap(nullptr, (size_t)info.st_size, PROT_READ, MAP_PRIVATE, m_fd, 0);
+            if (data != MAP_FAILED) {
+                m_data = static_cast<const char*>(data);
+                m_size = (size_t)info.st_size;
+            }
+        }
+    }
+
+    ~MappedFile() {
+        if (m_data) ::munmap(const_cast<char*>(m_data), m_size);
+        if (m_fd >= 0) ::close(m_fd);
+    }
+
+    MappedFile(const MappedFile&) = delete;
+    MappedFile& operator=(const MappedFile&) = delete;
+
+    bool is_open() const { return m_data != nullptr; }
+    const char* data() const { return m_data; }
+    size_t size() const { return m_size; }
+};
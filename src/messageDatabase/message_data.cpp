@@ -1,35 +1,62 @@
 #include "message_data.h"
 using namespace std::chrono_literals;
 
-MessageData::MessageData(std::string text, std::chrono::time_point<std::chrono::system_clock> date_time, unsigned int handle_id, bool is_from_me)
-    : m_text(text), m_date_time(date_time), m_handle_id(handle_id), m_is_from_me(is_from_me) {}
+MessageData::MessageData(long long message_id, std::string guid, std::string text, std::chrono::time_point<std::chrono::system_clock> date_time, unsigned int handle_id, bool is_from_me)
+    : m_message_id(message_id), m_guid(std::move(guid)), m_text(std::move(text)), m_date_time(date_time), m_handle_id(handle_id), m_is_from_me(is_from_me) {}
+
+RawMessageRow MessageData::read_raw_row(const SQLite::Statement& query_row) {
+    RawMessageRow row;
 
-std::optional<MessageData> MessageData::from_database_row(const SQLite::Statement& query_row) {
     // Get the column value as an integer first
     const int cache_has_attachments = query_row.getColumn("cache_has_attachments").getInt();
     const int is_audio_message = query_row.getColumn("is_audio_message").getInt();
     const int was_data_detected = query_row.getColumn("was_data_detected").getInt();
     const int item_type = query_row.getColumn("item_type").getInt();
-    if (cache_has_attachments || is_audio_message || !was_data_detected || item_type != 0) {
-        std::cerr << "Info: Skipping non-text message (attachment/audio/detected data/item_type)." << std::endl;
-        return std::nullopt;
+    row.is_text_message = !(cache_has_attachments || is_audio_message || !was_data_detected || item_type != 0);
+    if (!row.is_text_message) {
+        // Nothing else is needed, so don't bother copying the body out of SQLite
+        return row;
     }
 
-
-    std::optional<std::string> body_opt;
-
     const auto& text_column = query_row.getColumn("text");
     if (!text_column.isNull()) {
-        body_opt = text_column.getString();
+        row.text = text_column.getString();
     } else {
         const auto& blob_column = query_row.getColumn("attributedBody");
         if (!blob_column.isNull()) {
-            const void* blob_data = blob_column.getBlob();
-            int blob_size = blob_column.getBytes();
-            body_opt = parse_attributedText(blob_data, blob_size);
+            const char* blob_data = static_cast<const char*>(blob_column.getBlob());
+            row.attributed_body.assign(blob_data, blob_data + blob_column.getBytes());
         }
     }
 
+    row.raw_date = query_row.getColumn("date").getInt64();
+    // Use the new "effective_handle_id" column from our query
+    row.handle_id = query_row.getColumn("effective_handle_id").getInt();
+    row.is_from_me = query_row.getColumn("is_from_me").getInt();
+
+    row.message_id = query_row.getColumn("message_id").getInt64();
+    const auto& guid_column = query_row.getColumn("guid");
+    if (!guid_column.isNull()) {
+        row.guid = guid_column.getString();
+    }
+
+    return row;
+}
+
+std::optional<MessageData> MessageData::from_raw_row(RawMessageRow&& row) {
+    if (!row.is_text_message) {
+        std::cerr << "Info: Skipping non-text message (attachment/audio/detected data/item_type)." << std::endl;
+        return std::nullopt;
+    }
+
+    std::optional<std::string> body_opt;
+
+    if (row.text.has_value()) {
+        body_opt = std::move(row.text);
+    } else if (!row.attributed_body.empty()) {
+        body_opt = parse_attributedText(row.attributed_body.data(), (int)row.attributed_body.size());
+    }
+
     if (!body_opt.has_value()) {
         std::cerr << "Warning: Attributed string failed to parse message body for row."<< std::endl;
         return std::nullopt;
@@ -40,14 +67,13 @@ std::optional<MessageData> MessageData::from_database_row(const SQLite::Statemen
         return std::nullopt;
     }
 
-    const long long raw_date = query_row.getColumn("date");
-    auto timestamp = convert_apple_timestamp(raw_date);
-    // Use the new "effective_handle_id" column from our query
-    const int handle_id = query_row.getColumn("effective_handle_id"); 
-    
-    const bool is_from_me = query_row.getColumn("is_from_me").getInt();
+    auto timestamp = convert_apple_timestamp(row.raw_date);
 
-    return MessageData(body_opt.value(), timestamp, handle_id, is_from_me);
+    return MessageData(row.message_id, std::move(row.guid), std::move(body_opt.value()), timestamp, row.handle_id, row.is_from_me);
+}
+
+std::optional<MessageData> MessageData::from_database_row(const SQLite::Statement& query_row) {
+    return from_raw_row(read_raw_row(query_row));
 }
 
 bool MessageData::invalid_imessage_body(const std::string& text) {
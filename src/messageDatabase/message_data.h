@@ -7,20 +7,49 @@
 #include <string_view>
 #include <span>
 #include <algorithm>
+#include <cstdint>
 
 #include <SQLiteCpp/Statement.h>
 #include <SQLiteCpp/Column.h>
 
+// The columns of one chat.db message row, copied out of SQLite but not decoded yet.
+// Lets one thread step the query while others do the (expensive) body decoding.
+struct RawMessageRow {
+    long long message_id = 0;
+    std::string guid;
+    std::optional<std::string> text;
+    std::string attributed_body; // Raw typedstream blob, only filled when text is NULL
+    long long raw_date = 0;
+    unsigned int handle_id = 0;
+    bool is_from_me = false;
+    bool is_text_message = false; // False for attachments, audio, etc.
+};
+
+// Messages laid out column by column, so they can be handed to Python as NumPy
+// arrays without creating an object per message. The texts follow Arrow's
+// large_string layout: all UTF-8 bytes back to back in text_data, and message i
+// spans text_data[text_offsets[i], text_offsets[i + 1]).
+struct MessageColumns {
+    std::vector<int64_t> message_ids;
+    std::vector<int64_t> timestamps; // UTC epoch seconds
+    std::vector<uint32_t> handle_ids;
+    std::vector<uint8_t> is_from_me; // 0/1, exposed as a bool mask
+    std::vector<char> text_data;
+    std::vector<int64_t> text_offsets{0}; // size() + 1 entries
+};
+
 class MessageData
 {
 private:
+    long long m_message_id; // ROWID of the message in chat.db
+    std::string m_guid; // Apple's globally unique message ID
     std::string m_text; // Contains text data
     std::chrono::time_point<std::chrono::system_clock> m_date_time; // Timestamp
     unsigned int m_handle_id; // Handle ID, used for lookup in contacts table
     bool m_is_from_me; // Self explenatory
 
     // Pirvate because we don't want YOU creating messages out of thin air!
-    MessageData(std::string text, std::chrono::time_point<std::chrono::system_clock> date_time, unsigned int handle_id, bool is_from_me);
+    MessageData(long long message_id, std::string guid, std::string text, std::chrono::time_point<std::chrono::system_clock> date_time, unsigned int handle_id, bool is_from_me);
     
     // These handle text extraction
     static std::optional<std::string> parse_attributedText(const void* blob, int size);
@@ -34,6 +63,13 @@ private:
 public:
     static std::optional<MessageData> from_database_row(const SQLite::Statement& query_row);
 
+    // from_database_row split in two: read_raw_row must run on the thread stepping the
+    // query, from_raw_row is thread-safe and does the decoding and validation.
+    static RawMessageRow read_raw_row(const SQLite::Statement& query_row);
+    static std::optional<MessageData> from_raw_row(RawMessageRow&& row);
+
+    long long get_message_id() const { return m_message_id; }
+    const std::string& get_guid() const { return m_guid; }
     const std::string& get_text() const { return m_text; }
     const std::chrono::time_point<std::chrono::system_clock>& get_date_time() const { return m_date_time; }
     unsigned int get_handle_id() const { return m_handle_id; }